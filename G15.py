@@ -11,10 +11,10 @@ import os
 import json
 import time
 import threading
-import re
 import datetime
 import winsound
 import math
+import multiprocessing
 
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QLabel, QLineEdit, QPushButton,
@@ -33,36 +33,21 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 
+from fast_extract import has_extractor, extract_quote, format_page_ts
+from process_workers import ProcessWorker
+from resource_profile import resolve_profile, apply_profile, navigate, PageLoadGate
+from bringup import BringUpTracker, PROBE_WAIT
+from price_parser import parse_price
+
 # --- 設定檔名稱 ---
 CONFIG_FILE = "monitor_config_v11.json"
 
 # --- 效能設定 ---
 WORKER_COUNT = 2  # 啟動 2 個瀏覽器分工
+WORKER_BACKEND = "thread"  # "thread"=QThread 引擎, "process"=每個引擎獨立行程 (當機自動重啟)
 HEADLESS_MODE = True # True=隱藏瀏覽器, False=顯示
+EXTRACT_MODE = "js" # "js"=單次 execute_script 頁面內擷取, "webdriver"=逐步 WebDriver 指令
 
-# ==========================================
-#  輔助與邏輯
-# ==========================================
-
-def parse_price(price_str):
-    """
-    價格解析函數
-    """
-    try:
-        if not price_str: return 0.0
-        # 移除逗號並嘗試取得第一部分數字
-        first_part = str(price_str).replace(',', '').strip().split('\n')[0].split(' ')[0]
-        # 只保留數字和小數點
-        clean_str = re.sub(r'[^\d.]', '', first_part)
-        
-        # 防止多個小數點的情況 (例如 2000.50.1)
-        if clean_str.count('.') > 1:
-            parts = clean_str.split('.')
-            clean_str = f"{parts[0]}.{parts[1]}"
-            
-        return float(clean_str) if clean_str else 0.0
-    except:
-        return 0.0
 
 class BrowserWorker(QThread):
     """
@@ -79,6 +64,8 @@ class BrowserWorker(QThread):
         self.assigned_sites = assigned_sites 
         self.running = True
         self.driver = None
+        self.load_gate = PageLoadGate()  # 各券商的載入策略 / 逾時
+        self.bringup = BringUpTracker()  # 各券商就緒判定與首筆報價耗時
 
     def setup_driver(self):
         chrome_options = Options()
@@ -92,10 +79,9 @@ class BrowserWorker(QThread):
         chrome_options.add_argument("--mute-audio")
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
-        # 禁止加載圖片，大幅提升速度
-        chrome_options.add_argument("--blink-settings=imagesEnabled=false") 
-        # Eager 模式：DOM 讀取完即視為加載完成
-        chrome_options.page_load_strategy = 'eager' 
+        # 圖片等資源改由各券商的 "resources" 設定逐分頁阻擋 (WF 保留完整渲染)
+        # 載入策略與逾時也由各券商設定，瀏覽器本身不阻塞指令等待載入
+        chrome_options.page_load_strategy = 'none'
 
         chrome_options.add_argument(
             "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
@@ -116,26 +102,35 @@ class BrowserWorker(QThread):
             site_keys = list(self.assigned_sites.keys())
             if not site_keys: return
 
-            # 初始化分頁
-            first_key = site_keys[0]
-            self.driver.get(self.assigned_sites[first_key]["url"])
-            self.assigned_sites[first_key]["handle"] = self.driver.current_window_handle
-
-            for key in site_keys[1:]:
+            # 初始化分頁: 一次送出全部，不等待載入 (初始空白分頁保留作為開新分頁用)
+            launcher = self.driver.current_window_handle
+            for key in site_keys:
                 if not self.running: break
-                self.driver.execute_script(f"window.open('{self.assigned_sites[key]['url']}', '_blank');")
-                self.driver.switch_to.window(self.driver.window_handles[-1])
-                self.assigned_sites[key]["handle"] = self.driver.current_window_handle
-                time.sleep(0.5) 
+                # 先開空白分頁，套用阻擋清單後再導向，第一次載入就生效
+                self.driver.switch_to.window(launcher)
+                before = set(self.driver.window_handles)
+                self.driver.execute_script("window.open('about:blank', '_blank');")
+                new_handles = [h for h in self.driver.window_handles if h not in before]
+                self.assigned_sites[key]["handle"] = new_handles[0] if new_handles else self.driver.window_handles[-1]
+                self.driver.switch_to.window(self.assigned_sites[key]["handle"])
+                self.load_site(key)
 
-            self.log_signal.emit(f"[Worker-{self.worker_id}] 就緒，開始高速輪詢。")
+            self.log_signal.emit(f"[Worker-{self.worker_id}] 分頁已全部送出開啟，開始高速輪詢 (各券商就緒即開始報價)。")
 
             while self.running:
                 for key in site_keys:
                     if not self.running: break
                     try:
                         self.driver.switch_to.window(self.assigned_sites[key]["handle"])
-                        self.scrape_site(key, wait)
+                        load_state = self.load_gate.check(self.driver, key)
+                        if load_state == "loading":
+                            self.status_signal.emit(key, "頁面載入中")
+                        elif self.bringup.pending(key):
+                            # 就緒前只做短暫探測，未載入完成的頁面不阻塞其他券商
+                            if self.scrape_site(key, WebDriverWait(self.driver, PROBE_WAIT)):
+                                self.note_ready(key)
+                        else:
+                            self.scrape_site(key, wait)
                     except Exception as e:
                         self.status_signal.emit(key, "連線/切換異常")
                     
@@ -152,12 +147,39 @@ class BrowserWorker(QThread):
             self.stop_driver()
             self.finished_signal.emit()
 
+    def load_site(self, key):
+        """在目前分頁套用該券商的資源設定並導向網址"""
+        profile = resolve_profile(self.assigned_sites[key])
+        if profile["patterns"] and not apply_profile(self.driver, profile):
+            self.log_signal.emit(f"[Worker-{self.worker_id}] {key} 無法套用資源阻擋，改為完整載入")
+        navigate(self.driver, self.assigned_sites[key]["url"])
+        self.load_gate.start(key, profile)
+        self.bringup.opened(key)
+
+    def note_ready(self, key):
+        """首次擷取成功，記錄首筆報價耗時"""
+        elapsed = self.bringup.mark(key)
+        if elapsed is None:
+            return
+        self.log_signal.emit(f"[Worker-{self.worker_id}] {key} 就緒，首筆報價耗時 {elapsed:.1f} 秒")
+        summary = self.bringup.all_ready()
+        if summary:
+            self.log_signal.emit(f"[Worker-{self.worker_id}] 全部 {summary[0]} 個券商就緒 (最慢 {summary[1]:.1f} 秒)")
+
     def scrape_site(self, key, wait):
         now_str = datetime.datetime.now().strftime("%H:%M:%S")
         try:
             bid, ask = 0.0, 0.0
             method_name = f"scrape_{key}"
-            if hasattr(self, method_name):
+            if EXTRACT_MODE == "js" and has_extractor(key):
+                # 一次往返: 頁面內定位 + 解析，並使用頁面端時間戳
+                quote = extract_quote(self.driver, key)
+                if quote is None:
+                    self.status_signal.emit(key, "等待數據")
+                    return
+                bid, ask, page_ts = quote
+                now_str = format_page_ts(page_ts)
+            elif hasattr(self, method_name):
                 func = getattr(self, method_name)
                 bid, ask = func(wait)
             else:
@@ -167,6 +189,7 @@ class BrowserWorker(QThread):
             if bid > 0 and ask > 0:
                 self.price_signal.emit(key, bid, ask, now_str)
                 self.status_signal.emit(key, "監控中")
+                return True
             else:
                 self.status_signal.emit(key, "數據異常")
 
@@ -301,7 +324,8 @@ class GoldMonitorApp(QMainWindow):
 
         # 定義全站點資料 (已移除 OANDA)
         self.all_sites_config = {
-            "WF": {"url": "https://www.wfbullion.com/", "handle": None, "name": "永豐金業"},
+            "WF": {"url": "https://www.wfbullion.com/", "handle": None, "name": "永豐金業",
+                   "resources": "full"},  # 需要圖片與完整渲染才讀得到報價
             "IG": {"url": "https://www.ig.com/cn/commodities/markets-commodities/gold", "handle": None, "name": "IG Markets"},
             # "Oanda": 已移除
             "Forex": {"url": "https://www.forex.com/cn/markets-to-trade/precious-metals/", "handle": None, "name": "Forex.com"},
@@ -589,7 +613,10 @@ class GoldMonitorApp(QMainWindow):
 
             worker_sites = {k: self.all_sites_config[k].copy() for k in worker_keys}
             
-            worker = BrowserWorker(i + 1, worker_sites)
+            if WORKER_BACKEND == "process":
+                worker = ProcessWorker(BrowserWorker, i + 1, worker_sites)
+            else:
+                worker = BrowserWorker(i + 1, worker_sites)
             worker.log_signal.connect(self.log_message)
             worker.price_signal.connect(self.on_price_update)
             worker.status_signal.connect(self.on_status_update)
@@ -748,6 +775,7 @@ class GoldMonitorApp(QMainWindow):
             event.accept()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = GoldMonitorApp()
     window.show()
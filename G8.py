@@ -3,7 +3,6 @@ import os
 import json
 import time
 import threading
-import re
 import datetime
 import winsound
 
@@ -23,39 +22,12 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 
+from price_parser import parse_price
+
 # --- 設定檔名稱 ---
 CONFIG_FILE = "monitor_config_v9_pro.json"
 
 
-# ==========================================
-#   輔助與邏輯
-# ==========================================
-
-def parse_price(price_str):
-    """
-    更強健的價格解析函數
-    1. 先以空格或換行符號切割，只取第一部分 (防止抓到 "+0.5%" 之類的漲跌幅導致數字黏連)
-    2. 移除逗號與非數字字符
-    3. 轉換為 float
-    """
-    try:
-        if not price_str: return 0.0
-        # 步驟 1: 切割字串，只拿第一個區塊
-        first_part = str(price_str).strip().split('\n')[0].split(' ')[0]
-        
-        # 步驟 2: 清理非數字字符 (保留小數點)
-        clean_str = re.sub(r'[^\d.]', '', first_part)
-        
-        # 額外保護: 如果有多個小數點 (例如 2650.50.5)，只保留第一個
-        if clean_str.count('.') > 1:
-            parts = clean_str.split('.')
-            clean_str = f"{parts[0]}.{parts[1]}"
-
-        return float(clean_str)
-    except:
-        return 0.0
-
-
 class UnifiedMonitorThread(QThread):
     log_signal = pyqtSignal(str)
     price_signal = pyqtSignal(str, float, float, str)  # (Source, Bid, Ask, Time)
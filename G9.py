@@ -3,7 +3,6 @@ import os
 import json
 import time
 import threading
-import re
 import datetime
 import winsound
 
@@ -23,34 +22,20 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 
+from fast_extract import has_extractor, extract_quote, format_page_ts
+from quote_observer import has_observer, drain_ticks
+from ws_capture import WebSocketQuoteCapture, enable_logging as enable_ws_logging
+from browser_supervisor import BrowserSupervisor, classify_error, HEALTH_INTERVAL
+from bringup import BringUpTracker, PROBE_INTERVAL, PROBE_WAIT
+from snapshot_replay import replay_url
+from price_parser import parse_price
+
 # --- 設定檔名稱 ---
 CONFIG_FILE = "monitor_config_v10_pro.json"  # 升級版號
-
-
-# ==========================================
-#   輔助與邏輯
-# ==========================================
-
-def parse_price(price_str):
-    """
-    更強健的價格解析函數
-    """
-    try:
-        if not price_str: return 0.0
-        # 步驟 1: 切割字串，只拿第一個區塊
-        first_part = str(price_str).strip().split('\n')[0].split(' ')[0]
-        
-        # 步驟 2: 清理非數字字符 (保留小數點)
-        clean_str = re.sub(r'[^\d.]', '', first_part)
-        
-        # 額外保護: 如果有多個小數點 (例如 2650.50.5)，只保留第一個
-        if clean_str.count('.') > 1:
-            parts = clean_str.split('.')
-            clean_str = f"{parts[0]}.{parts[1]}"
-
-        return float(clean_str)
-    except:
-        return 0.0
+EXTRACT_MODE = "js"  # "js"=單次 execute_script 頁面內擷取, "webdriver"=逐步 WebDriver 指令
+CAPTURE_MODE = "poll"  # "poll"=每輪讀取 DOM, "observer"=頁面內 MutationObserver 推播並批次取回, "websocket"=CDP 封包解碼
+WS_FALLBACK_SEC = 5.0  # websocket 模式下，封包報價超過此秒數未更新則改回讀取 DOM
+STANDBY_BROWSER = True  # 預先啟動一個備用 Chrome，瀏覽器失效時直接換上並只重開受影響的分頁
 
 
 class UnifiedMonitorThread(QThread):
@@ -63,6 +48,12 @@ class UnifiedMonitorThread(QThread):
         super().__init__()
         self.running = True
         self.driver = None
+        self.wait = None
+        self.supervisor = None
+        self.next_health_check = 0.0
+        self.bringup = BringUpTracker()  # 各券商就緒判定與首筆報價耗時
+        self.observed_keys = set()  # observer 模式下已收到首筆跳動的券商
+        self.ws_capture = WebSocketQuoteCapture() if CAPTURE_MODE == "websocket" else None
         # 券商網址清單
         self.sites = {
             "WF": {"url": "https://www.wfbullion.com/", "handle": None, "name": "永豐金業"},
@@ -85,6 +76,10 @@ class UnifiedMonitorThread(QThread):
         }
 
     def setup_driver(self):
+        self.driver = self.create_driver()
+        self.wait = WebDriverWait(self.driver, 10)
+
+    def create_driver(self):
         chrome_options = Options()
         chrome_options.add_argument("--headless=new")  # 生產環境建議開啟 Headless
         chrome_options.add_argument("--disable-gpu")
@@ -94,58 +89,197 @@ class UnifiedMonitorThread(QThread):
         chrome_options.add_argument("--mute-audio")
         chrome_options.add_argument(
             "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-        self.driver = webdriver.Chrome(options=chrome_options)
+        # 不阻塞等待載入: 分頁並行載入，各券商以選擇器探測判定就緒
+        chrome_options.page_load_strategy = 'none'
+        if self.ws_capture:
+            enable_ws_logging(chrome_options)
+        return webdriver.Chrome(options=chrome_options)
 
     def run(self):
         try:
             self.log_signal.emit("系統核心啟動中 (Chrome Driver)...")
             self.setup_driver()
-            wait = WebDriverWait(self.driver, 10)
+            self.supervisor = BrowserSupervisor(self.create_driver, log=self.log_signal.emit, standby=STANDBY_BROWSER)
+            self.supervisor.start()
 
             site_keys = list(self.sites.keys())
-            first_key = site_keys[0]
 
-            self.log_signal.emit(f"初始化主分頁: {self.sites[first_key]['name']} ...")
-            self.driver.get(self.sites[first_key]["url"])
-            self.sites[first_key]["handle"] = self.driver.current_window_handle
-
-            for key in site_keys[1:]:
+            # 所有分頁一次送出開啟，不等待載入 (初始空白分頁保留作為開新分頁用)
+            for key in site_keys:
                 if not self.running: break
-                self.log_signal.emit(f"開啟背景分頁: {self.sites[key]['name']} ...")
-                self.driver.execute_script(f"window.open('{self.sites[key]['url']}', '_blank');")
-                self.driver.switch_to.window(self.driver.window_handles[-1])
-                self.sites[key]["handle"] = self.driver.current_window_handle
-                time.sleep(1)
+                self.open_tab(key)
 
-            self.log_signal.emit("所有連線建立完成，開始即時監控。")
+            self.log_signal.emit(f"已送出 {len(site_keys)} 個分頁，開始即時監控 (各券商就緒即開始報價)。")
 
             while self.running:
+                if time.monotonic() >= self.next_health_check:
+                    self.check_browser()
+                ws_fresh = self.pump_websocket() if self.ws_capture and self.driver else set()
                 for key in site_keys:
                     if not self.running: break
+                    if key in ws_fresh: continue
                     try:
                         self.driver.switch_to.window(self.sites[key]["handle"])
-                        self.scrape_site(key, wait)
-                    except Exception:
+                        # 就緒前只做短暫探測，未載入完成的頁面不阻塞其他券商
+                        pending = self.bringup.pending(key)
+                        if self.scrape_site(key, WebDriverWait(self.driver, PROBE_WAIT) if pending else self.wait):
+                            self.note_ready(key)
+                    except Exception as e:
                         self.status_signal.emit(key, "連線異常")
+                        kind = classify_error(e)
+                        if kind == "session":
+                            self.recover_session()
+                        elif kind == "tab":
+                            self.recover_tab(key)
                     time.sleep(0.2)
 
-                # 每一輪休息
-                for _ in range(20):
+                # 每一輪休息 (仍有券商未就緒時縮短，盡快取得首筆報價)
+                rest = PROBE_INTERVAL if any(self.bringup.pending(k) for k in site_keys) else 2.0
+                for _ in range(int(rest * 10)):
                     if not self.running: break
                     time.sleep(0.1)
 
         except Exception as e:
             self.log_signal.emit(f"核心錯誤: {str(e)}")
         finally:
+            if self.supervisor:
+                self.supervisor.shutdown()
             self.stop_driver()
             self.finished_signal.emit()
 
+    # ==========================
+    #  瀏覽器健康檢查與復原
+    # ==========================
+    def check_browser(self):
+        """定期確認 session 仍有效、各分頁仍存在"""
+        self.next_health_check = time.monotonic() + HEALTH_INTERVAL
+        try:
+            handles = set(self.driver.window_handles)
+        except Exception:
+            self.recover_session()
+            return
+        for key, site in self.sites.items():
+            if site["handle"] and site["handle"] not in handles:
+                self.log_signal.emit(f"[{key}] 分頁已消失")
+                self.recover_tab(key)
+
+    def open_tab(self, key):
+        """開啟新分頁並記錄 handle (不切換等待，頁面在背景載入)"""
+        handles = self.driver.window_handles
+        self.driver.switch_to.window(handles[0])
+        before = set(handles)
+        self.driver.execute_script("window.open(arguments[0], '_blank');", replay_url(self.sites[key]["url"]))
+        new_handles = [h for h in self.driver.window_handles if h not in before]
+        self.sites[key]["handle"] = new_handles[0] if new_handles else self.driver.window_handles[-1]
+        self.bringup.opened(key)
+        if self.ws_capture:
+            self.ws_capture.bind(self.sites[key]["handle"], key)
+
+    def note_ready(self, key):
+        """擷取成功；首次就緒時記錄首筆報價耗時"""
+        elapsed = self.bringup.mark(key)
+        if elapsed is None:
+            return
+        self.log_signal.emit(f"[{key}] 就緒，首筆報價耗時 {elapsed:.1f} 秒")
+        summary = self.bringup.all_ready()
+        if summary:
+            self.log_signal.emit(f"全部 {summary[0]} 個券商就緒 (最慢 {summary[1]:.1f} 秒)")
+
+    def recover_session(self):
+        """整個瀏覽器失效: 換上備用瀏覽器並重開所有分頁 (不逐頁等待)"""
+        started = time.perf_counter()
+        self.log_signal.emit("瀏覽器 session 失效，換上備用瀏覽器...")
+        if self.driver is not None:
+            self.supervisor.retire(self.driver)
+        self.driver = None
+        self.observed_keys.clear()
+        for key, site in self.sites.items():
+            site["handle"] = None
+            self.status_signal.emit(key, "瀏覽器復原中")
+
+        try:
+            self.driver, from_standby = self.supervisor.acquire()
+        except Exception as e:
+            # 沒有可用的瀏覽器，下次健康檢查再試
+            self.log_signal.emit(f"瀏覽器復原失敗: {e}")
+            return
+        self.wait = WebDriverWait(self.driver, 10)
+        for key in self.sites:
+            try:
+                self.open_tab(key)
+            except Exception as e:
+                self.log_signal.emit(f"[{key}] 重開分頁失敗: {e}")
+        self.next_health_check = time.monotonic() + HEALTH_INTERVAL
+        self.log_signal.emit(
+            f"瀏覽器復原完成 ({'備用' if from_standby else '冷啟動'}，{time.perf_counter() - started:.1f} 秒)")
+
+    def recover_tab(self, key):
+        """單一分頁崩潰或被關閉: 只重開該分頁"""
+        self.observed_keys.discard(key)
+        old_handle, self.sites[key]["handle"] = self.sites[key]["handle"], None
+        try:
+            if old_handle:
+                try:
+                    self.driver.switch_to.window(old_handle)
+                    self.driver.close()
+                except:
+                    pass
+            self.open_tab(key)
+            self.log_signal.emit(f"[{key}] 分頁已重開")
+        except Exception as e:
+            if classify_error(e) == "session" or not BrowserSupervisor.alive(self.driver):
+                self.recover_session()
+            else:
+                self.log_signal.emit(f"[{key}] 重開分頁失敗: {e}")
+
+    def pump_websocket(self):
+        """websocket 模式: 一次取回所有分頁的封包報價，回傳封包報價仍新鮮的券商"""
+        try:
+            quotes = self.ws_capture.poll(self.driver)
+        except Exception as e:
+            self.log_signal.emit(f"封包擷取失敗: {e}")
+            return set()
+        for key, bid, ask, ts in quotes:
+            self.price_signal.emit(key, bid, ask, format_page_ts(ts * 1000.0))
+        for key in {q[0] for q in quotes}:
+            self.status_signal.emit(key, "監控中")
+            self.note_ready(key)
+        return self.ws_capture.fresh_keys(WS_FALLBACK_SEC)
+
+    def drain_site(self, key):
+        """observer 模式: 一次取回該分頁自上輪以來的所有跳動"""
+        ticks, dropped = drain_ticks(self.driver, key)
+        if dropped:
+            self.log_signal.emit(f"[{key}] 頁面緩衝區已滿，遺失 {dropped} 筆跳動")
+        for bid, ask, page_ts in ticks:
+            self.price_signal.emit(key, bid, ask, format_page_ts(page_ts))
+        if ticks:
+            self.observed_keys.add(key)
+            self.status_signal.emit(key, "監控中")
+            return True
+        elif key not in self.observed_keys:
+            self.status_signal.emit(key, "等待數據")
+        return False
+
     def scrape_site(self, key, wait):
+        """擷取一次，成功發出報價時回傳 True"""
+        if CAPTURE_MODE == "observer" and has_observer(key):
+            return self.drain_site(key)
+
         now_str = time.strftime("%H:%M:%S")
         try:
             bid, ask = 0.0, 0.0
 
-            if key == "WF":
+            if EXTRACT_MODE == "js" and has_extractor(key):
+                # 一次往返: 頁面內定位 + 解析，並使用頁面端時間戳
+                quote = extract_quote(self.driver, key)
+                if quote is None:
+                    self.status_signal.emit(key, "等待數據")
+                    return
+                bid, ask, page_ts = quote
+                now_str = format_page_ts(page_ts)
+
+            elif key == "WF":
                 el = wait.until(EC.presence_of_element_located((By.ID, "pm-llg")))
                 lines = el.text.strip().split('\n')
                 if len(lines) > 3:
@@ -226,10 +360,14 @@ class UnifiedMonitorThread(QThread):
             if bid > 0 and ask > 0:
                 self.price_signal.emit(key, bid, ask, now_str)
                 self.status_signal.emit(key, "監控中")
+                return True
             else:
                 self.status_signal.emit(key, "數據異常")
 
-        except Exception:
+        except Exception as e:
+            if classify_error(e):
+                # 分頁或瀏覽器已失效，交給主迴圈復原
+                raise
             try:
                 self.driver.switch_to.default_content()
             except:
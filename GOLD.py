@@ -12,10 +12,11 @@ import os
 import json
 import time
 import threading
-import re
 import datetime
 import winsound
 import math
+import asyncio
+import multiprocessing
 
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QLabel, QLineEdit, QPushButton,
@@ -23,83 +24,163 @@ from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QFileDialog, QMessageBox, QTableWidget,
                              QTableWidgetItem, QHeaderView, QSplitter,
                              QListWidget, QStackedWidget, QFrame, QGroupBox, QTextBrowser,
-                             QCheckBox)
+                             QCheckBox, QComboBox)
 from PyQt6.QtCore import pyqtSignal, QThread, Qt, QTimer, QTime, pyqtSlot, QSize, QMutex
 from PyQt6.QtGui import QFont, QColor, QBrush, QIcon
 
 from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 
+from fast_extract import has_extractor, extract_quote, format_page_ts, NodeCacheStats
+from quote_observer import drain_ticks
+from ws_capture import WebSocketQuoteCapture, enable_logging as enable_ws_logging
+from cdp_engine import CdpEngine, debugger_address
+from process_workers import ProcessWorker
+from scheduler import LoadBalancer, AdaptivePollScheduler
+from http_fetch import HttpQuoteFetcher
+from browser_supervisor import BrowserSupervisor, classify_error, HEALTH_INTERVAL
+from resource_profile import resolve_profile, apply_profile, navigate, PageLoadGate
+from memory_governor import MemoryGovernor, format_memory
+from bringup import BringUpTracker, PROBE_INTERVAL
+from chrome_profile import ProfileStore, ConsentSeeder, SEED_MAX_STARTS, clear_stale_locks
+from tick_history import TickHistory
+from tick_archive import TickArchive
+from tick_store import TickStore, TickQuery
+from ohlc_bars import BarBook
+from consensus import QuoteConsensus, OUTLIER_Z
+from spread_stats import SpreadStats
+from staleness import StalenessTracker, AGING, STALE
+from quote_bus import QuoteBoard, QUOTE_DRAIN_HZ
+
 # --- 設定檔名稱 ---
 CONFIG_FILE = "monitor_config_v11.json"
 
 # --- 效能設定 ---
 WORKER_COUNT = 2  # 啟動 2 個瀏覽器分工
+WORKER_BACKEND = "thread"  # "thread"=QThread 引擎, "process"=每個引擎獨立行程 (當機自動重啟)
+DYNAMIC_BALANCE = True  # thread 引擎: 依實測擷取耗時在引擎間搬移分頁
+POLL_MODE = "adaptive"  # "adaptive"=依報價變動/接近警報調整各券商輪詢間隔, "round_robin"=固定輪詢
+ENGINE_MODE = "selenium"  # "selenium"=逐頁切換擷取, "cdp_async"=asyncio 原生 CDP 所有分頁同時擷取
 HEADLESS_MODE = True  # 開啟隱藏模式 (全站點適用)
+CAPTURE_MODE = "poll"  # "poll"=每輪讀取 DOM, "observer"=頁面內 MutationObserver 推播並批次取回, "websocket"=CDP 封包解碼
+WS_FALLBACK_SEC = 5.0  # websocket 模式下，封包報價超過此秒數未更新則改回讀取 DOM
+STANDBY_BROWSER = True  # 預先啟動一個備用 Chrome，瀏覽器失效時直接換上並只重開受影響的分頁
+PERSISTENT_PROFILE = False  # True=每個引擎使用持久化的 Chrome 設定檔 (保留 HTTP 快取與同意狀態)，False=每次全新暫存設定檔
+
+# --- 歷史資料 ---
+TICK_HISTORY = True  # 每個券商的報價寫入 tick_history/ 的記憶體映射環形緩衝區 (重啟後保留)
+TICK_ARCHIVE = False  # True=所有報價由背景執行緒批次寫入 tick_archive/ 的 Parquet (依日期/券商分區，需要 pyarrow)
+ARCHIVE_FLUSH_ROWS = 5000  # 封存批次寫出筆數
+ARCHIVE_FLUSH_SEC = 30.0  # 封存最長寫出間隔 (秒)
+TICK_STORE = False  # True=報價與警報事件寫入 SQLite (tick_store.db)，並顯示「歷史點差」分頁
+
+# --- 跨券商共識與點差統計 ---
+ANALYTICS_INTERVAL_MS = 250  # 共識價重新計算與統計欄重繪間隔 (每批報價一次)
+DEVIATION_ALERT_Z = None  # 例如 5.0: 券商中間價偏離共識的穩健 Z 分數超過此值時警報 (None=停用)
+ALERT_ONLY_ABNORMAL = False  # True=點差未高於該券商自身 P99 (常態偏寬) 時不發出層級警報
+
+# --- 報價匯流排 ---
+QUOTE_BUS = True  # True=Worker 報價寫入 QuoteBoard，GUI 以固定頻率合併重繪；False=每筆 price_signal 各自處理
+
+# --- 看板欄位 ---
+(COL_NAME, COL_BID, COL_ASK, COL_SPREAD, COL_DEV, COL_Z, COL_EWMA, COL_MEAN, COL_PCTL,
+ COL_TIME, COL_STATUS, COL_SOUND) = range(12)
 
 
 # ==========================================
 #  輔助與邏輯
 # ==========================================
 
-def parse_price(price_str):
+profile_store = ProfileStore()  # 本行程的 Chrome 設定檔目錄池
+
+
+def create_driver(profile=None):
+    """依全域設定啟動一個 Chrome (引擎與備用瀏覽器共用)；profile 為持久化設定檔名稱"""
+    chrome_options = Options()
+
+    # [關鍵修改] 全域隱藏視窗設定
+    if HEADLESS_MODE:
+        chrome_options.add_argument("--headless=new")
+
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument("--disable-extensions")
+    chrome_options.add_argument("--mute-audio")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+
+    # 圖片等資源改由各券商的 "resources" 設定逐分頁阻擋 (WF 使用 full 保留完整渲染)
+    # 載入策略與逾時也由各券商設定，瀏覽器本身不阻塞指令等待載入
+    chrome_options.page_load_strategy = 'none'
+
+    chrome_options.add_argument(
+        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_experimental_option('useAutomationExtension', False)
+
+    if CAPTURE_MODE == "websocket":
+        enable_ws_logging(chrome_options)
+    if ENGINE_MODE == "cdp_async":
+        # 允許引擎直接以 WebSocket 連線 DevTools
+        chrome_options.add_argument("--remote-allow-origins=*")
+
+    path = None
+    if PERSISTENT_PROFILE and profile:
+        path = profile_store.acquire(profile)
+        for arg in ProfileStore.chrome_args(path):
+            chrome_options.add_argument(arg)
     try:
-        if not price_str: return 0.0
-        first_part = str(price_str).replace(',', '').strip().split('\n')[0].split(' ')[0]
-        clean_str = re.sub(r'[^\d.]', '', first_part)
-        if clean_str.count('.') > 1:
-            parts = clean_str.split('.')
-            clean_str = f"{parts[0]}.{parts[1]}"
-        return float(clean_str) if clean_str else 0.0
-    except:
-        return 0.0
+        driver = webdriver.Chrome(options=chrome_options)
+    except Exception:
+        if path:
+            profile_store.release(path)
+        raise
+    driver.profile_path = path
+    driver.set_page_load_timeout(60)
+    return driver
 
 
 class BrowserWorker(QThread):
     log_signal = pyqtSignal(str)
     price_signal = pyqtSignal(str, float, float, str)
     status_signal = pyqtSignal(str, str)
+    memory_signal = pyqtSignal(str, float, int)  # (券商, JS heap MB, DOM 節點數)
     finished_signal = pyqtSignal()
 
-    def __init__(self, worker_id, assigned_sites):
+    def __init__(self, worker_id, assigned_sites, balancer=None, thresholds=None, supervisor=None):
         super().__init__()
         self.worker_id = worker_id
         self.assigned_sites = assigned_sites
+        self.balancer = balancer
+        self.supervisor = supervisor  # 共用的備用瀏覽器管理 (未指定時自行建立)
+        self.own_supervisor = False
+        self.next_health_check = 0.0
+        self.thresholds = thresholds if thresholds is not None else {}  # 各券商最低警報門檻 (GUI 端即時更新)
+        self.poll_scheduler = None
+        self.ws_fresh = set()
+        self.next_ws_pump = 0.0
         self.running = True
         self.driver = None
+        self.observed_keys = set()  # observer 模式下已收到首筆跳動的券商
+        self.ws_capture = WebSocketQuoteCapture() if CAPTURE_MODE == "websocket" else None
+        self.http_fetcher = HttpQuoteFetcher()  # "mode": "http" 的券商不開瀏覽器分頁
+        self.load_gate = PageLoadGate()  # 各券商的載入策略 / 逾時
+        self.memory = MemoryGovernor()  # 分頁記憶體取樣與超標回收
+        self.bringup = BringUpTracker()  # 各券商就緒判定與首筆報價耗時
+        self.consent = ConsentSeeder()  # 每個設定檔第一次開啟券商時按下同意按鈕
+        self.node_cache = NodeCacheStats()  # 頁面內節點快取的命中 / 未命中統計
 
     def setup_driver(self):
-        chrome_options = Options()
+        self.driver = create_driver(f"worker-{self.worker_id}")
 
-        # [關鍵修改] 全域隱藏視窗設定
-        if HEADLESS_MODE:
-            chrome_options.add_argument("--headless=new")
-
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_argument("--disable-extensions")
-        chrome_options.add_argument("--mute-audio")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-
-        # 保持圖片載入開啟 (註解掉這行)，確保 WF 在背景也能讀取數據
-        # chrome_options.add_argument("--blink-settings=imagesEnabled=false")
-
-        # 使用 normal 策略確保 JS 完整執行
-        chrome_options.page_load_strategy = 'normal'
-
-        chrome_options.add_argument(
-            "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-
-        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        chrome_options.add_experimental_option('useAutomationExtension', False)
-
-        self.driver = webdriver.Chrome(options=chrome_options)
-        self.driver.set_page_load_timeout(60)
+    def create_own_supervisor(self):
+        """未共用 GUI 的備用瀏覽器時 (獨立行程引擎)，建立本引擎自己的"""
+        self.supervisor = BrowserSupervisor(lambda: create_driver(f"worker-{self.worker_id}-standby"),
+                                            log=self.log_signal.emit, standby=STANDBY_BROWSER,
+                                            on_quit=profile_store.release_driver)
+        self.own_supervisor = True
 
     def run(self):
         try:
@@ -108,33 +189,47 @@ class BrowserWorker(QThread):
             self.log_signal.emit(
                 f"[Worker-{self.worker_id}] 啟動引擎 [{mode_str}]，負責: {list(self.assigned_sites.keys())}")
 
-            self.setup_driver()
-            wait = WebDriverWait(self.driver, 10)
-
             site_keys = list(self.assigned_sites.keys())
             if not site_keys: return
 
-            first_key = site_keys[0]
-            self.driver.get(self.assigned_sites[first_key]["url"])
-            self.assigned_sites[first_key]["handle"] = self.driver.current_window_handle
+            # HTTP 模式的券商不需要分頁；全部都是 HTTP 時連瀏覽器都不啟動
+            tab_keys = [k for k in site_keys if not self.is_http_site(k)]
+            for key in site_keys:
+                if key not in tab_keys:
+                    self.bringup.opened(key)
+            if tab_keys:
+                self.setup_driver()
+
+                # 所有分頁一次送出開啟，不等待載入；各券商探測成功即開始報價
+                # (初始空白分頁保留作為開新分頁用，不會在載入中的頁面上執行 window.open)
+                for key in tab_keys:
+                    if not self.running: break
+                    self.open_site_tab(key, self.assigned_sites[key])
+
+            self.log_signal.emit(f"[Worker-{self.worker_id}] 分頁已全部送出開啟，開始輪詢 (各券商就緒即開始報價)。")
 
-            for key in site_keys[1:]:
-                if not self.running: break
-                self.driver.execute_script(f"window.open('{self.assigned_sites[key]['url']}', '_blank');")
-                self.driver.switch_to.window(self.driver.window_handles[-1])
-                self.assigned_sites[key]["handle"] = self.driver.current_window_handle
-                time.sleep(1)
+            if self.supervisor is None and STANDBY_BROWSER and self.driver is not None:
+                # 獨立行程引擎: 各自預熱一個備用瀏覽器
+                self.create_own_supervisor()
+                self.supervisor.start()
 
-            self.log_signal.emit(f"[Worker-{self.worker_id}] 就緒，開始輪詢。")
+            if POLL_MODE == "adaptive":
+                self.poll_scheduler = AdaptivePollScheduler(self.assigned_sites, self.thresholds)
 
             while self.running:
-                for key in site_keys:
+                if self.driver is not None and time.monotonic() >= self.next_health_check:
+                    self.check_browser()
+                if self.balancer:
+                    self.apply_rebalance()
+                if self.poll_scheduler:
+                    self.run_scheduled_step()
+                    continue
+
+                ws_fresh = self.pump_websocket() if self.ws_capture and self.driver else set()
+                for key in list(self.assigned_sites.keys()):
                     if not self.running: break
-                    try:
-                        self.driver.switch_to.window(self.assigned_sites[key]["handle"])
-                        self.scrape_site(key, wait)
-                    except Exception as e:
-                        self.status_signal.emit(key, "連線/切換異常")
+                    if key in ws_fresh: continue
+                    self.poll_site(key)
 
                     QThread.msleep(50)
 
@@ -145,108 +240,347 @@ class BrowserWorker(QThread):
         except Exception as e:
             self.log_signal.emit(f"[Worker-{self.worker_id}] 核心錯誤: {str(e)}")
         finally:
+            if self.balancer:
+                # 異常結束時 (仍在執行中) 把負責的券商交給其他引擎接手，分頁 handle 屬於本引擎的瀏覽器，不帶過去
+                orphans = {k: dict(s, handle=None) for k, s in self.assigned_sites.items()} if self.running else None
+                self.balancer.unregister(self.worker_id, orphans)
+            if self.own_supervisor:
+                self.supervisor.shutdown()
             self.stop_driver()
             self.finished_signal.emit()
 
-    def scrape_site(self, key, wait):
-        now_str = datetime.datetime.now().strftime("%H:%M:%S")
+    def is_http_site(self, key):
+        site = self.assigned_sites.get(key, {})
+        return site.get("mode") == "http" and "http" in site
+
+    def poll_site(self, key):
+        """擷取一次 (HTTP 快速路徑或切換到該券商分頁)，回傳 (bid, ask) 或 None"""
+        started = time.perf_counter()
+        quote = None
+        site = self.assigned_sites[key]
+        use_tab = True
+        if self.is_http_site(key) and self.http_fetcher.use_http(key):
+            if not self.http_fetcher.due(key):
+                return None  # 未到 HTTP 最短請求間隔
+            quote = self.poll_http(key, site)
+            # 剛進入備援 (或重試仍未恢復) 的這一輪直接改由瀏覽器補抓
+            use_tab = self.http_fetcher.in_fallback(key)
+        if use_tab:
+            try:
+                if not site.get("handle"):
+                    if self.driver is None:
+                        self.setup_driver()
+                    self.open_site_tab(key, site)
+                self.driver.switch_to.window(site["handle"])
+                if self.page_loaded(key):
+                    if self.consent.pending(self.driver, key):
+                        self.seed_consent(key, site)
+                    quote = self.scrape_site(key, site)
+                    if self.memory.due(key):
+                        self.check_memory(key, site)
+            except Exception as e:
+                self.status_signal.emit(key, "連線/切換異常")
+                kind = classify_error(e)
+                if kind == "session":
+                    self.recover_session()
+                elif kind == "tab":
+                    self.recover_tab(key, site)
+        if quote is not None:
+            self.note_ready(key)
+        if self.balancer:
+            self.balancer.record(key, time.perf_counter() - started)
+        if self.node_cache.stats_due():
+            self.log_signal.emit(f"[Worker-{self.worker_id}] {self.node_cache.take_stats()}")
+        return quote
+
+    def seed_consent(self, key, site):
+        """按下同意 / Cookie 橫幅，避免遮住報價元素 (每個設定檔只做一次)"""
         try:
-            bid, ask = 0.0, 0.0
-            method_name = f"scrape_{key}"
-            if hasattr(self, method_name):
-                func = getattr(self, method_name)
-                bid, ask = func(wait)
-            else:
-                self.status_signal.emit(key, "未定義解析")
-                return
-
-            if bid > 0 and ask > 0:
-                self.price_signal.emit(key, bid, ask, now_str)
-                self.status_signal.emit(key, "監控中")
-            else:
-                self.status_signal.emit(key, "數據異常")
-
+            clicked = self.consent.seed(self.driver, key, site)
         except Exception as e:
-            try:
-                self.driver.switch_to.default_content()
-            except:
-                pass
+            if classify_error(e):
+                raise
+            return
+        if clicked:
+            self.log_signal.emit(f"[Worker-{self.worker_id}] {key} 已接受同意橫幅 ({clicked})")
+        elif not self.consent.pending(self.driver, key):
+            missed = self.consent.missed_starts(self.driver, key)
+            note = "不再嘗試" if missed >= SEED_MAX_STARTS else "下次啟動再試"
+            self.log_signal.emit(f"[Worker-{self.worker_id}] {key} 本次未發現同意橫幅 "
+                                 f"(連續 {missed}/{SEED_MAX_STARTS} 次)，{note}")
+
+    def note_ready(self, key):
+        """擷取成功；首次就緒時記錄首筆報價耗時"""
+        elapsed = self.bringup.mark(key)
+        if elapsed is None:
+            return
+        self.log_signal.emit(f"[Worker-{self.worker_id}] {key} 就緒，首筆報價耗時 {elapsed:.1f} 秒")
+        summary = self.bringup.all_ready()
+        if summary:
+            self.log_signal.emit(f"[Worker-{self.worker_id}] 全部 {summary[0]} 個券商就緒 (最慢 {summary[1]:.1f} 秒)")
+
+    def check_memory(self, key, site):
+        """取樣目前分頁的 JS heap / DOM 節點，超過預算則在原分頁重新載入"""
+        try:
+            heap_mb, nodes = self.memory.sample(self.driver, key, site["handle"])
+        except Exception as e:
+            if classify_error(e):
+                raise
+            return
+        self.memory_signal.emit(key, heap_mb, nodes)
+        reason = self.memory.over_budget(key, site, heap_mb, nodes)
+        if reason:
+            self.log_signal.emit(f"[Worker-{self.worker_id}] {key} 記憶體超標 ({reason})，重新載入分頁")
+            self.recycle_tab(key, site)
+
+    def recycle_tab(self, key, site):
+        """在原分頁重新導向券商網址，釋放舊文件的 JS heap 與 DOM (不影響其他分頁)"""
+        self.observed_keys.discard(key)
+        self.memory.recycled(key)
+        self.load_site(key, site)
+
+    def page_loaded(self, key):
+        """依券商的載入策略判斷是否可開始擷取 (目前分頁需為該券商分頁)"""
+        state = self.load_gate.check(self.driver, key)
+        if state == "loading":
+            self.status_signal.emit(key, "頁面載入中")
+            return False
+        if state == "timeout":
+            self.log_signal.emit(f"[Worker-{self.worker_id}] {key} 頁面載入逾時，仍嘗試擷取")
+        return True
+
+    def poll_http(self, key, site):
+        """HTTP 快速路徑: 連線池請求 + 正則解析，連續失敗則交給瀏覽器備援"""
+        try:
+            quote = self.http_fetcher.fetch(site["http"])
+        except Exception:
+            quote = None
+        state = self.http_fetcher.record(key, quote)
+        if state == "fallback":
+            self.log_signal.emit(f"[Worker-{self.worker_id}] {key} HTTP 擷取連續失敗，改用瀏覽器分頁")
+        elif state == "stale":
+            self.log_signal.emit(f"[Worker-{self.worker_id}] {key} HTTP 報價長時間未變動 (可能是靜態或快取頁面)，改用瀏覽器分頁")
+        elif state == "recovered":
+            self.log_signal.emit(f"[Worker-{self.worker_id}] {key} HTTP 擷取恢復，關閉瀏覽器分頁")
+            self.close_site_tab(key, site)
+
+        if self.http_fetcher.in_fallback(key):
+            return None  # 由瀏覽器分頁報價
+        if quote is not None:
+            self.price_signal.emit(key, quote[0], quote[1], datetime.datetime.now().strftime("%H:%M:%S"))
+            self.status_signal.emit(key, "監控中")
+        else:
+            self.status_signal.emit(key, "等待數據")
+        return quote
+
+    def close_site_tab(self, key, site):
+        self.bringup.forget(key)
+        self.load_gate.discard(key)
+        self.memory.forget(key, site.get("handle"))
+        if not site.get("handle") or self.driver is None:
+            return
+        try:
+            self.driver.switch_to.window(site["handle"])
+            self.driver.close()
+        except:
+            pass
+        site["handle"] = None
 
     # ==========================
-    #  各網站解析邏輯
+    #  瀏覽器健康檢查與復原
     # ==========================
-    def scrape_WF(self, wait):
-        """
-        WF 即使在 Headless 模式下，只要圖片載入開啟且 page_load_strategy 為 normal，
-        通常仍可抓取到文字。
-        """
+    def check_browser(self):
+        """定期確認 session 仍有效、各分頁仍存在"""
+        self.next_health_check = time.monotonic() + HEALTH_INTERVAL
         try:
-            # 尋找報價跑馬燈容器
-            el = wait.until(EC.visibility_of_element_located((By.ID, "pm-llg")))
+            handles = set(self.driver.window_handles)
+        except Exception:
+            self.recover_session()
+            return
+        for key, site in list(self.assigned_sites.items()):
+            if site.get("handle") and site["handle"] not in handles:
+                self.log_signal.emit(f"[Worker-{self.worker_id}] {key} 分頁已消失")
+                self.recover_tab(key, site)
+
+    def recover_session(self):
+        """整個瀏覽器失效: 換上備用瀏覽器，只重開原本在此瀏覽器上的分頁"""
+        started = time.perf_counter()
+        keys = [k for k, s in self.assigned_sites.items() if s.get("handle")]
+        self.log_signal.emit(f"[Worker-{self.worker_id}] 瀏覽器 session 失效，換上備用瀏覽器並重開 {len(keys)} 個分頁")
+        if self.supervisor is None:
+            self.create_own_supervisor()
+        if self.driver is not None:
+            self.supervisor.retire(self.driver)
+        self.driver = None
+        self.memory = MemoryGovernor()
+        self.observed_keys.difference_update(keys)
+        for key in keys:
+            self.assigned_sites[key]["handle"] = None
+            self.status_signal.emit(key, "瀏覽器復原中")
 
-            # 溫柔捲動
-            self.driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", el)
+        try:
+            self.driver, from_standby = self.supervisor.acquire()
+        except Exception as e:
+            # 沒有可用的瀏覽器，之後的輪詢會再嘗試啟動
+            self.log_signal.emit(f"[Worker-{self.worker_id}] 瀏覽器復原失敗: {e}")
+            return
+        for key in keys:
+            try:
+                self.open_site_tab(key, self.assigned_sites[key])
+            except Exception as e:
+                self.log_signal.emit(f"[Worker-{self.worker_id}] 重開 {key} 分頁失敗: {e}")
+        self.next_health_check = time.monotonic() + HEALTH_INTERVAL
+        self.log_signal.emit(
+            f"[Worker-{self.worker_id}] 瀏覽器復原完成 ({'備用' if from_standby else '冷啟動'}，"
+            f"{time.perf_counter() - started:.1f} 秒)")
+
+    def recover_tab(self, key, site):
+        """單一分頁崩潰或被關閉: 只重開該分頁"""
+        self.observed_keys.discard(key)
+        old_handle, site["handle"] = site.get("handle"), None
+        self.memory.forget(key, old_handle)
+        try:
+            if old_handle:
+                try:
+                    self.driver.switch_to.window(old_handle)
+                    self.driver.close()
+                except:
+                    pass
+            self.open_site_tab(key, site)
+            self.log_signal.emit(f"[Worker-{self.worker_id}] {key} 分頁已重開")
+        except Exception as e:
+            if classify_error(e) == "session" or not BrowserSupervisor.alive(self.driver):
+                self.recover_session()
+            else:
+                self.log_signal.emit(f"[Worker-{self.worker_id}] 重開 {key} 分頁失敗: {e}")
+
+    def run_scheduled_step(self):
+        """adaptive 模式: 取出最早到期的券商擷取一次，尚未到期則短暫休息"""
+        if self.ws_capture and self.driver and time.monotonic() >= self.next_ws_pump:
+            self.ws_fresh = self.pump_websocket()
+            self.next_ws_pump = time.monotonic() + 0.5
+
+        key, delay = self.poll_scheduler.next_due()
+        if key is None or delay > 0:
+            QThread.msleep(int(min(delay, 0.1) * 1000) + 1)
+            return
+        if key in self.ws_fresh:
+            # 封包報價仍新鮮，不需讀 DOM，依封包報價決定下次間隔
+            self.poll_scheduler.report(key, self.ws_capture.last_quote.get(key))
+            return
+        quote = self.poll_site(key)
+        if quote is None and self.bringup.pending(key):
+            # 尚未就緒: 固定短間隔探測，不讓自適應間隔在載入期間被放大
+            self.poll_scheduler.retry(key, PROBE_INTERVAL)
+        else:
+            self.poll_scheduler.report(key, quote)
+
+    def open_site_tab(self, key, site):
+        """在本引擎的瀏覽器開啟新分頁並記錄 handle"""
+        handles = self.driver.window_handles
+        self.driver.switch_to.window(handles[0])
+        before = set(handles)
+        # 先開空白分頁，套用阻擋清單後再導向，第一次載入就生效
+        self.driver.execute_script("window.open('about:blank', '_blank');")
+        new_handles = [h for h in self.driver.window_handles if h not in before]
+        site["handle"] = new_handles[0] if new_handles else self.driver.window_handles[-1]
+        self.driver.switch_to.window(site["handle"])
+        self.load_site(key, site)
+
+    def load_site(self, key, site):
+        """在目前分頁 (該券商的 handle) 套用資源設定並導向券商網址"""
+        profile = resolve_profile(site)
+        if profile["patterns"] and not apply_profile(self.driver, profile):
+            self.log_signal.emit(f"[Worker-{self.worker_id}] {key} 無法套用資源阻擋，改為完整載入")
+        navigate(self.driver, site["url"])
+        self.load_gate.start(key, profile)
+        self.bringup.opened(key)
+        if self.ws_capture:
+            self.ws_capture.bind(site["handle"], key)
+
+    def apply_rebalance(self):
+        """處理負載平衡交接: 先交出被指派搬走的分頁，再接手其他引擎交來的分頁"""
+        for key in self.balancer.take_releases(self.worker_id):
+            site = self.assigned_sites.pop(key, None)
+            if site is None: continue
+            self.close_site_tab(key, site)
+            if self.poll_scheduler:
+                self.poll_scheduler.remove(key)
+            self.balancer.hand_over(key, site)
+
+        for key, site in self.balancer.take_adoptions(self.worker_id):
+            # 先登記，分頁開啟失敗時 poll_site 會再補開
+            self.assigned_sites[key] = site
+            if self.poll_scheduler:
+                self.poll_scheduler.add(key, site)
+            try:
+                if not self.is_http_site(key):
+                    if self.driver is None:
+                        self.setup_driver()
+                    self.open_site_tab(key, site)
+                self.log_signal.emit(f"[Worker-{self.worker_id}] 接手 {key}")
+            except Exception as e:
+                self.log_signal.emit(f"[Worker-{self.worker_id}] 接手 {key} 失敗: {e}")
+                self.status_signal.emit(key, "連線/切換異常")
+            self.balancer.adopted(key)
+
+    def pump_websocket(self):
+        """websocket 模式: 一次取回所有分頁的封包報價，回傳封包報價仍新鮮的券商"""
+        try:
+            quotes = self.ws_capture.poll(self.driver)
+        except Exception as e:
+            self.log_signal.emit(f"[Worker-{self.worker_id}] 封包擷取失敗: {e}")
+            return set()
+        for key, bid, ask, ts in quotes:
+            self.price_signal.emit(key, bid, ask, format_page_ts(ts * 1000.0))
+        for key in {q[0] for q in quotes}:
+            self.status_signal.emit(key, "監控中")
+            self.note_ready(key)
+        return self.ws_capture.fresh_keys(WS_FALLBACK_SEC)
+
+    def drain_site(self, key, spec):
+        """observer 模式: 一次取回該分頁自上輪以來的所有跳動"""
+        ticks, dropped = drain_ticks(self.driver, key, spec, self.node_cache)
+        if dropped:
+            self.log_signal.emit(f"[{key}] 頁面緩衝區已滿，遺失 {dropped} 筆跳動")
+        for bid, ask, page_ts in ticks:
+            self.price_signal.emit(key, bid, ask, format_page_ts(page_ts))
+        if ticks:
+            self.observed_keys.add(key)
+            self.status_signal.emit(key, "監控中")
+            return ticks[-1][0], ticks[-1][1]
+        elif key not in self.observed_keys:
+            self.status_signal.emit(key, "等待數據")
+        return None
+
+    def scrape_site(self, key, site):
+        """所有券商都走同一條頁面內擷取路徑 (規格見 broker_spec；站點設定可用 "extract" 覆寫或新增)"""
+        spec = site.get("extract")
+        if not has_extractor(key, spec):
+            self.status_signal.emit(key, "未定義解析")
+            return None
+        if CAPTURE_MODE == "observer":
+            return self.drain_site(key, spec)
 
-            text = self.driver.execute_script("return arguments[0].innerText;", el)
-            lines = text.strip().split('\n')
+        try:
+            # 一次往返: 頁面內定位 + 解析，並使用頁面端時間戳
+            quote = extract_quote(self.driver, key, spec, self.node_cache)
+            if quote is None:
+                self.status_signal.emit(key, "等待數據")
+                return None
+            bid, ask, page_ts = quote
+            if bid > 0 and ask > 0:
+                self.price_signal.emit(key, bid, ask, format_page_ts(page_ts))
+                self.status_signal.emit(key, "監控中")
+                return bid, ask
+            else:
+                self.status_signal.emit(key, "數據異常")
 
-            # WF 格式: 名稱 / 代碼 / Bid / Ask
-            if len(lines) > 3:
-                return parse_price(lines[2]), parse_price(lines[3])
-        except:
-            pass
-        return 0.0, 0.0
-
-    def scrape_IG(self, wait):
-        bid_el = wait.until(
-            EC.visibility_of_element_located((By.CSS_SELECTOR, ".price-ticket__button--sell .price-ticket__price")))
-        ask_el = wait.until(
-            EC.visibility_of_element_located((By.CSS_SELECTOR, ".price-ticket__button--buy .price-ticket__price")))
-        return parse_price(bid_el.text), parse_price(ask_el.text)
-
-    def scrape_Forex(self, wait):
-        row = wait.until(EC.presence_of_element_located((By.XPATH, "//tr[.//a[@title='XAU USD']]")))
-        return parse_price(row.find_element(By.CSS_SELECTOR, ".mp__td--Bid").text), \
-            parse_price(row.find_element(By.CSS_SELECTOR, ".mp__td--Offer").text)
-
-    def scrape_MW(self, wait):
-        return parse_price(wait.until(EC.presence_of_element_located((By.ID, "XAUUSD1"))).text), \
-            parse_price(wait.until(EC.presence_of_element_located((By.ID, "XAUUSD2"))).text)
-
-    def scrape_Axi(self, wait):
-        row = wait.until(EC.presence_of_element_located((By.ID, "XAUUSD"))).find_element(By.XPATH, "./ancestor::tr")
-        cells = row.find_elements(By.CLASS_NAME, "price")
-        return parse_price(cells[0].text), parse_price(cells[1].text)
-
-    def scrape_Capital(self, wait):
-        btn = wait.until(EC.presence_of_element_located(
-            (By.XPATH, "//span[contains(text(), 'Gold Spot') or contains(text(), '現貨黃金')]/ancestor::button")))
-        txt = self.driver.execute_script("return arguments[0].innerText;", btn).split('\n')
-        return parse_price(txt[2]), parse_price(txt[3])
-
-    def scrape_VT(self, wait):
-        row = wait.until(EC.presence_of_element_located((By.XPATH, "//td[@data-symbol='XAUUSD']/ancestor::tr")))
-        bid_el = row.find_element(By.XPATH, ".//td[contains(@class, 'bid_text')]")
-        ask_el = row.find_element(By.XPATH, ".//td[contains(@class, 'ask_text')]")
-        b_val, a_val = bid_el.get_attribute("data"), ask_el.get_attribute("data")
-        return parse_price(b_val if b_val else bid_el.text), parse_price(a_val if a_val else ask_el.text)
-
-    def scrape_Markets(self, wait):
-        bid_el = wait.until(
-            EC.visibility_of_element_located((By.CSS_SELECTOR, ".instrument-buttons .cta-sell span[data-sell]")))
-        ask_el = wait.until(
-            EC.visibility_of_element_located((By.CSS_SELECTOR, ".instrument-buttons .cta-buy span[data-buy]")))
-        return parse_price(bid_el.text), parse_price(ask_el.text)
-
-    def scrape_IFC(self, wait):
-        bid_el = wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, ".current_instrument_bid")))
-        ask_el = wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, ".current_instrument_ask")))
-        return parse_price(bid_el.text), parse_price(ask_el.text)
-
-    def scrape_CMC(self, wait):
-        bid_el = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "span[data-jsonfeed='sell']")))
-        ask_el = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "span[data-jsonfeed='buy']")))
-        return parse_price(bid_el.text), parse_price(ask_el.text)
+        except Exception as e:
+            if classify_error(e):
+                # 分頁或瀏覽器已失效，交給 poll_site 復原
+                raise
+        return None
 
     def stop(self):
         self.running = False
@@ -257,9 +591,34 @@ class BrowserWorker(QThread):
                 self.driver.quit()
             except:
                 pass
+            profile_store.release_driver(self.driver)
             self.driver = None
 
 
+class CdpWorker(BrowserWorker):
+    """
+    asyncio + 原生 CDP 引擎：每個分頁各自一條 CDP 連線，所有券商同時擷取。
+    發出的訊號與 BrowserWorker 相同，GUI 端不需區分。
+    """
+
+    def run(self):
+        try:
+            self.log_signal.emit(
+                f"[CDP-{self.worker_id}] 啟動 asyncio 引擎，負責: {list(self.assigned_sites.keys())}")
+            self.setup_driver()
+            engine = CdpEngine(debugger_address(self.driver), self.assigned_sites,
+                               on_quote=self.price_signal.emit,
+                               on_status=self.status_signal.emit,
+                               on_log=lambda msg: self.log_signal.emit(f"[CDP-{self.worker_id}] {msg}"),
+                               is_running=lambda: self.running)
+            asyncio.run(engine.run())
+        except Exception as e:
+            self.log_signal.emit(f"[CDP-{self.worker_id}] 核心錯誤: {str(e)}")
+        finally:
+            self.stop_driver()
+            self.finished_signal.emit()
+
+
 # ==========================================
 #  UI 樣式與設計
 # ==========================================
@@ -302,20 +661,31 @@ class GoldMonitorApp(QMainWindow):
         self.setStyleSheet(DARK_STYLESHEET)
 
         self.workers = []
+        self.balancer = LoadBalancer()
+        self.balancer.log = self.audio_log_signal.emit  # 由引擎執行緒呼叫，經訊號轉回主執行緒
+        # thread 引擎共用一個備用瀏覽器 (process 引擎在各自行程內建立)
+        self.supervisor = BrowserSupervisor(lambda: create_driver("standby"), log=self.audio_log_signal.emit,
+                                            standby=STANDBY_BROWSER, on_quit=profile_store.release_driver)
         self.setting_inputs = {}
         self.alert_status_labels = {}
         self.last_triggered_levels = {}
+        self.alert_thresholds = {}  # 各券商最低警報門檻，供引擎自適應輪詢參考
         self.sound_checkboxes = {}
         self.chk_all_sound = None
 
         # 定義全站點資料 (已移除 KVB)
         self.all_sites_config = {
-            "WF": {"url": "https://www.wfbullion.com/mq.html", "handle": None, "name": "永豐金業"},
+            "WF": {"url": "https://www.wfbullion.com/mq.html", "handle": None, "name": "永豐金業",
+                   "poll_interval": (1.0, 8.0),
+                   "resources": "full"},  # 需要圖片與完整渲染才讀得到報價
             "IG": {"url": "https://www.ig.com/cn/commodities/markets-commodities/gold", "handle": None,
                    "name": "IG Markets"},
             "Forex": {"url": "https://www.forex.com/cn/markets-to-trade/precious-metals/", "handle": None,
                       "name": "Forex.com"},
-            "MW": {"url": "https://www.mw801.com/", "handle": None, "name": "英皇金業"},
+            # "http" 為 HTTP 快速路徑的擷取規格；確認靜態頁面帶有即時報價後，加上 "mode": "http" 才會啟用
+            "MW": {"url": "https://www.mw801.com/", "handle": None, "name": "英皇金業",
+                   "http": {"url": "https://www.mw801.com/", "format": "html",
+                            "bid": {"id": "XAUUSD1"}, "ask": {"id": "XAUUSD2"}}},
             "Axi": {"url": "https://www.axi.com/int/trade/cfds/commodities", "handle": None, "name": "Axi"},
             "Capital": {"url": "https://capital.com/zh-hant/markets/commodities", "handle": None,
                         "name": "Capital.com"},
@@ -324,12 +694,40 @@ class GoldMonitorApp(QMainWindow):
                 "handle": None, "name": "VT Markets"},
             "Markets": {"url": "https://www.markets.com/instrument/gold/", "handle": None, "name": "Markets.com"},
             "IFC": {"url": "https://www.ifcmarkets.com/en/trading-conditions/precious-metals/xauusd", "handle": None,
-                    "name": "IFC Markets"},
+                    "name": "IFC Markets",
+                    "http": {"url": "https://www.ifcmarkets.com/en/trading-conditions/precious-metals/xauusd",
+                             "format": "html",
+                             "bid": {"class": "current_instrument_bid"}, "ask": {"class": "current_instrument_ask"}}},
             "CMC": {"url": "https://www.cmcmarkets.com/en-au/instruments/gold-cash", "handle": None,
                     "name": "CMC Markets"},
         }
         self.broker_keys = list(self.all_sites_config.keys())
         self.row_map = {key: i for i, key in enumerate(self.broker_keys)}
+        self.status_text = {}  # 券商 -> 最新狀態訊息
+        self.memory_text = {}  # 券商 -> 最新分頁記憶體取樣
+        self.tick_history = TickHistory() if TICK_HISTORY else None
+        self.bars = BarBook()  # 1 秒 / 1 分 / 5 分 K 線 (中間價與點差)，供趨勢圖與報表讀取
+        self.consensus = QuoteConsensus(self.broker_keys)
+        self.deviation_alerted = set()  # 目前處於偏離警報狀態的券商 (只在進入時警報一次)
+        self.spread_stats = {key: SpreadStats() for key in self.broker_keys}
+        self.stats_dirty = set()  # 上次重繪後有新報價的券商
+        # 報價停滯: 各券商門檻可在站點設定 "stale_sec" 覆寫；停滯者排除於共識與警報之外
+        self.staleness = StalenessTracker(
+            self.broker_keys, {k: self.all_sites_config[k].get("stale_sec") for k in self.broker_keys})
+        self.stale_mask = self.staleness.stale_mask(time.time())
+        self.stale_level = {}  # 券商 -> 停滯等級
+        self.age_text = {}  # 券商 -> 狀態欄顯示的報價年齡
+        self.alert_label_state = {}  # (券商, 層級) -> 是否觸發，狀態改變時才重設標籤樣式
+        self.spread_bg = {}  # 券商 -> 點差欄目前底色
+        self.z_outlier = {}  # 券商 -> Z 欄目前是否以離群色顯示
+        self.z_alerted = {}  # 券商 -> Z 欄目前是否以偏離警報底色顯示
+        self.quote_board = QuoteBoard() if QUOTE_BUS else None
+        self.tick_archive = None
+        if TICK_ARCHIVE:
+            self.tick_archive = TickArchive(flush_rows=ARCHIVE_FLUSH_ROWS, flush_interval=ARCHIVE_FLUSH_SEC,
+                                            log=self.audio_log_signal.emit)
+        self.tick_store = TickStore(log=self.audio_log_signal.emit) if TICK_STORE else None
+        self.tick_query = TickQuery() if TICK_STORE else None
 
         self.init_ui()
 
@@ -337,8 +735,21 @@ class GoldMonitorApp(QMainWindow):
         self.clock_timer.timeout.connect(self.update_realtime_clock)
         self.clock_timer.start(1000)
 
+        self.analytics_timer = QTimer(self)
+        self.analytics_timer.timeout.connect(self.refresh_analytics)
+        self.analytics_timer.start(ANALYTICS_INTERVAL_MS)
+
+        if self.quote_board:
+            self.quote_timer = QTimer(self)
+            self.quote_timer.timeout.connect(self.drain_quotes)
+            self.quote_timer.start(1000 // QUOTE_DRAIN_HZ)
+
         self.audio_log_signal.connect(self.log_message)
         self.load_settings()
+        if self.tick_archive:
+            self.tick_archive.start()
+        if self.tick_store:
+            self.tick_store.start()
 
     def init_ui(self):
         main_widget = QWidget()
@@ -365,6 +776,12 @@ class GoldMonitorApp(QMainWindow):
         top_bar.addWidget(self.btn_start)
         top_bar.addWidget(self.btn_stop)
         top_bar.addStretch()
+        self.lbl_consensus = QLabel("--")
+        self.lbl_consensus.setFont(QFont("Consolas", 16, QFont.Weight.Bold))
+        self.lbl_consensus.setStyleSheet("color: #dcdcaa;")
+        top_bar.addWidget(QLabel("共識中間價:"))
+        top_bar.addWidget(self.lbl_consensus)
+        top_bar.addSpacing(20)
         top_bar.addWidget(QLabel("系統時間:"))
         top_bar.addWidget(self.lbl_clock)
         main_layout.addLayout(top_bar)
@@ -377,6 +794,13 @@ class GoldMonitorApp(QMainWindow):
         self.setup_monitor_tab()
         self.tabs.addTab(self.tab_monitor, "即時行情看板")
 
+        if self.tick_query:
+            self.tab_history = QWidget()
+            self.setup_history_tab()
+            self.tabs.addTab(self.tab_history, "歷史點差")
+            self.tabs.currentChanged.connect(
+                lambda i: self.refresh_history() if self.tabs.widget(i) is self.tab_history else None)
+
         self.tab_settings = QWidget()
         self.setup_settings_tab()
         self.tabs.addTab(self.tab_settings, "點差警報設定")
@@ -406,15 +830,21 @@ class GoldMonitorApp(QMainWindow):
         layout.addLayout(ctrl_layout)
 
         self.table = QTableWidget()
-        self.table.setColumnCount(7)
+        self.table.setColumnCount(12)
         self.table.setHorizontalHeaderLabels(
-            ["券商 (Broker)", "Bid (賣出)", "Ask (買入)", "點差 (Spread)", "最後更新", "狀態", "音效 (Sound)"])
+            ["券商 (Broker)", "Bid (賣出)", "Ask (買入)", "點差 (Spread)", "偏離 (pips)", "Z 分數",
+             "EWMA", "均值 ± σ", "P50 / P95 / P99", "最後更新", "狀態", "音效 (Sound)"])
         self.table.setRowCount(len(self.broker_keys))
 
         header = self.table.horizontalHeader()
         header.setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        header.setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
-        header.setSectionResizeMode(6, QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(COL_NAME, QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(COL_SOUND, QHeaderView.ResizeMode.ResizeToContents)
+        self.table.horizontalHeaderItem(COL_DEV).setToolTip("中間價減去所有券商中間價的中位數")
+        self.table.horizontalHeaderItem(COL_Z).setToolTip(f"穩健 Z 分數 (以 MAD 標準化)，|Z| ≥ {OUTLIER_Z} 標紅")
+        self.table.horizontalHeaderItem(COL_EWMA).setToolTip("點差指數加權移動平均")
+        self.table.horizontalHeaderItem(COL_MEAN).setToolTip("最近一段報價的點差平均與標準差")
+        self.table.horizontalHeaderItem(COL_PCTL).setToolTip("本次執行以來點差的中位數與第 95 / 99 百分位 (串流估計)")
 
         self.table.verticalHeader().setVisible(False)
         self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
@@ -427,34 +857,39 @@ class GoldMonitorApp(QMainWindow):
             item_name = QTableWidgetItem(self.all_sites_config[key]["name"])
             item_name.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
             item_name.setFont(QFont("Microsoft JhengHei", 11, QFont.Weight.Bold))
-            self.table.setItem(row, 0, item_name)
+            self.table.setItem(row, COL_NAME, item_name)
 
             item_bid = QTableWidgetItem("0.00")
             item_bid.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
             item_bid.setForeground(QColor("#4ec9b0"))
             item_bid.setFont(font_price)
-            self.table.setItem(row, 1, item_bid)
+            self.table.setItem(row, COL_BID, item_bid)
 
             item_ask = QTableWidgetItem("0.00")
             item_ask.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
             item_ask.setForeground(QColor("#f44747"))
             item_ask.setFont(font_price)
-            self.table.setItem(row, 2, item_ask)
+            self.table.setItem(row, COL_ASK, item_ask)
 
             item_spread = QTableWidgetItem("0.00")
             item_spread.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
             item_spread.setForeground(QColor("#dcdcaa"))
             item_spread.setFont(font_spread)
-            self.table.setItem(row, 3, item_spread)
+            self.table.setItem(row, COL_SPREAD, item_spread)
+
+            for col in (COL_DEV, COL_Z, COL_EWMA, COL_MEAN, COL_PCTL):
+                item_dev = QTableWidgetItem("--")
+                item_dev.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+                self.table.setItem(row, col, item_dev)
 
             item_time = QTableWidgetItem("--:--:--")
             item_time.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.table.setItem(row, 4, item_time)
+            self.table.setItem(row, COL_TIME, item_time)
 
             item_status = QTableWidgetItem("等待中")
             item_status.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
             item_status.setForeground(QColor("#f44747"))
-            self.table.setItem(row, 5, item_status)
+            self.table.setItem(row, COL_STATUS, item_status)
 
             # 音效開關
             container = QWidget()
@@ -469,7 +904,7 @@ class GoldMonitorApp(QMainWindow):
                 lambda checked, k=key: self.log_message(f"[{self.all_sites_config[k]['name']}] 音效切換: {checked}"))
 
             chk_layout.addWidget(chk_sound)
-            self.table.setCellWidget(row, 6, container)
+            self.table.setCellWidget(row, COL_SOUND, container)
             self.sound_checkboxes[key] = chk_sound
 
         layout.addWidget(self.table)
@@ -481,6 +916,90 @@ class GoldMonitorApp(QMainWindow):
             if chk.isChecked() != checked:
                 chk.setChecked(checked)
 
+    def setup_history_tab(self):
+        layout = QVBoxLayout(self.tab_history)
+        ctrl_layout = QHBoxLayout()
+        ctrl_layout.addWidget(QLabel("查詢範圍:"))
+        self.cmb_history_days = QComboBox()
+        for days in (1, 7, 30):
+            self.cmb_history_days.addItem(f"最近 {days} 天", days)
+        self.cmb_history_days.setCurrentIndex(1)
+        self.cmb_history_days.currentIndexChanged.connect(self.refresh_history)
+        btn_refresh = QPushButton("重新整理")
+        btn_refresh.clicked.connect(self.refresh_history)
+        ctrl_layout.addWidget(self.cmb_history_days)
+        ctrl_layout.addWidget(btn_refresh)
+        ctrl_layout.addStretch()
+        layout.addLayout(ctrl_layout)
+
+        splitter = QSplitter(Qt.Orientation.Vertical)
+
+        # 每小時最大點差 (列=小時，欄=券商)
+        self.table_history = QTableWidget()
+        self.table_history.setColumnCount(len(self.broker_keys) + 1)
+        self.table_history.setHorizontalHeaderLabels(
+            ["時間"] + [self.all_sites_config[k]["name"] for k in self.broker_keys])
+        self.table_history.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table_history.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
+        self.table_history.verticalHeader().setVisible(False)
+        self.table_history.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+
+        # 警報事件
+        self.table_alerts = QTableWidget()
+        self.table_alerts.setColumnCount(4)
+        self.table_alerts.setHorizontalHeaderLabels(["時間", "券商", "層級", "點差"])
+        self.table_alerts.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table_alerts.verticalHeader().setVisible(False)
+        self.table_alerts.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+
+        splitter.addWidget(self.table_history)
+        splitter.addWidget(self.table_alerts)
+        splitter.setSizes([450, 150])
+        layout.addWidget(splitter)
+
+    def refresh_history(self):
+        """從 SQLite 每小時彙總表讀出各券商最大點差 (新到舊)，超過最低警報門檻的格子標紅"""
+        days = self.cmb_history_days.currentData()
+        self.refresh_alert_thresholds()
+        try:
+            rows = self.tick_query.hourly_spread(days)
+            alerts = self.tick_query.alerts(days)
+        except Exception as e:
+            self.log_message(f"歷史查詢失敗: {e}")
+            return
+        hours = sorted({r[1] for r in rows}, reverse=True)
+        hour_row = {h: i for i, h in enumerate(hours)}
+        col_map = {key: i + 1 for i, key in enumerate(self.broker_keys)}
+
+        self.table_history.clearContents()
+        self.table_history.setRowCount(len(hours))
+        for h, i in hour_row.items():
+            item = QTableWidgetItem(datetime.datetime.fromtimestamp(h).strftime("%m-%d %H:00"))
+            item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+            self.table_history.setItem(i, 0, item)
+        for broker, hour, max_spread, avg_spread, count in rows:
+            if broker not in col_map: continue
+            item = QTableWidgetItem(f"{max_spread:.2f}")
+            item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+            item.setToolTip(f"平均 {avg_spread:.3f} / {count} 筆")
+            thresh = self.alert_thresholds.get(broker)
+            if thresh and max_spread >= thresh:
+                item.setBackground(QColor("#660000"))
+            self.table_history.setItem(hour_row[hour], col_map[broker], item)
+
+        self.table_alerts.clearContents()
+        self.table_alerts.setRowCount(len(alerts))
+        for i, (broker, ts, level, spread, message) in enumerate(alerts):
+            name = self.all_sites_config.get(broker, {}).get("name", broker)
+            values = [datetime.datetime.fromtimestamp(ts).strftime("%m-%d %H:%M:%S"), name,
+                      f"Level {level}" if level else "偏離共識", f"{spread:.2f}"]
+            for col, text in enumerate(values):
+                item = QTableWidgetItem(text)
+                item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+                if message:
+                    item.setToolTip(message)
+                self.table_alerts.setItem(i, col, item)
+
     def setup_settings_tab(self):
         layout = QVBoxLayout(self.tab_settings)
         splitter = QSplitter(Qt.Orientation.Horizontal)
@@ -590,28 +1109,74 @@ class GoldMonitorApp(QMainWindow):
         self.btn_start.setEnabled(False)
         self.btn_stop.setEnabled(True)
         self.last_triggered_levels = {}
+        self.deviation_alerted.clear()
+        self.refresh_alert_thresholds()
         self.log_message(f">>> 監控系統啟動，配置 {WORKER_COUNT} 個並行引擎...")
+        if PERSISTENT_PROFILE:
+            profile_store.cleanup(self.log_message)
 
         keys = list(self.all_sites_config.keys())
         chunk_size = math.ceil(len(keys) / WORKER_COUNT)
 
         self.workers = []
-        for i in range(WORKER_COUNT):
-            start_idx = i * chunk_size
-            end_idx = start_idx + chunk_size
-            worker_keys = keys[start_idx:end_idx]
+        if ENGINE_MODE == "cdp_async":
+            # 單一瀏覽器、所有分頁並行，不需分工
+            self.attach_worker(self.create_worker(CdpWorker, 1, {k: self.all_sites_config[k].copy() for k in keys}))
+            return
+
+        use_balancer = DYNAMIC_BALANCE and WORKER_BACKEND == "thread"
+        if WORKER_BACKEND == "thread":
+            self.supervisor.start()
+        if use_balancer:
+            # 依上次執行量測到的耗時做初始分配，執行中再動態搬移
+            groups = self.balancer.initial_assignment(keys, WORKER_COUNT)
+        else:
+            groups = [keys[i * chunk_size:(i + 1) * chunk_size] for i in range(WORKER_COUNT)]
 
+        for i, worker_keys in enumerate(groups):
             if not worker_keys: continue
 
             worker_sites = {k: self.all_sites_config[k].copy() for k in worker_keys}
 
-            worker = BrowserWorker(i + 1, worker_sites)
-            worker.log_signal.connect(self.log_message)
+            if use_balancer:
+                self.balancer.register(i + 1, worker_keys)
+                self.attach_worker(BrowserWorker(i + 1, worker_sites, self.balancer, self.alert_thresholds,
+                                                 supervisor=self.supervisor))
+            else:
+                self.attach_worker(self.create_worker(BrowserWorker, i + 1, worker_sites))
+
+    def create_worker(self, worker_cls, worker_id, sites):
+        if WORKER_BACKEND == "process":
+            cleanup = (lambda: clear_stale_locks(f"worker-{worker_id}")) if PERSISTENT_PROFILE else None
+            return ProcessWorker(worker_cls, worker_id, sites, cleanup=cleanup,
+                                 thresholds=dict(self.alert_thresholds))
+        return worker_cls(worker_id, sites, thresholds=self.alert_thresholds, supervisor=self.supervisor)
+
+    def attach_worker(self, worker):
+        worker.log_signal.connect(self.log_message)
+        if self.quote_board:
+            # 直接在發出訊號的執行緒寫入看板，不經過 Qt 事件佇列
+            worker.price_signal.connect(self.quote_board.publish, Qt.ConnectionType.DirectConnection)
+        else:
             worker.price_signal.connect(self.on_price_update)
-            worker.status_signal.connect(self.on_status_update)
-            worker.finished_signal.connect(self.on_worker_finished)
-            self.workers.append(worker)
-            worker.start()
+        worker.status_signal.connect(self.on_status_update)
+        if hasattr(worker, "memory_signal"):
+            worker.memory_signal.connect(self.on_memory_update)
+        worker.finished_signal.connect(self.on_worker_finished)
+        self.workers.append(worker)
+        worker.start()
+
+    def refresh_alert_thresholds(self):
+        """從設定頁讀出各券商最低警報門檻 (就地更新，thread 引擎共用同一份 dict)"""
+        for key, inputs in self.setting_inputs.items():
+            values = []
+            for item in inputs:
+                try:
+                    values.append(float(item['diff'].text()))
+                except:
+                    pass
+            positive = [v for v in values if v > 0]
+            self.alert_thresholds[key] = min(positive) if positive else None
 
     def stop_monitor(self):
         self.log_message("正在發送停止信號給所有引擎...")
@@ -623,38 +1188,185 @@ class GoldMonitorApp(QMainWindow):
         all_stopped = all(not w.isRunning() for w in self.workers)
         if all_stopped:
             self.log_message(">>> 所有監控引擎已安全停止")
+            self.balancer.reset()
+            self.supervisor.shutdown()
+            if self.tick_history:
+                self.tick_history.flush()
             self.btn_start.setEnabled(True)
             self.btn_stop.setEnabled(False)
             self.workers.clear()
 
     def on_price_update(self, source, bid, ask, time_str):
+        """未啟用報價匯流排時: 每筆報價各自處理並重繪"""
         if source not in self.row_map: return
-        row = self.row_map[source]
+        self.process_quote(source, bid, ask, time.time())
+        self.render_quote(source, bid, ask, time_str)
+
+    def drain_quotes(self):
+        """固定頻率取出匯流排: 每一筆跳動都進入統計與警報，表格每個券商只重繪最新一筆"""
+        dirty, ticks, dropped = self.quote_board.drain()
+        if dropped:
+            self.log_message(f"報價匯流排積壓過多，遺失 {dropped} 筆跳動")
+        for seq, source, bid, ask, time_str, ts in ticks:
+            if source in self.row_map:
+                self.process_quote(source, bid, ask, ts)
+        for source, (seq, bid, ask, time_str, ts) in dirty.items():
+            if source in self.row_map:
+                self.render_quote(source, bid, ask, time_str)
+
+    def process_quote(self, source, bid, ask, ts):
+        """單筆報價的資料處理: 歷史、K 線、共識、統計、停滯與警報 (ts 為收到報價的時間)"""
         spread = abs(ask - bid)
-
-        self.table.item(row, 1).setText(f"{bid:.2f}")
-        self.table.item(row, 2).setText(f"{ask:.2f}")
-        self.table.item(row, 3).setText(f"{spread:.2f}")
-        self.table.item(row, 4).setText(time_str)
-        self.table.item(row, 5).setText("監控中")
-        self.table.item(row, 5).setForeground(QColor("#4ec9b0"))
-
-        self.check_alert(source, spread, row)
+        if bid > 0 and ask > 0:
+            self.staleness.update(source, bid, ask, ts)
+            self.bars.update(source, ts, bid, ask)
+            self.consensus.update(source, bid, ask)
+            if self.tick_history:
+                self.tick_history.append(source, ts, bid, ask)
+            if self.tick_archive:
+                self.tick_archive.append(source, ts, bid, ask)
+            if self.tick_store:
+                self.tick_store.add_tick(source, ts, bid, ask)
+
+        # 頁面凍結時讀到的是同一筆舊報價，不納入警報判斷
+        if not self.staleness.is_stale(source, ts):
+            self.check_alert(source, spread, self.row_map[source], ts)
+
+        # 先以既有分佈判斷是否異常，再把這筆點差納入統計 (否則自己會抬高要比較的 P99)
+        if bid > 0 and ask > 0:
+            self.spread_stats[source].update(spread)
+            self.stats_dirty.add(source)
+
+    def render_quote(self, source, bid, ask, time_str):
+        row = self.row_map[source]
+        self.table.item(row, COL_BID).setText(f"{bid:.2f}")
+        self.table.item(row, COL_ASK).setText(f"{ask:.2f}")
+        self.table.item(row, COL_SPREAD).setText(f"{abs(ask - bid):.2f}")
+        self.table.item(row, COL_TIME).setText(time_str)
+        if self.status_text.get(source) != "監控中":
+            self.status_text[source] = "監控中"
+            self.render_status(source)
 
     def on_status_update(self, source, msg):
         if source not in self.row_map: return
-        row = self.row_map[source]
-        item = self.table.item(row, 5)
-        item.setText(msg)
-        item.setForeground(QColor("#4ec9b0") if msg == "監控中" else QColor("#f44747"))
+        self.status_text[source] = msg
+        self.render_status(source)
+
+    def on_memory_update(self, source, heap_mb, nodes):
+        if source not in self.row_map: return
+        self.memory_text[source] = format_memory(heap_mb, nodes)
+        self.render_status(source)
+
+    def render_status(self, source):
+        """狀態欄: 狀態訊息 + 報價年齡 (偏舊橘色、停滯紅色) + 分頁記憶體 (有取樣時)"""
+        msg = self.status_text.get(source, "")
+        age = self.age_text.get(source)
+        level = self.stale_level.get(source, 0)
+        mem = self.memory_text.get(source)
+        text = msg
+        if age and msg == "監控中":
+            text += f" · 停滯 {age}" if level == STALE else f" · {age}"
+        item = self.table.item(self.row_map[source], COL_STATUS)
+        item.setText(f"{text}  [{mem}]" if mem else text)
+        if msg != "監控中" or level == STALE:
+            item.setForeground(QColor("#f44747"))
+        else:
+            item.setForeground(QColor("#e5a50a") if level == AGING else QColor("#4ec9b0"))
+
+    def refresh_analytics(self):
+        """計時器驅動: 共識與統計欄每批重算 / 重繪一次，不隨每筆報價更新"""
+        now = time.time()
+        levels = self.staleness.levels(now)
+        stale = levels == STALE
+        if (stale != self.stale_mask).any():
+            self.stale_mask = stale
+            self.consensus.dirty = True  # 有券商進入或離開停滯，共識成員改變
+        self.refresh_consensus()
+        self.render_spread_stats()
+        self.render_quote_ages(now, levels)
+
+    def render_quote_ages(self, now, levels):
+        """狀態欄的報價年齡只在顯示的秒數或停滯等級改變時重繪"""
+        for key, age in zip(self.broker_keys, self.staleness.ages(now)):
+            if math.isnan(age): continue
+            i = self.row_map[key]
+            text, level = f"{age:.0f}s", int(levels[i])
+            if text == self.age_text.get(key) and level == self.stale_level.get(key):
+                continue
+            if level == STALE and self.stale_level.get(key) != STALE:
+                self.log_message(f"[{key}] 報價已 {age:.0f} 秒未變動，暫時排除於共識與警報之外")
+            elif level != STALE and self.stale_level.get(key) == STALE:
+                self.log_message(f"[{key}] 報價恢復更新")
+            self.age_text[key] = text
+            self.stale_level[key] = level
+            self.render_status(key)
+
+    def render_spread_stats(self):
+        for key in self.stats_dirty:
+            stats = self.spread_stats[key]
+            row = self.row_map[key]
+            p50, p95, p99 = stats.quantiles()
+            self.table.item(row, COL_EWMA).setText(f"{stats.ewma:.3f}")
+            self.table.item(row, COL_MEAN).setText(
+                f"{stats.mean:.3f} ± {stats.std:.3f}" if stats.count > 1 else f"{stats.mean:.3f}")
+            self.table.item(row, COL_PCTL).setText(f"{p50:.2f} / {p95:.2f} / {p99:.2f}")
+        self.stats_dirty.clear()
+
+    def refresh_consensus(self):
+        """期間有新報價時重新計算一次共識，更新偏離欄並檢查偏離警報"""
+        if not self.consensus.dirty: return
+        ok = self.consensus.compute(exclude=self.stale_mask)
+        self.lbl_consensus.setText(f"{self.consensus.median:.2f}" if ok else "--")
+        for key, row in self.row_map.items():
+            deviation, z = self.consensus.get(key)
+            dev_item = self.table.item(row, COL_DEV)
+            z_item = self.table.item(row, COL_Z)
+            if math.isnan(z):
+                dev_item.setText("--")
+                z_item.setText("--")
+            else:
+                dev_item.setText(f"{deviation:+.1f}")
+                z_item.setText(f"{z:+.1f}")
+            outlier = abs(z) >= OUTLIER_Z  # NaN 時為 False
+            if self.z_outlier.get(key) != outlier:
+                self.z_outlier[key] = outlier
+                z_item.setForeground(QColor("#f44747") if outlier else QColor("#cccccc"))
+            if DEVIATION_ALERT_Z and not self.stale_mask[row]:
+                self.check_deviation_alert(key, deviation, z)
+
+    def check_deviation_alert(self, source, deviation, z):
+        """偏離共識警報: 進入時記錄並播放該券商 Level 1 音效，回到正常範圍後解除"""
+        triggered = abs(z) >= DEVIATION_ALERT_Z  # NaN 時為 False
+        # 底色只在狀態改變時重設 (每次共識更新都會對每個券商呼叫)
+        if self.z_alerted.get(source) != triggered:
+            self.z_alerted[source] = triggered
+            self.table.item(self.row_map[source], COL_Z).setBackground(
+                QColor("#660000") if triggered else QColor("#252526"))
+        if not triggered:
+            self.deviation_alerted.discard(source)
+            return
+        if source in self.deviation_alerted:
+            return
+        self.deviation_alerted.add(source)
+        msg = f"偏離共識 {deviation:+.1f} pips (Z={z:+.1f})"
+        self.log_message(f"[{source}] 偏離警報! {msg}")
+        if self.tick_store:
+            i = self.consensus.index[source]
+            self.tick_store.add_alert(source, time.time(), 0, self.consensus.ask[i] - self.consensus.bid[i], msg)
+        chk = self.sound_checkboxes.get(source)
+        inputs = self.setting_inputs.get(source)
+        sound_path = inputs[0]['sound'].text().strip() if inputs else ""
+        if (chk is None or chk.isChecked()) and sound_path and os.path.isfile(sound_path):
+            threading.Thread(target=self.play_sound, args=(sound_path,), daemon=True).start()
 
     # ==========================================
     #  [關鍵修正] 嚴格的警報檢查邏輯
     # ==========================================
-    def check_alert(self, source, spread, row_idx):
+    def check_alert(self, source, spread, row_idx, ts=None):
         inputs = self.setting_inputs.get(source, [])
         highest_lvl = -1
         sound_path = None
+        lowest_thresh = None
 
         # 1. 計算最高觸發層級 (UI 更新)
         for i, item in enumerate(inputs):
@@ -662,20 +1374,39 @@ class GoldMonitorApp(QMainWindow):
                 thresh = float(item['diff'].text())
             except:
                 thresh = 999.0
+            if thresh > 0 and (lowest_thresh is None or thresh < lowest_thresh):
+                lowest_thresh = thresh
 
-            lbl = self.alert_status_labels.get((source, i))
-            if thresh > 0 and spread >= thresh:
-                lbl.setText("● 觸發")
-                lbl.setStyleSheet("color: #ff3333; font-weight: bold;")
+            hit = thresh > 0 and spread >= thresh
+            if hit:
                 highest_lvl = i
                 # [修正] 使用 .strip() 確保沒有多餘的空白
                 sound_path = item['sound'].text().strip()
-            else:
-                lbl.setText("● 待機")
-                lbl.setStyleSheet("color: gray;")
+            # 標籤只在狀態改變時重設 (setStyleSheet 成本高，不必每筆報價都做)
+            if self.alert_label_state.get((source, i)) != hit:
+                self.alert_label_state[(source, i)] = hit
+                lbl = self.alert_status_labels.get((source, i))
+                if hit:
+                    lbl.setText("● 觸發")
+                    lbl.setStyleSheet("color: #ff3333; font-weight: bold;")
+                else:
+                    lbl.setText("● 待機")
+                    lbl.setStyleSheet("color: gray;")
 
-        spread_item = self.table.item(row_idx, 3)
-        spread_item.setBackground(QColor("#660000") if highest_lvl >= 0 else QColor("#252526"))
+        self.alert_thresholds[source] = lowest_thresh
+
+        # 與該券商自身的點差分佈比較: 高於 P99 為異常偏寬 (深紅)，否則為常態偏寬 (暗橘)
+        stats = self.spread_stats[source]
+        abnormal = stats.is_abnormal(spread)
+        if highest_lvl < 0:
+            bg = "#252526"
+        else:
+            bg = "#660000" if abnormal else "#5a3d00"
+            if ALERT_ONLY_ABNORMAL and not abnormal:
+                highest_lvl = -1  # 常態偏寬: 只標色，不發出警報
+        if self.spread_bg.get(source) != bg:
+            self.spread_bg[source] = bg
+            self.table.item(row_idx, COL_SPREAD).setBackground(QColor(bg))
 
         last = self.last_triggered_levels.get(source, -1)
 
@@ -686,7 +1417,11 @@ class GoldMonitorApp(QMainWindow):
 
         # 3. 判斷是否播放音效 (邏輯順序優化)
         if highest_lvl > last:
-            self.log_message(f"[{source}] 警報觸發! 點差: {spread:.2f} (層級 {highest_lvl + 1})")
+            p99 = stats.quantile(0.99)
+            tag = "異常偏寬" if abnormal else "常態偏寬"
+            self.log_message(f"[{source}] 警報觸發! 點差: {spread:.2f} (層級 {highest_lvl + 1}) [{tag}, P99 {p99:.2f}]")
+            if self.tick_store:
+                self.tick_store.add_alert(source, ts or time.time(), highest_lvl + 1, spread)
 
             # [修正] 優先判斷開關是否開啟
             if is_sound_enabled_for_this_broker:
@@ -760,14 +1495,28 @@ class GoldMonitorApp(QMainWindow):
                                          QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
             if reply == QMessageBox.StandardButton.Yes:
                 self.stop_monitor()
+                self.supervisor.shutdown()
+                self.close_history()
                 event.accept()
             else:
                 event.ignore()
         else:
+            self.supervisor.shutdown()
+            self.close_history()
             event.accept()
 
+    def close_history(self):
+        if self.tick_history:
+            self.tick_history.close()
+        if self.tick_archive:
+            self.tick_archive.stop()
+        if self.tick_store:
+            self.tick_store.stop()
+            self.tick_query.close()
+
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = GoldMonitorApp()
     window.show()
@@ -3,7 +3,6 @@ import os
 import json
 import time
 import threading
-import re
 import datetime
 import winsound
 
@@ -22,24 +21,12 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 
+from price_parser import parse_price
+
 # --- 設定檔名稱 ---
 CONFIG_FILE = "monitor_config_v9_pro.json"
 
 
-# ==========================================
-#   輔助與邏輯
-# ==========================================
-
-def parse_price(price_str):
-    """移除逗號與非數字字符，轉換為 float"""
-    try:
-        if not price_str: return 0.0
-        clean_str = re.sub(r'[^\d.]', '', str(price_str))
-        return float(clean_str)
-    except:
-        return 0.0
-
-
 class UnifiedMonitorThread(QThread):
     log_signal = pyqtSignal(str)
     price_signal = pyqtSignal(str, float, float, str)  # (Source, Bid, Ask, Time)
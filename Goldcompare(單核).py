@@ -3,7 +3,6 @@ import os
 import json
 import time
 import threading
-import re
 import datetime
 import winsound
 
@@ -20,17 +19,13 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 
+from bringup import BringUpTracker, PROBE_INTERVAL, PROBE_WAIT
+from snapshot_replay import replay_url
+from price_parser import parse_price
+
 # --- 設定檔名稱 ---
 CONFIG_FILE = "monitor_config_v2.json"
 
-# --- 輔助函數 ---
-def parse_price(price_str):
-    """移除逗號與非數字字符，轉換為 float"""
-    try:
-        clean_str = re.sub(r'[^\d.]', '', price_str)
-        return float(clean_str)
-    except:
-        return 0.0
 
 # ==========================================
 #   統一爬蟲執行緒 (Unified Crawler Thread)
@@ -47,6 +42,7 @@ class UnifiedMonitorThread(QThread):
         super().__init__()
         self.running = True
         self.driver = None
+        self.bringup = BringUpTracker()  # 各網站就緒判定與首筆報價耗時
         # 定義所有要監控的網站與對應的標籤頁 ID
         self.sites = {
             "WF": {"url": "https://www.wfbullion.com/", "handle": None},
@@ -67,6 +63,8 @@ class UnifiedMonitorThread(QThread):
         chrome_options.add_argument("--mute-audio")
         
         # 注意：為了確保 IG 能跑，這裡不禁用 CSS 和 圖片
+        # 不阻塞等待載入: 分頁並行載入，各網站以選擇器探測判定就緒
+        chrome_options.page_load_strategy = 'none'
         chrome_options.add_argument(
             "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
 
@@ -81,24 +79,18 @@ class UnifiedMonitorThread(QThread):
             # --- 1. 初始化分頁 (開啟 4 個 Tabs) ---
             site_keys = list(self.sites.keys())
             
-            # 開啟第一個網站 (主分頁)
-            first_key = site_keys[0]
-            self.log_signal.emit(f"正在載入: {first_key} ...")
-            self.driver.get(self.sites[first_key]["url"])
-            self.sites[first_key]["handle"] = self.driver.current_window_handle
-            
-            # 開啟其餘網站 (新分頁)
-            for key in site_keys[1:]:
+            # 所有網站一次送出開啟，不等待載入 (初始空白分頁保留作為開新分頁用)
+            for key in site_keys:
                 if not self.running: break
                 self.log_signal.emit(f"正在載入: {key} ...")
-                # JavaScript 開新分頁
-                self.driver.execute_script(f"window.open('{self.sites[key]['url']}', '_blank');")
-                # 切換到新分頁並記錄 handle
-                self.driver.switch_to.window(self.driver.window_handles[-1])
-                self.sites[key]["handle"] = self.driver.current_window_handle
-                time.sleep(2) # 稍作等待讓網頁載入
+                # JavaScript 開新分頁並記錄 handle
+                before = set(self.driver.window_handles)
+                self.driver.execute_script("window.open(arguments[0], '_blank');", replay_url(self.sites[key]["url"]))
+                new_handles = [h for h in self.driver.window_handles if h not in before]
+                self.sites[key]["handle"] = new_handles[0] if new_handles else self.driver.window_handles[-1]
+                self.bringup.opened(key)
 
-            self.log_signal.emit("所有網站載入完成，開始輪詢監控...")
+            self.log_signal.emit("所有網站已送出開啟，開始輪詢監控 (各網站就緒即開始報價)...")
 
             # --- 2. 輪詢監控迴圈 ---
             while self.running:
@@ -110,8 +102,12 @@ class UnifiedMonitorThread(QThread):
                         target_handle = self.sites[key]["handle"]
                         self.driver.switch_to.window(target_handle)
                         
-                        # 執行對應的爬蟲邏輯
-                        self.scrape_site(key, wait)
+                        # 執行對應的爬蟲邏輯 (就緒前只做短暫探測，不阻塞其他網站)
+                        if self.bringup.pending(key):
+                            if self.scrape_site(key, WebDriverWait(self.driver, PROBE_WAIT)):
+                                self.note_ready(key)
+                        else:
+                            self.scrape_site(key, wait)
                         
                     except Exception as e:
                         self.status_signal.emit(key, "讀取錯誤")
@@ -121,8 +117,9 @@ class UnifiedMonitorThread(QThread):
                     time.sleep(0.5)
 
                 # 每一輪結束後，休息較長時間 (這是省電的關鍵)
-                # 建議設定 3~5 秒
-                for _ in range(30): # 30 * 0.1 = 3秒
+                # 建議設定 3~5 秒；仍有網站未就緒時縮短，盡快取得首筆報價
+                rest = PROBE_INTERVAL if any(self.bringup.pending(k) for k in site_keys) else 3.0
+                for _ in range(int(rest * 10)): # 30 * 0.1 = 3秒
                     if not self.running: break
                     time.sleep(0.1)
 
@@ -132,8 +129,18 @@ class UnifiedMonitorThread(QThread):
             self.stop_driver()
             self.finished_signal.emit()
 
+    def note_ready(self, key):
+        """首次擷取成功，記錄首筆報價耗時"""
+        elapsed = self.bringup.mark(key)
+        if elapsed is None:
+            return
+        self.log_signal.emit(f"{key} 就緒，首筆報價耗時 {elapsed:.1f} 秒")
+        summary = self.bringup.all_ready()
+        if summary:
+            self.log_signal.emit(f"全部 {summary[0]} 個網站就緒 (最慢 {summary[1]:.1f} 秒)")
+
     def scrape_site(self, key, wait):
-        """根據不同的網站 key 執行對應的抓取邏輯"""
+        """根據不同的網站 key 執行對應的抓取邏輯，成功發出報價時回傳 True"""
         now_str = time.strftime("%H:%M:%S")
 
         if key == "WF":
@@ -143,11 +150,11 @@ class UnifiedMonitorThread(QThread):
                 raw_text = price_element.text.strip()
                 lines = raw_text.split('\n')
                 if len(lines) > 3:
-                    bid = parse_price(lines[2].strip().replace(',', ''))
-                    ask_str = lines[3].strip().split(' ')[0].replace(',', '')
-                    ask = parse_price(ask_str)
+                    bid = parse_price(lines[2])
+                    ask = parse_price(lines[3])
                     self.price_signal.emit(key, bid, ask, now_str)
                     self.status_signal.emit(key, "監控中")
+                    return True
             except:
                 self.status_signal.emit(key, "等待數據")
 
@@ -168,6 +175,7 @@ class UnifiedMonitorThread(QThread):
                     ask = parse_price(ask_text)
                     self.price_signal.emit(key, bid, ask, now_str)
                     self.status_signal.emit(key, "監控中")
+                    return True
                 else:
                     self.status_signal.emit(key, "載入中...")
             except:
@@ -183,6 +191,7 @@ class UnifiedMonitorThread(QThread):
                     ask = parse_price(cells[2].text)
                     self.price_signal.emit(key, bid, ask, now_str)
                     self.status_signal.emit(key, "監控中")
+                    return True
             except:
                  self.status_signal.emit(key, "等待Oanda")
 
@@ -194,6 +203,7 @@ class UnifiedMonitorThread(QThread):
                 ask = parse_price(product_row.find_element(By.CSS_SELECTOR, ".mp__td--Offer").text)
                 self.price_signal.emit(key, bid, ask, now_str)
                 self.status_signal.emit(key, "監控中")
+                return True
             except:
                  self.status_signal.emit(key, "等待Forex")
 
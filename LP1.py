@@ -3,7 +3,6 @@ import os
 import json
 import time
 import threading
-import re
 import datetime  # 用於生成日誌檔名的日期
 import winsound  # Windows 音效
 
@@ -20,20 +19,12 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 
+from price_parser import parse_price
+
 # --- 設定檔名稱 ---
 CONFIG_FILE = "monitor_config_v2.json"
 
 
-# --- 輔助函數 ---
-def parse_price(price_str):
-    """移除逗號與非數字字符，轉換為 float"""
-    try:
-        clean_str = re.sub(r'[^\d.]', '', price_str)
-        return float(clean_str)
-    except:
-        return 0.0
-
-
 # ==========================================
 #   爬蟲執行緒模組 (Crawler Threads)
 # ==========================================
@@ -91,12 +82,8 @@ class WFThread(BaseCrawlerThread):
                     lines = raw_text.split('\n')
 
                     if len(lines) > 3:
-                        bid_str = lines[2].strip().replace(',', '')
-                        ask_line = lines[3].strip()
-                        ask_str = ask_line.split(' ')[0].replace(',', '')
-
-                        bid = float(bid_str)
-                        ask = float(ask_str)
+                        bid = parse_price(lines[2])
+                        ask = parse_price(lines[3])
                         now_str = time.strftime("%H:%M:%S")
 
                         self.price_signal.emit(self.source_name, bid, ask, now_str)
@@ -3,7 +3,6 @@ import os
 import json
 import time
 import threading
-import re
 import winsound
 import uuid
 
@@ -13,75 +12,47 @@ from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QFileDialog, QMessageBox, QTableWidget,
                              QTableWidgetItem, QHeaderView, QSplitter,
                              QListWidget, QStackedWidget, QGroupBox, QTextBrowser,
-                             QCheckBox, QComboBox, QFormLayout, QScrollArea)
+                             QCheckBox, QFormLayout, QScrollArea)
 from PyQt6.QtCore import pyqtSignal, QThread, Qt, QTimer, QTime, pyqtSlot
 from PyQt6.QtGui import QFont, QColor
 
 from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 
+from broker_spec import BROKER_SPECS, compile_spec, spec_from_selectors
+from fast_extract import extract_quote, format_page_ts, NodeCacheStats
+from quote_observer import drain_ticks
+from snapshot_replay import replay_url
+from bringup import BringUpTracker, PROBE_INTERVAL
+
 # --- 設定檔名稱 ---
 CONFIG_FILE = "monitor_config_v11_dynamic.json"
 
+# --- 擷取設定 ---
+CAPTURE_MODE = "poll"  # "poll"=每輪頁面內擷取一次, "observer"=頁面內 MutationObserver 推播並批次取回
+
 # ==========================================
 #    預設券商設定 (當沒有設定檔時使用)
 #    這裡展示如何將原本硬寫的邏輯轉為參數
 # ==========================================
 DEFAULT_BROKERS = [
     {
+        # 永豐: 名稱 / 代碼 / Bid / Ask 在同一個區塊內換行
         "id": "WF", "name": "永豐金業", "url": "https://www.wfbullion.com/",
-        "bid_type": "id", "bid_selector": "pm-llg",
-        "ask_type": "id", "ask_selector": "pm-llg",
-        # 備註: 永豐原本邏輯特殊(同一格換行)，通用爬蟲會嘗試解析，若不行需用更精確的XPATH
-        "note": "自動解析"
+        "extract": BROKER_SPECS["WF"]
     },
     {
         "id": "IG", "name": "IG Markets", "url": "https://www.ig.com/cn/commodities/markets-commodities/gold",
-        "bid_type": "css", "bid_selector": ".price-ticket__button--sell .price-ticket__price",
-        "ask_type": "css", "ask_selector": ".price-ticket__button--buy .price-ticket__price"
+        "extract": BROKER_SPECS["IG"]
     },
     {
+        # Oanda: 找 Gold / XAU/USD 所在的列，排除 AUD、EUR 計價與白銀
         "id": "Oanda", "name": "Oanda", "url": "https://www.oanda.com/bvi-en/cfds/metals/",
-        "bid_type": "xpath", "bid_selector": "//tr[.//span[contains(text(), 'Gold')]]/td[2]",
-        "ask_type": "xpath", "ask_selector": "//tr[.//span[contains(text(), 'Gold')]]/td[3]"
+        "extract": BROKER_SPECS["Oanda"]
     }
 ]
 
 
-# ==========================================
-#    輔助與邏輯
-# ==========================================
-
-def parse_price(text_content):
-    """
-    強大的價格解析函數：從混亂的字串中提取出第一個合理的浮點數
-    """
-    try:
-        if not text_content: return 0.0
-        # 1. 替換掉常見的非數字干擾 (保留小數點)
-        # 先把換行轉成空格，方便正則處理
-        clean_text = str(text_content).replace('\n', ' ').strip()
-
-        # 2. 使用正則表達式尋找數字 (支援 2,000.50 這種格式)
-        # 邏輯: 尋找一段包含數字和小數點的字串
-        match = re.search(r'[\d,]+\.?\d*', clean_text)
-        if match:
-            num_str = match.group(0)
-            # 移除千分位逗號
-            num_str = num_str.replace(',', '')
-            # 處理多個小數點的情況 (防呆)
-            if num_str.count('.') > 1:
-                parts = num_str.split('.')
-                num_str = f"{parts[0]}.{parts[1]}"
-            return float(num_str)
-        return 0.0
-    except:
-        return 0.0
-
-
 class UnifiedMonitorThread(QThread):
     log_signal = pyqtSignal(str)
     price_signal = pyqtSignal(str, float, float, str)  # (SourceID, Bid, Ask, Time)
@@ -94,6 +65,9 @@ class UnifiedMonitorThread(QThread):
         self.driver = None
         self.brokers = brokers_config  # 接收動態的券商列表
         self.site_handles = {}  # 儲存視窗 Handle
+        self.observed = set()  # observer 模式下已收到首筆跳動的券商
+        self.node_cache = NodeCacheStats()  # 頁面內節點快取的命中 / 未命中統計
+        self.bringup = BringUpTracker()  # 各券商就緒判定與首筆報價耗時
 
     def setup_driver(self):
         chrome_options = Options()
@@ -102,6 +76,8 @@ class UnifiedMonitorThread(QThread):
         chrome_options.add_argument("--window-size=1920,1080")
         chrome_options.add_argument("--log-level=3")
         chrome_options.add_argument("--mute-audio")
+        # 不阻塞等待載入: 分頁並行載入，各券商以自己的擷取規格探測判定就緒
+        chrome_options.page_load_strategy = 'none'
         chrome_options.add_argument(
             "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
         self.driver = webdriver.Chrome(options=chrome_options)
@@ -114,25 +90,19 @@ class UnifiedMonitorThread(QThread):
 
             self.log_signal.emit("系統核心啟動中 (Chrome Driver)...")
             self.setup_driver()
-            wait = WebDriverWait(self.driver, 10)
 
             # --- 初始化分頁 ---
-            # 開啟第一個網址
-            first_broker = self.brokers[0]
-            self.log_signal.emit(f"初始化主分頁: {first_broker['name']} ...")
-            self.driver.get(first_broker['url'])
-            self.site_handles[first_broker['id']] = self.driver.current_window_handle
-
-            # 開啟其餘分頁
-            for broker in self.brokers[1:]:
+            # 所有券商一次送出開啟，不等待載入 (初始空白分頁保留作為開新分頁用)
+            for broker in self.brokers:
                 if not self.running: break
                 self.log_signal.emit(f"開啟背景分頁: {broker['name']} ...")
-                self.driver.execute_script(f"window.open('{broker['url']}', '_blank');")
-                self.driver.switch_to.window(self.driver.window_handles[-1])
-                self.site_handles[broker['id']] = self.driver.current_window_handle
-                time.sleep(1)
+                before = set(self.driver.window_handles)
+                self.driver.execute_script("window.open(arguments[0], '_blank');", replay_url(broker['url']))
+                new_handles = [h for h in self.driver.window_handles if h not in before]
+                self.site_handles[broker['id']] = new_handles[0] if new_handles else self.driver.window_handles[-1]
+                self.bringup.opened(broker['id'])
 
-            self.log_signal.emit("所有連線建立完成，開始即時監控。")
+            self.log_signal.emit("所有分頁已送出開啟，開始即時監控 (各券商就緒即開始報價)。")
 
             # --- 監控迴圈 ---
             while self.running:
@@ -144,7 +114,8 @@ class UnifiedMonitorThread(QThread):
                         # 切換視窗
                         if b_id in self.site_handles:
                             self.driver.switch_to.window(self.site_handles[b_id])
-                            self.scrape_generic(broker, wait)
+                            if self.scrape_generic(broker):
+                                self.note_ready(broker)
                         else:
                             self.status_signal.emit(b_id, "視窗遺失")
                     except Exception as e:
@@ -153,8 +124,12 @@ class UnifiedMonitorThread(QThread):
 
                     time.sleep(0.2)  # 每個分頁間隔
 
-                # 每一大輪休息
-                for _ in range(10):  # 1秒
+                if self.node_cache.stats_due():
+                    self.log_signal.emit(self.node_cache.take_stats())
+
+                # 每一大輪休息；仍有券商未就緒時縮短，盡快取得首筆報價
+                rest = PROBE_INTERVAL if any(self.bringup.pending(b['id']) for b in self.brokers) else 1.0
+                for _ in range(int(rest * 10)):  # 10 * 0.1 = 1秒
                     if not self.running: break
                     time.sleep(0.1)
 
@@ -164,59 +139,59 @@ class UnifiedMonitorThread(QThread):
             self.stop_driver()
             self.finished_signal.emit()
 
-    def scrape_generic(self, broker, wait):
+    def note_ready(self, broker):
+        """首次擷取成功，記錄首筆報價耗時"""
+        elapsed = self.bringup.mark(broker['id'])
+        if elapsed is None:
+            return
+        self.log_signal.emit(f"[{broker['name']}] 就緒，首筆報價耗時 {elapsed:.1f} 秒")
+        summary = self.bringup.all_ready()
+        if summary:
+            self.log_signal.emit(f"全部 {summary[0]} 個券商就緒 (最慢 {summary[1]:.1f} 秒)")
+
+    def scrape_generic(self, broker):
         """
-        通用的爬蟲邏輯：根據設定檔中的 Type 和 Selector 去抓取
+        通用的擷取邏輯：依券商的擷取規格 (見 broker_spec) 在頁面內一次完成定位、讀值、解析
+        成功發出報價時回傳 True (未就緒的分頁以此作為就緒探測)
         """
-        now_str = time.strftime("%H:%M:%S")
-        bid, ask = 0.0, 0.0
+        b_id = broker['id']
+        if CAPTURE_MODE == "observer":
+            return self.drain_generic(broker)
 
         try:
-            # 1. 抓取 Bid
-            bid_ele = self.find_element_dynamic(wait, broker['bid_type'], broker['bid_selector'])
-            if bid_ele:
-                # 特殊處理: 如果 Bid 和 Ask 是同一個元素 (例如換行分隔)
-                text = bid_ele.text
-                if broker['bid_selector'] == broker['ask_selector']:
-                    lines = text.strip().split('\n')
-                    # 嘗試解析多行
-                    if len(lines) >= 2:
-                        bid = parse_price(lines[-2] if len(lines) > 1 else lines[0])
-                        ask = parse_price(lines[-1])
-                    else:
-                        bid = parse_price(text)
-                else:
-                    bid = parse_price(text)
-
-            # 2. 抓取 Ask (如果尚未從 Bid 邏輯中取得)
-            if ask == 0.0:
-                ask_ele = self.find_element_dynamic(wait, broker['ask_type'], broker['ask_selector'])
-                if ask_ele:
-                    ask = parse_price(ask_ele.text)
-
-            # 3. 發送訊號
+            quote = extract_quote(self.driver, b_id, broker['extract'], self.node_cache)
+            if quote is None:
+                self.status_signal.emit(b_id, "等待數據")
+                return
+            bid, ask, page_ts = quote
             if bid > 0 and ask > 0:
-                self.price_signal.emit(broker['id'], bid, ask, now_str)
-                self.status_signal.emit(broker['id'], "監控中")
+                self.price_signal.emit(b_id, bid, ask, format_page_ts(page_ts))
+                self.status_signal.emit(b_id, "監控中")
+                return True
             else:
-                self.status_signal.emit(broker['id'], "解析失敗")
+                self.status_signal.emit(b_id, "解析失敗")
 
         except Exception:
-            self.status_signal.emit(broker['id'], "等待數據")
-
-    def find_element_dynamic(self, wait, method, selector):
-        """根據方法 (ID/CSS/XPATH) 尋找元素"""
-        if not selector: return None
-        by_method = By.ID
-        if method == "css":
-            by_method = By.CSS_SELECTOR
-        elif method == "xpath":
-            by_method = By.XPATH
+            self.status_signal.emit(b_id, "等待數據")
 
+    def drain_generic(self, broker):
+        """observer 模式: 一次取回該分頁自上輪以來的所有跳動"""
+        b_id = broker['id']
         try:
-            return wait.until(EC.presence_of_element_located((by_method, selector)))
-        except:
-            return None
+            ticks, dropped = drain_ticks(self.driver, b_id, broker['extract'], self.node_cache)
+        except Exception:
+            self.status_signal.emit(b_id, "等待數據")
+            return
+        if dropped:
+            self.log_signal.emit(f"[{broker['name']}] 頁面緩衝區已滿，遺失 {dropped} 筆跳動")
+        for bid, ask, page_ts in ticks:
+            self.price_signal.emit(b_id, bid, ask, format_page_ts(page_ts))
+        if ticks:
+            self.observed.add(b_id)
+            self.status_signal.emit(b_id, "監控中")
+            return True
+        elif b_id not in self.observed:
+            self.status_signal.emit(b_id, "等待數據")
 
     def stop(self):
         self.running = False
@@ -263,6 +238,7 @@ class GoldMonitorApp(QMainWindow):
 
         # 資料結構
         self.brokers_data = []  # 存放所有券商設定的列表
+        self.draft_broker = None  # 新增後尚未保存的券商 (擷取規格通過檢查前不寫入 brokers_data)
         self.alert_settings = {}  # 存放警報閾值設定
         self.sound_enabled_map = {}  # 存放音效開關
         self.last_triggered_levels = {}
@@ -295,6 +271,13 @@ class GoldMonitorApp(QMainWindow):
         else:
             self.brokers_data = DEFAULT_BROKERS
 
+        # 舊版設定檔 (bid_type/bid_selector...) 轉為擷取規格
+        for b in self.brokers_data:
+            if 'extract' not in b:
+                b['extract'] = spec_from_selectors(b)
+                for k in ('bid_type', 'bid_selector', 'ask_type', 'ask_selector', 'note'):
+                    b.pop(k, None)
+
         # 初始化音效開關
         for b in self.brokers_data:
             if b['id'] not in self.sound_enabled_map:
@@ -575,25 +558,16 @@ class GoldMonitorApp(QMainWindow):
         self.txt_edit_name = QLineEdit()
         self.txt_edit_url = QLineEdit()
 
-        # Bid Selector
-        self.cmb_bid_type = QComboBox()
-        self.cmb_bid_type.addItems(["id", "css", "xpath"])
-        self.txt_bid_selector = QLineEdit()
-        self.txt_bid_selector.setPlaceholderText("例如: #price-bid 或 //div[@id='bid']")
-
-        # Ask Selector
-        self.cmb_ask_type = QComboBox()
-        self.cmb_ask_type.addItems(["id", "css", "xpath"])
-        self.txt_ask_selector = QLineEdit()
-        self.txt_ask_selector.setPlaceholderText("例如: #price-ask")
+        # 擷取規格 (JSON)
+        self.txt_extract = QTextEdit()
+        self.txt_extract.setAcceptRichText(False)
+        self.txt_extract.setFont(QFont("Consolas", 10))
+        self.txt_extract.setPlaceholderText('{"bid": {"css": ".price-bid"}, "ask": {"css": ".price-ask"}}')
 
         form.addRow("名稱 (Name):", self.txt_edit_name)
         form.addRow("網址 (URL):", self.txt_edit_url)
         form.addRow("--- HTML 抓取規則 ---", QLabel(""))
-        form.addRow("Bid 類型:", self.cmb_bid_type)
-        form.addRow("Bid 路徑:", self.txt_bid_selector)
-        form.addRow("Ask 類型:", self.cmb_ask_type)
-        form.addRow("Ask 路徑:", self.txt_ask_selector)
+        form.addRow("擷取規格:", self.txt_extract)
 
         btn_box = QHBoxLayout()
         self.btn_update = QPushButton("更新/保存修改")
@@ -610,13 +584,16 @@ class GoldMonitorApp(QMainWindow):
 
         # 教學區
         help_text = QTextBrowser()
-        help_text.setFixedHeight(150)
+        help_text.setFixedHeight(220)
         help_text.setHtml("""
-        <p style='color:#ccc'><b>如何填寫 HTML 路徑?</b></p>
+        <p style='color:#ccc'><b>如何填寫擷取規格?</b></p>
         <ul>
-        <li><b>ID:</b> 網頁元素的 id 屬性 (例: <i>price-val</i>)</li>
-        <li><b>CSS:</b> CSS 選擇器 (例: <i>.price-class span</i>)</li>
-        <li><b>XPath:</b> 強大的路徑語言 (例: <i>//div[contains(text(),'Gold')]/span</i>)</li>
+        <li><b>bid / ask:</b> 各用一個定位器: <i>{"id": "price-val"}</i>、<i>{"css": ".price span"}</i>、
+            <i>{"xpath": "//div[@id='bid']"}</i> 或 <i>{"text": "XAUUSD"}</i></li>
+        <li><b>row:</b> 先找錨點 (例如報價表格的一列)，bid / ask 再到其中查找:
+            <i>{"row": {"text": "XAUUSD", "closest": "tr"}, "bid": {"css": "td", "index": 1}, ...}</i></li>
+        <li><b>過濾:</b> <i>"has": [...]</i> 需包含、<i>"not_has": ["AUD", "Silver"]</i> 排除、<i>"index"</i> 取第幾個</li>
+        <li><b>讀取:</b> <i>"attr": "data"</i> 讀屬性；<i>"line": 2</i> 取文字第幾行 (同一格內含 Bid/Ask 時)</li>
         </ul>
         <p>※ 系統會自動過濾文字中的貨幣符號，只要選到包含數字的元素即可。</p>
         """)
@@ -631,64 +608,85 @@ class GoldMonitorApp(QMainWindow):
         self.list_manager.clear()
         for b in self.brokers_data:
             self.list_manager.addItem(f"{b['name']}")
+        if self.draft_broker:
+            self.list_manager.addItem(f"{self.draft_broker['name']} (未保存)")
+
+    def broker_at(self, row):
+        """管理列表第 row 列對應的券商 (最後一列可能是未保存的新券商)"""
+        if 0 <= row < len(self.brokers_data):
+            return self.brokers_data[row]
+        if row == len(self.brokers_data):
+            return self.draft_broker
+        return None
 
     def load_broker_details(self, row):
-        if row < 0 or row >= len(self.brokers_data): return
+        data = self.broker_at(row)
+        if data is None: return
 
-        data = self.brokers_data[row]
         self.txt_edit_name.setText(data['name'])
         self.txt_edit_url.setText(data['url'])
 
-        idx_bid = self.cmb_bid_type.findText(data.get('bid_type', 'id'))
-        self.cmb_bid_type.setCurrentIndex(idx_bid)
-        self.txt_bid_selector.setText(data.get('bid_selector', ''))
-
-        idx_ask = self.cmb_ask_type.findText(data.get('ask_type', 'id'))
-        self.cmb_ask_type.setCurrentIndex(idx_ask)
-        self.txt_ask_selector.setText(data.get('ask_selector', ''))
+        self.txt_extract.setPlainText(json.dumps(data.get('extract', {}), ensure_ascii=False, indent=2))
 
     def add_new_broker(self):
-        new_data = {
-            "id": str(uuid.uuid4())[:8],
-            "name": "新券商",
-            "url": "https://",
-            "bid_type": "css", "bid_selector": "",
-            "ask_type": "css", "ask_selector": ""
-        }
-        self.brokers_data.append(new_data)
-        self.refresh_manager_list()
-        self.list_manager.setCurrentRow(len(self.brokers_data) - 1)
-        self.log_message("已新增一個空白券商，請填寫詳細資料並保存。")
+        if self.draft_broker is None:
+            self.draft_broker = {
+                "id": str(uuid.uuid4())[:8],
+                "name": "新券商",
+                "url": "https://",
+                "extract": {"bid": {"css": ""}, "ask": {"css": ""}}
+            }
+            self.refresh_manager_list()
+        self.list_manager.setCurrentRow(len(self.brokers_data))
+        self.log_message("已新增一個空白券商，請填寫名稱、網址與 Bid/Ask 選擇器後保存 (保存前不會加入監控)。")
 
     def save_broker_details(self):
         row = self.list_manager.currentRow()
-        if row < 0: return
+        target = self.broker_at(row)
+        if target is None: return
 
-        # 1. 更新記憶體中的 brokers_data
-        target = self.brokers_data[row]
+        # 1. 檢查擷取規格 (先編譯一次，格式錯誤不寫入)
+        try:
+            spec = json.loads(self.txt_extract.toPlainText())
+            compile_spec(spec)
+        except ValueError as e:
+            QMessageBox.warning(self, "擷取規格錯誤", str(e))
+            return
+
+        # 2. 更新記憶體中的 brokers_data (新券商此時才正式加入)
+        if target is self.draft_broker:
+            self.brokers_data.append(target)
+            self.draft_broker = None
         target['name'] = self.txt_edit_name.text()
         target['url'] = self.txt_edit_url.text()
-        target['bid_type'] = self.cmb_bid_type.currentText()
-        target['bid_selector'] = self.txt_bid_selector.text()
-        target['ask_type'] = self.cmb_ask_type.currentText()
-        target['ask_selector'] = self.txt_ask_selector.text()
+        target['extract'] = spec
 
-        # 2. 重新整理列表名稱
+        # 3. 重新整理列表名稱
         self.list_manager.item(row).setText(target['name'])
 
-        # 3. 儲存檔案
+        # 4. 儲存檔案
         self.save_to_file()
 
-        # 4. 觸發介面重建 (重要)
+        # 5. 觸發介面重建 (重要)
         self.rebuild_monitor_table()
         self.rebuild_settings_ui()
         self.log_message(f"券商 [{target['name']}] 資料已更新。")
 
     def delete_current_broker(self):
         row = self.list_manager.currentRow()
-        if row < 0: return
+        target = self.broker_at(row)
+        if target is None: return
+
+        if target is self.draft_broker:
+            # 尚未保存的新券商直接捨棄
+            self.draft_broker = None
+            self.refresh_manager_list()
+            self.txt_edit_name.clear()
+            self.txt_edit_url.clear()
+            self.txt_extract.clear()
+            return
 
-        name = self.brokers_data[row]['name']
+        name = target['name']
         ret = QMessageBox.question(self, "確認刪除", f"確定要刪除 [{name}] 嗎?",
                                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
 
@@ -702,6 +700,7 @@ class GoldMonitorApp(QMainWindow):
             # 清空編輯區
             self.txt_edit_name.clear()
             self.txt_edit_url.clear()
+            self.txt_extract.clear()
 
     # ---------------------------
     #    Tab 4: 日誌
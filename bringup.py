@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+分頁並行啟動與就緒偵測
+
+以往逐一 window.open 後固定 sleep (1 秒 / 0.5 秒 / 2 秒)，
+首筆報價時間隨券商數量線性增加，且任何一個慢頁面都會拖住後面所有分頁。
+現在所有分頁一次送出開啟 (不等待載入)，輪詢立即開始；
+每個券商以自己的選擇器探測 (擷取成功) 判定就緒，並記錄首筆報價耗時 (time-to-first-quote)。
+就緒前使用很短的元素等待，未載入完成的頁面不會阻塞其他券商。
+"""
+
+import time
+
+# --- 啟動參數 ---
+PROBE_INTERVAL = 0.5  # 尚未就緒的券商重試間隔 (秒)
+PROBE_WAIT = 0.2  # 就緒前的元素等待上限 (秒)
+
+
+class BringUpTracker:
+    """記錄各券商分頁開啟時間與首筆報價時間"""
+
+    def __init__(self):
+        self.opened_at = {}  # key -> monotonic
+        self.ready = {}  # key -> 首筆報價耗時 (秒)
+        self.announced = False
+
+    def opened(self, key):
+        """分頁開始載入 (初次開啟、重開或回收後重新計時)"""
+        self.opened_at[key] = time.monotonic()
+        self.ready.pop(key, None)
+        self.announced = False
+
+    def forget(self, key):
+        """券商移交給其他引擎時清除"""
+        self.opened_at.pop(key, None)
+        self.ready.pop(key, None)
+
+    def pending(self, key):
+        return key in self.opened_at and key not in self.ready
+
+    def mark(self, key):
+        """擷取成功；首次就緒時回傳耗時秒數，否則回傳 None"""
+        if key in self.ready or key not in self.opened_at:
+            return None
+        elapsed = time.monotonic() - self.opened_at[key]
+        self.ready[key] = elapsed
+        return elapsed
+
+    def all_ready(self):
+        """全部券商首次就緒時回傳 (數量, 最慢耗時)，只回報一次"""
+        if self.announced or not self.opened_at or any(k not in self.ready for k in self.opened_at):
+            return None
+        self.announced = True
+        return len(self.ready), max(self.ready.values())
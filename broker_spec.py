@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+宣告式券商擷取規格
+
+以往每個券商的 Bid/Ask 定位都寫成程式碼 (GOLD.py 的 scrape_* 方法、fast_extract 的 JS 片段)，
+S.py 的 bid_type/bid_selector 設定又表達不了「先找列、再讀列內第幾格」或「同一格第幾行」，
+只好用比對選擇器的方式特判 WF。
+這裡把擷取邏輯寫成資料，編譯一次後快取成頁面內 JS 函式主體，交給 fast_extract / quote_observer 執行；
+新增券商只需要一段規格，不用寫程式。
+
+規格格式:
+    {
+        "row":  定位器,          # 選填: 錨點元素 (表格列、按鈕、文字區塊)，bid/ask 在其中查找
+        "bid":  欄位, "ask": 欄位,
+        "scroll": true          # 選填: 讀取前把錨點捲動到畫面中央 (WF 需要)
+    }
+
+定位器 (擇一): {"id": ...} / {"css": ...} / {"xpath": ...} / {"text": "XAUUSD" 或 [...], "tag": "span"}
+    附加條件: "closest": "tr"       找到後取最近的祖先 (含自己)
+              "has": [...]         元素文字需包含其中之一
+              "not_has": [...]     元素文字不可包含任何一個 (例如 Oanda 排除 AUD/EUR/Silver)
+              "index": 1           取第幾個符合者 (負數從尾端算)
+欄位 = 定位器 + 讀取方式:
+              "attr": "data"       優先讀屬性，空值時退回元素文字
+              "line": 2            元素文字依換行切開後的第幾行 (負數從尾端算)
+    欄位不含定位器時直接讀錨點本身 (例如 WF、Capital 同一區塊內的第 2、3 行)。
+有錨點時，欄位的 css/xpath 以錨點為查找範圍 (xpath 請以 "." 開頭)。
+"""
+
+import json
+
+_LOCATOR_KEYS = ("id", "css", "xpath", "text")
+_LOCATOR_OPTIONS = ("tag", "closest", "has", "not_has", "index")
+_FIELD_OPTIONS = ("attr", "line")
+_SPEC_KEYS = ("row", "bid", "ask", "scroll")
+
+# ==========================================
+#  內建券商規格
+# ==========================================
+BROKER_SPECS = {
+    # 名稱 / 代碼 / Bid / Ask 在同一個跑馬燈區塊內換行
+    "WF": {"row": {"id": "pm-llg"}, "scroll": True, "bid": {"line": 2}, "ask": {"line": 3}},
+    "IG": {"bid": {"css": ".price-ticket__button--sell .price-ticket__price"},
+           "ask": {"css": ".price-ticket__button--buy .price-ticket__price"}},
+    "Oanda": {"row": {"text": ["Gold", "XAU/USD"], "tag": "span", "closest": "tr",
+                      "not_has": ["AUD", "EUR", "Silver"]},
+              "bid": {"css": "td", "index": 1}, "ask": {"css": "td", "index": 2}},
+    "Forex": {"row": {"xpath": "//tr[.//a[@title='XAU USD']]"},
+              "bid": {"css": ".mp__td--Bid"}, "ask": {"css": ".mp__td--Offer"}},
+    "MW": {"bid": {"id": "XAUUSD1"}, "ask": {"id": "XAUUSD2"}},
+    "Axi": {"row": {"id": "XAUUSD", "closest": "tr"},
+            "bid": {"css": ".price", "index": 0}, "ask": {"css": ".price", "index": 1}},
+    "Capital": {"row": {"text": ["Gold Spot", "現貨黃金"], "tag": "span", "closest": "button"},
+                "bid": {"line": 2}, "ask": {"line": 3}},
+    "KVB": {"row": {"text": "XAUUSD", "closest": "tr"},
+            "bid": {"css": "div[class*='style_price']", "index": 0},
+            "ask": {"css": "div[class*='style_price']", "index": 1}},
+    "VT": {"row": {"xpath": "//td[@data-symbol='XAUUSD']", "closest": "tr"},
+           "bid": {"css": "td[class*='bid_text']", "attr": "data"},
+           "ask": {"css": "td[class*='ask_text']", "attr": "data"}},
+    "Markets": {"bid": {"css": ".instrument-buttons .cta-sell span[data-sell]"},
+                "ask": {"css": ".instrument-buttons .cta-buy span[data-buy]"}},
+    "IFC": {"bid": {"css": ".current_instrument_bid"}, "ask": {"css": ".current_instrument_ask"}},
+    "CMC": {"bid": {"css": "span[data-jsonfeed='sell']"}, "ask": {"css": "span[data-jsonfeed='buy']"}},
+}
+
+# ==========================================
+#  編譯
+# ==========================================
+_compiled = {}  # 規格正規化 JSON -> JS 函式主體
+_compiled_nodes = {}  # 規格正規化 JSON -> 只定位節點的 JS 函式主體
+
+
+def _js(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _xpath_literal(s):
+    if "'" not in s:
+        return f"'{s}'"
+    if '"' not in s:
+        return f'"{s}"'
+    return "concat('" + "', \"'\", '".join(s.split("'")) + "')"
+
+
+def _as_list(value, where):
+    """字串或字串陣列 -> 字串列表；其他型別拋出 ValueError"""
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, (list, tuple)) and value and all(isinstance(v, str) for v in value):
+        return list(value)
+    raise ValueError(f"{where} 必須是字串或字串陣列")
+
+
+def _str(value, where):
+    if not isinstance(value, str):
+        raise ValueError(f"{where} 必須是字串")
+    return value
+
+
+def _selector(value, where):
+    """定位用字串不可為空 (空的 querySelector 會在頁面內每次輪詢都拋出 SyntaxError)"""
+    if not _str(value, where).strip():
+        raise ValueError(f"{where} 不可為空白")
+    return value
+
+
+def _int(value, where):
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"{where} 必須是整數")
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{where} 必須是整數") from None
+
+
+def _check(obj, allowed, where):
+    if not isinstance(obj, dict):
+        raise ValueError(f"{where} 必須是物件")
+    unknown = [k for k in obj if k not in allowed]
+    if unknown:
+        raise ValueError(f"{where} 含未知欄位: {', '.join(unknown)}")
+
+
+def _locate_js(loc, ctx, where):
+    """定位器 -> JS 運算式 (求值為單一節點或 null)"""
+    kinds = [k for k in _LOCATOR_KEYS if k in loc]
+    if len(kinds) != 1:
+        raise ValueError(f"{where} 需指定 id / css / xpath / text 其中之一")
+    kind = kinds[0]
+    if kind == "text":
+        texts = [_selector(t, f"{where} 的 text") for t in _as_list(loc["text"], f"{where} 的 text")]
+        tag = _selector(loc.get("tag", "*"), f"{where} 的 tag")
+        kind, sel = "xpath", (".//" if ctx != "null" else "//") + tag + "[" + " or ".join(
+            f"contains(text(), {_xpath_literal(t)})" for t in texts) + "]"
+    else:
+        sel = _selector(loc[kind], f"{where} 的 {kind}")
+    closest = loc.get("closest")
+    if closest is not None:
+        _str(closest, f"{where} 的 closest")
+    has, not_has = loc.get("has"), loc.get("not_has")
+    has = _as_list(has, f"{where} 的 has") if has else None
+    not_has = _as_list(not_has, f"{where} 的 not_has") if not_has else None
+    index = _int(loc.get("index", 0), f"{where} 的 index")
+
+    if has or not_has or index:
+        # 需要比對多個候選: 全部取出 -> closest -> 文字過濾 -> 取第 index 個 (整份文件查找時結果快取於頁面)
+        cache = _js(f"n:{kind}:{sel}:{closest}:{has}:{not_has}:{index}") if ctx == "null" else "null"
+        return "N({}, {}, {}, {}, {}, {}, {}, {})".format(
+            _js(kind), _js(sel), ctx, _js(closest), _js(has), _js(not_has), index, cache)
+    if kind == "id":
+        expr = f"document.getElementById({_js(sel)})" if ctx == "null" else f"Q({_js('#' + sel)}, {ctx})"
+    elif kind == "css":
+        expr = f"Q({_js(sel)}, {ctx})"
+    else:
+        expr = f"X({_js(sel)}, {ctx})"
+    return f"K({expr}, {_js(closest)})" if closest else expr
+
+
+def _field_js(field, name, var):
+    """欄位 -> (定位運算式, 讀值運算式)"""
+    where = f"{name} 欄位"
+    _check(field, _LOCATOR_KEYS + _LOCATOR_OPTIONS + _FIELD_OPTIONS, where)
+    node = _locate_js(field, "row", where) if any(k in field for k in _LOCATOR_KEYS) else "row"
+    attr, line = field.get("attr"), field.get("line")
+    if attr is not None:
+        _str(attr, f"{where} 的 attr")
+    if line is not None:
+        line = _int(line, f"{where} 的 line")
+    return node, f"R({var}, {_js(attr)}, {_js(line)})"
+
+
+def _cache_key(spec):
+    try:
+        return json.dumps(spec, sort_keys=True, ensure_ascii=False)
+    except (TypeError, ValueError):
+        raise ValueError("規格只能包含 JSON 型別 (物件、陣列、字串、數字)") from None
+
+
+def _node_lines(spec, scroll):
+    """定位 row / b / a 節點的 JS 敘述；回傳 (敘述列表, bid 讀值運算式, ask 讀值運算式)"""
+    _check(spec, _SPEC_KEYS, "規格")
+    if "bid" not in spec or "ask" not in spec:
+        raise ValueError("規格需包含 bid 與 ask")
+    lines = []
+    if "row" in spec:
+        _check(spec["row"], _LOCATOR_KEYS + _LOCATOR_OPTIONS, "row 定位器")
+        lines.append(f"var row = {_locate_js(spec['row'], 'null', 'row 定位器')};")
+        lines.append("if (!row) return null;")
+        if scroll and spec.get("scroll"):
+            lines.append("row.scrollIntoView({block: 'center'});")
+    else:
+        lines.append("var row = null;")
+        for name in ("bid", "ask"):
+            _check(spec[name], _LOCATOR_KEYS + _LOCATOR_OPTIONS + _FIELD_OPTIONS, f"{name} 欄位")
+            if not any(k in spec[name] for k in _LOCATOR_KEYS):
+                raise ValueError(f"{name} 欄位沒有定位器，且規格沒有 row")
+    bid_node, bid_read = _field_js(spec["bid"], "bid", "b")
+    ask_node, ask_read = _field_js(spec["ask"], "ask", "a")
+    lines.append(f"var b = {bid_node}, a = {ask_node};")
+    lines.append("if (!b || !a) return null;")
+    return lines, bid_read, ask_read
+
+
+def compile_spec(spec):
+    """規格 -> 函式主體 (回傳 [bid 原始字串, ask 原始字串] 或 null)；格式錯誤時拋出 ValueError"""
+    cache_key = _cache_key(spec)
+    body = _compiled.get(cache_key)
+    if body is not None:
+        return body
+    lines, bid_read, ask_read = _node_lines(spec, scroll=True)
+    lines.append(f"var bv = {bid_read}, av = {ask_read};")
+    lines.append("return (bv === null || av === null) ? null : [bv, av];")
+    body = "\n" + "\n".join(lines) + "\n"
+    _compiled[cache_key] = body
+    return body
+
+
+def compile_nodes(spec):
+    """規格 -> 函式主體 (回傳 [bid 節點, ask 節點] 或 null，不讀值也不捲動)，供 observer 只監看報價節點"""
+    cache_key = _cache_key(spec)
+    body = _compiled_nodes.get(cache_key)
+    if body is not None:
+        return body
+    lines, _, _ = _node_lines(spec, scroll=False)
+    lines.append("return [b, a];")
+    body = "\n" + "\n".join(lines) + "\n"
+    _compiled_nodes[cache_key] = body
+    return body
+
+
+def spec_from_selectors(broker):
+    """
+    舊版 S.py 設定 (bid_type/bid_selector/ask_type/ask_selector) 轉為規格。
+    Bid/Ask 指向同一元素時視為換行區塊，取最後兩行 (即原本 WF 的特判)。
+    """
+    def locator(kind, selector):
+        return {{"id": "id", "css": "css", "xpath": "xpath"}.get(kind, "id"): selector}
+
+    bid = locator(broker.get("bid_type", "id"), broker.get("bid_selector", ""))
+    ask = locator(broker.get("ask_type", "id"), broker.get("ask_selector", ""))
+    if bid == ask:
+        return {"row": bid, "bid": {"line": -2}, "ask": {"line": -1}}
+    return {"bid": bid, "ask": ask}
+
+
+if __name__ == "__main__":
+    # 自我檢查: 所有內建規格皆可編譯，格式錯誤會被擋下
+    for key, spec in BROKER_SPECS.items():
+        body = compile_spec(spec)
+        assert "return" in body and compile_spec(spec) is body, key
+        assert "scrollIntoView" not in compile_nodes(spec), key
+    assert spec_from_selectors({"bid_type": "id", "bid_selector": "pm-llg",
+                                "ask_type": "id", "ask_selector": "pm-llg"})["bid"] == {"line": -2}
+    for bad in ({"bid": {"css": "x"}}, {"bid": {"line": 1}, "ask": {"line": 2}},
+                {"bid": {"css": "x", "foo": 1}, "ask": {"css": "y"}},
+                {"row": {"text": 5}, "bid": {"line": 1}, "ask": {"line": 2}},
+                {"row": {"text": "Gold", "has": 3}, "bid": {"line": 1}, "ask": {"line": 2}},
+                {"bid": {"css": 1}, "ask": {"css": "y"}}, {"bid": 7, "ask": {"css": "y"}},
+                {"bid": {"css": ""}, "ask": {"css": ""}}, {"bid": {"id": "  "}, "ask": {"css": "y"}},
+                {"row": {"text": ["Gold", ""]}, "bid": {"line": 1}, "ask": {"line": 2}},
+                {"row": {"xpath": ""}, "bid": {"line": 1}, "ask": {"line": 2}},
+                {"bid": {"css": "x", "index": [1]}, "ask": {"css": "y", "line": None, "attr": 2}}):
+        try:
+            compile_spec(bad)
+        except ValueError:
+            continue
+        raise AssertionError(bad)
+    print(compile_spec(BROKER_SPECS["Oanda"]))
+    print(f"{len(BROKER_SPECS)} 個內建規格編譯完成")
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+瀏覽器監管 (備用 Chrome 與 session 自動復原)
+
+chromedriver 死掉或分頁崩潰時，原本只能一直顯示「連線異常」，
+必須手動停止/啟動，重新開啟全部分頁 (每頁間隔 1 秒)，要花數十秒。
+這裡預先在背景啟動一個備用 Chrome：
+- session 失效 (chromedriver / Chrome 結束): 直接換上備用瀏覽器，只重開原本在該瀏覽器上的分頁
+- 單一分頁崩潰或被關閉: 只重開該分頁
+換上備用後立即在背景預熱下一個備用，復原時間縮短到數秒。
+"""
+
+import threading
+import time
+
+from selenium.common.exceptions import InvalidSessionIdException, NoSuchWindowException
+from urllib3.exceptions import MaxRetryError, ProtocolError
+
+# --- 監管參數 ---
+HEALTH_INTERVAL = 5.0  # 主動健康檢查間隔 (秒)
+STANDBY_WAIT = 30.0  # 備用瀏覽器預熱中時，最多等待秒數 (逾時則當場冷啟動)
+
+# 錯誤訊息關鍵字 (Selenium 對同一種故障在不同版本會丟出不同例外類別，以訊息判斷較穩定)
+SESSION_ERRORS = ("invalid session id", "session deleted", "no such session",
+                  "chrome not reachable", "disconnected", "connection refused")
+TAB_ERRORS = ("tab crashed", "no such window", "target window already closed",
+              "web view not found", "target frame detached")
+
+
+def classify_error(exc):
+    """判斷例外屬於 "session" (整個瀏覽器失效) / "tab" (單一分頁失效) / None (一般擷取錯誤)"""
+    if isinstance(exc, InvalidSessionIdException):
+        return "session"
+    if isinstance(exc, NoSuchWindowException):
+        return "tab"
+    if isinstance(exc, (ConnectionError, MaxRetryError, ProtocolError)):
+        return "session"
+    msg = str(exc).lower()
+    if any(s in msg for s in SESSION_ERRORS):
+        return "session"
+    if any(s in msg for s in TAB_ERRORS):
+        return "tab"
+    return None
+
+
+class BrowserSupervisor:
+    """
+    備用瀏覽器管理 (執行緒安全，同一行程的多個引擎可共用)。
+    factory() 需回傳一個新的 WebDriver (沿用各程式的 Chrome 設定)。
+    """
+
+    def __init__(self, factory, log=None, standby=True, on_quit=None):
+        self.factory = factory
+        self.log = log
+        self.on_quit = on_quit  # 瀏覽器關閉後的回呼 (例如釋放設定檔目錄)
+        self.enabled = standby
+        self.lock = threading.Lock()
+        self.standby = None
+        self.warming = None
+        self.closed = False
+
+    def _log(self, msg):
+        if self.log:
+            self.log(msg)
+
+    def start(self):
+        """開始在背景預熱備用瀏覽器"""
+        self.closed = False
+        self._refill()
+
+    def _refill(self):
+        if not self.enabled:
+            return
+        with self.lock:
+            if self.closed or self.standby is not None or self.warming is not None:
+                return
+            self.warming = threading.Thread(target=self._warm, daemon=True)
+            self.warming.start()
+
+    def _warm(self):
+        try:
+            driver = self.factory()
+        except Exception as e:
+            self._log(f"[監管] 備用瀏覽器啟動失敗: {e}")
+            driver = None
+        with self.lock:
+            self.warming = None
+            if driver is not None and not self.closed:
+                self.standby = driver
+                driver = None
+        if driver is not None:
+            self._quit(driver)
+
+    def acquire(self):
+        """取得一個可用的瀏覽器: 優先使用備用 (預熱中則等待)，沒有才當場啟動。回傳 (driver, 是否為備用)"""
+        warming = self.warming
+        if warming is not None:
+            warming.join(STANDBY_WAIT)
+        with self.lock:
+            driver, self.standby = self.standby, None
+        if driver is not None and not self.alive(driver):
+            self._quit(driver)
+            driver = None
+        from_standby = driver is not None
+        if driver is None:
+            driver = self.factory()
+        self._refill()
+        return driver, from_standby
+
+    @staticmethod
+    def alive(driver):
+        try:
+            driver.window_handles
+            return True
+        except Exception:
+            return False
+
+    def retire(self, driver):
+        """在背景關閉失效的瀏覽器 (quit 可能卡住，不阻塞引擎)"""
+        threading.Thread(target=self._quit, args=(driver,), daemon=True).start()
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        if self.on_quit:
+            self.on_quit(driver)
+
+    def shutdown(self):
+        with self.lock:
+            self.closed = True
+            driver, self.standby = self.standby, None
+        if driver is not None:
+            self._quit(driver)
+
+
+if __name__ == "__main__":
+    # 以假 driver 驗證預熱/換用流程
+    class FakeDriver:
+        count = 0
+
+        def __init__(self):
+            FakeDriver.count += 1
+            self.n = FakeDriver.count
+            self.dead = False
+            time.sleep(0.2)  # 模擬 Chrome 啟動時間
+
+        @property
+        def window_handles(self):
+            if self.dead:
+                raise InvalidSessionIdException("invalid session id")
+            return ["main"]
+
+        def quit(self):
+            self.dead = True
+
+    sup = BrowserSupervisor(FakeDriver, log=print)
+    sup.start()
+    time.sleep(0.3)
+    started = time.perf_counter()
+    d, warm = sup.acquire()
+    print(f"取得 driver #{d.n} (備用={warm}) 耗時 {(time.perf_counter() - started) * 1000:.1f} ms")
+    d.dead = True
+    print("故障分類:", classify_error(InvalidSessionIdException("x")),
+          classify_error(Exception("unknown error: session deleted because of page crash")),
+          classify_error(Exception("tab crashed")), classify_error(Exception("timeout")))
+    time.sleep(0.3)
+    d, warm = sup.acquire()
+    print(f"取得 driver #{d.n} (備用={warm})")
+    sup.shutdown()
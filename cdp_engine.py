@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio 原生 CDP 引擎
+
+Selenium 一個 session 同時只有一個焦點視窗，只能 switch_to.window 後逐頁擷取。
+這裡每個分頁建立自己的 CDP WebSocket 連線，
+所有券商的擷取以 asyncio.gather 同時送出，
+一輪完整刷新的時間約等於最慢的單一分頁，而不是所有分頁相加。
+
+瀏覽器仍由 Selenium 啟動 (沿用各程式的 setup_driver 設定)，
+再透過 debuggerAddress 直接連到 DevTools。
+需要套件: websockets
+"""
+
+import asyncio
+import itertools
+import json
+import time
+import urllib.parse
+import urllib.request
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+from fast_extract import has_extractor, build_extractor, format_page_ts
+from resource_profile import resolve_profile
+from snapshot_replay import replay_url
+
+# --- 引擎參數 ---
+POLL_INTERVAL = 0.5  # 每輪最短間隔 (秒)
+EVAL_TIMEOUT = 3.0  # 單一分頁擷取逾時 (秒)，逾時不影響其他分頁
+
+
+def debugger_address(driver):
+    """取得 Selenium 啟動之 Chrome 的 DevTools 位址 (host:port)"""
+    return driver.capabilities["goog:chromeOptions"]["debuggerAddress"]
+
+
+class CdpTab:
+    """單一分頁的 CDP 連線 (每個分頁各自一條 WebSocket)"""
+
+    def __init__(self, key, target_id, ws_url):
+        self.key = key
+        self.target_id = target_id
+        self.ws_url = ws_url
+        self.ws = None
+        self.ids = itertools.count(1)
+        self.pending = {}
+        self.reader = None
+
+    async def connect(self):
+        self.ws = await websockets.connect(self.ws_url, max_size=None)
+        self.reader = asyncio.create_task(self._read_loop())
+
+    async def _read_loop(self):
+        try:
+            async for raw in self.ws:
+                msg = json.loads(raw)
+                fut = self.pending.pop(msg.get("id"), None)
+                if fut and not fut.done():
+                    fut.set_result(msg)
+        except Exception:
+            pass
+        finally:
+            for fut in self.pending.values():
+                if not fut.done():
+                    fut.set_exception(ConnectionError("CDP 連線中斷"))
+            self.pending.clear()
+
+    async def send(self, method, params=None, timeout=EVAL_TIMEOUT):
+        msg_id = next(self.ids)
+        fut = asyncio.get_running_loop().create_future()
+        self.pending[msg_id] = fut
+        await self.ws.send(json.dumps({"id": msg_id, "method": method, "params": params or {}}))
+        try:
+            msg = await asyncio.wait_for(fut, timeout)
+        finally:
+            self.pending.pop(msg_id, None)
+        if "error" in msg:
+            raise RuntimeError(msg["error"].get("message", "CDP error"))
+        return msg.get("result", {})
+
+    async def evaluate(self, script, timeout=EVAL_TIMEOUT):
+        """執行 execute_script 格式的腳本 (含 return)，回傳 JSON 值"""
+        result = await self.send("Runtime.evaluate", {
+            "expression": f"(function () {{ {script} }})()",
+            "returnByValue": True,
+        }, timeout)
+        return result.get("result", {}).get("value")
+
+    async def close(self):
+        if self.reader:
+            self.reader.cancel()
+        if self.ws:
+            try:
+                await self.ws.close()
+            except Exception:
+                pass
+
+
+class CdpEngine:
+    """
+    所有分頁同時擷取的 asyncio 引擎。
+    on_quote(key, bid, ask, time_str) 與 price_signal 的參數一致，GUI 不需修改。
+    """
+
+    def __init__(self, address, sites, on_quote, on_status, on_log, is_running,
+                 interval=POLL_INTERVAL):
+        self.address = address
+        self.sites = sites
+        self.on_quote = on_quote
+        self.on_status = on_status
+        self.on_log = on_log
+        self.is_running = is_running
+        self.interval = interval
+        self.tabs = []
+
+    def _new_target(self, url):
+        # Chrome 111 之後 /json/new 需要使用 PUT
+        req = urllib.request.Request(
+            f"http://{self.address}/json/new?{urllib.parse.quote(url, safe=':/?&=%#')}", method="PUT")
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+
+    async def open_tab(self, key):
+        loop = asyncio.get_running_loop()
+        # 先開空白分頁，套用該券商的資源阻擋清單後再導向
+        info = await loop.run_in_executor(None, self._new_target, "about:blank")
+        tab = CdpTab(key, info["id"], info["webSocketDebuggerUrl"])
+        await tab.connect()
+        self.sites[key]["handle"] = info["id"]
+        profile = resolve_profile(self.sites[key])
+        if profile["patterns"]:
+            try:
+                await tab.send("Network.enable")
+                await tab.send("Network.setBlockedURLs", {"urls": profile["patterns"]})
+            except Exception as e:
+                self.on_log(f"[{key}] 無法套用資源阻擋: {e}")
+        await tab.send("Page.navigate", {"url": replay_url(self.sites[key]["url"])}, timeout=profile["load_timeout"])
+        return tab
+
+    async def poll_tab(self, tab):
+        try:
+            result = await tab.evaluate(build_extractor(tab.key, self.sites[tab.key].get("extract")))
+        except Exception:
+            self.on_status(tab.key, "連線/切換異常")
+            return
+        if not result:
+            self.on_status(tab.key, "等待數據")
+            return
+        bid, ask = float(result.get("bid") or 0.0), float(result.get("ask") or 0.0)
+        if bid > 0 and ask > 0:
+            self.on_quote(tab.key, bid, ask, format_page_ts(result.get("ts")))
+            self.on_status(tab.key, "監控中")
+        else:
+            self.on_status(tab.key, "數據異常")
+
+    async def run(self):
+        if websockets is None:
+            self.on_log("缺少 websockets 套件，無法使用 CDP 引擎 (pip install websockets)")
+            return
+
+        keys = [k for k, site in self.sites.items() if has_extractor(k, site.get("extract"))]
+        for k in self.sites:
+            if k not in keys:
+                self.on_status(k, "未定義解析")
+
+        opened = await asyncio.gather(*(self.open_tab(k) for k in keys), return_exceptions=True)
+        for key, tab in zip(keys, opened):
+            if isinstance(tab, Exception):
+                self.on_log(f"[{key}] 開啟 CDP 分頁失敗: {tab}")
+                self.on_status(key, "連線/切換異常")
+            else:
+                self.tabs.append(tab)
+        self.on_log(f"CDP 引擎就緒，{len(self.tabs)} 個分頁同時擷取。")
+
+        try:
+            while self.is_running():
+                deadline = time.monotonic() + self.interval
+                await asyncio.gather(*(self.poll_tab(t) for t in self.tabs))
+                while self.is_running() and time.monotonic() < deadline:
+                    await asyncio.sleep(0.1)
+        finally:
+            await asyncio.gather(*(t.close() for t in self.tabs), return_exceptions=True)
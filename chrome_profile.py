@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+持久化 Chrome 設定檔 (暖啟動)
+
+每次啟動都用全新的暫存設定檔：各券商頁面要重新下載所有資源，
+Cookie / 同意橫幅也會再跳出來，有時還會蓋住報價元素。
+這裡由程式管理每個引擎自己的 user-data-dir：
+- HTTP 快取與 Cookie 跨次保留，第二次起首筆報價明顯變快
+- 每個設定檔第一次開啟某券商時自動按下同意按鈕 (seed)，之後不再出現；
+  沒找到橫幅時下次啟動再試，連續 SEED_MAX_STARTS 次都沒有才放棄
+- 啟動前檢查總容量，超過上限時先清除最久未使用設定檔的快取目錄 (保留 Cookie 與同意狀態)
+
+同一個 user-data-dir 同時只能給一個 Chrome 使用，
+備用瀏覽器與引擎各自從池中取得未使用的目錄 (名稱後加 -2、-3...)。
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+
+# --- 設定檔參數 ---
+PROFILE_ROOT = "chrome_profiles"  # 相對於程式執行目錄
+PROFILE_DISK_CAP_MB = 2048  # 所有設定檔合計容量上限
+PROFILE_CACHE_MB = 256  # 單一設定檔的 HTTP 快取上限 (--disk-cache-size)
+SEED_ATTEMPTS = 5  # 每次啟動每個券商嘗試按同意按鈕的次數 (橫幅可能延遲出現)
+SEED_MAX_STARTS = 3  # 連續幾次啟動都沒找到橫幅就不再嘗試
+
+_SEEDED_FILE = ".consent_seeded.json"
+_LAST_USED_FILE = ".last_used"
+# Chrome 佔用 user-data-dir 時留下的鎖定檔 (Linux/macOS 為 Singleton*，Windows 為 lockfile)
+_LOCK_FILES = ("SingletonLock", "SingletonSocket", "SingletonCookie", "lockfile")
+
+# 清理時可刪除的快取目錄 (Cookie、Local Storage 等同意狀態不動)
+CACHE_DIRS = [
+    os.path.join("Default", "Cache"),
+    os.path.join("Default", "Code Cache"),
+    os.path.join("Default", "GPUCache"),
+    os.path.join("Default", "Service Worker", "CacheStorage"),
+    os.path.join("Default", "Service Worker", "ScriptCache"),
+    "GrShaderCache",
+    "ShaderCache",
+    "GraphiteDawnCache",
+    "component_crx_cache",
+]
+
+# 常見同意管理平台 (CMP) 的「全部接受」按鈕；券商可在站點設定以 "consent": [...] 補充
+CONSENT_SELECTORS = [
+    "#onetrust-accept-btn-handler",
+    "#CybotCookiebotDialogBodyLevelButtonLevelOptinAllowAll",
+    "#CybotCookiebotDialogBodyButtonAccept",
+    "#didomi-notice-agree-button",
+    ".qc-cmp2-summary-buttons button[mode='primary']",
+    "#truste-consent-button",
+    ".cc-btn.cc-allow",
+    "button[data-testid='uc-accept-all-button']",
+]
+
+JS_ACCEPT_CONSENT = """
+var sels = arguments[0];
+for (var i = 0; i < sels.length; i++) {
+  var el = document.querySelector(sels[i]);
+  if (el && el.offsetParent !== null) { el.click(); return sels[i]; }
+}
+return null;
+"""
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ProfileStore:
+    """設定檔目錄池 (執行緒安全，每個行程一份)"""
+
+    def __init__(self, root=PROFILE_ROOT, cap_mb=PROFILE_DISK_CAP_MB):
+        self.root = os.path.abspath(root)
+        self.cap = cap_mb * 1024 * 1024
+        self.lock = threading.Lock()
+        self.in_use = set()
+
+    def acquire(self, prefix):
+        """取得未使用的設定檔目錄: prefix、prefix-2、prefix-3..."""
+        with self.lock:
+            n = 1
+            while True:
+                name = prefix if n == 1 else f"{prefix}-{n}"
+                path = os.path.join(self.root, name)
+                if path not in self.in_use:
+                    self.in_use.add(path)
+                    break
+                n += 1
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, _LAST_USED_FILE), "w") as f:
+            f.write(str(time.time()))
+        return path
+
+    def release(self, path):
+        with self.lock:
+            self.in_use.discard(path)
+
+    def release_driver(self, driver):
+        path = getattr(driver, "profile_path", None)
+        if path:
+            self.release(path)
+
+    @staticmethod
+    def chrome_args(path):
+        return [f"--user-data-dir={path}", "--profile-directory=Default",
+                f"--disk-cache-size={PROFILE_CACHE_MB * 1024 * 1024}"]
+
+    def cleanup(self, log=None):
+        """總容量超過上限時，從最久未使用的設定檔開始清除快取目錄"""
+        if not os.path.isdir(self.root):
+            return
+        profiles = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if os.path.isdir(path):
+                try:
+                    last_used = os.path.getmtime(os.path.join(path, _LAST_USED_FILE))
+                except OSError:
+                    last_used = 0.0
+                profiles.append((last_used, path, _dir_size(path)))
+        total = sum(p[2] for p in profiles)
+        if total <= self.cap:
+            return
+        freed = 0
+        with self.lock:
+            busy = set(self.in_use)
+        for _, path, _ in sorted(profiles):
+            if total - freed <= self.cap:
+                break
+            if path in busy:
+                continue
+            for sub in CACHE_DIRS:
+                target = os.path.join(path, sub)
+                if os.path.isdir(target):
+                    size = _dir_size(target)
+                    shutil.rmtree(target, ignore_errors=True)
+                    freed += size
+        if log:
+            log(f"瀏覽器設定檔共 {total / 1048576:.0f}MB，超過上限 {self.cap / 1048576:.0f}MB，"
+                f"已清除快取 {freed / 1048576:.0f}MB")
+
+
+def clear_stale_locks(prefix, root=PROFILE_ROOT):
+    """清除 prefix、prefix-2...、prefix-standby 等設定檔的鎖定檔
+
+    只能在確定使用這些目錄的 Chrome 都已結束後呼叫 (例如引擎行程樹被終止後)。
+    """
+    root = os.path.abspath(root)
+    if not os.path.isdir(root):
+        return
+    for name in os.listdir(root):
+        if name != prefix and not name.startswith(prefix + "-"):
+            continue
+        for lock in _LOCK_FILES:
+            path = os.path.join(root, name, lock)
+            if os.path.lexists(path):
+                os.remove(path)
+
+
+class ConsentSeeder:
+    """每個設定檔、每個券商只需按一次同意按鈕；記錄寫在設定檔目錄內
+
+    只有真的按到按鈕才算完成。本次啟動嘗試 SEED_ATTEMPTS 次仍沒找到橫幅時，
+    累計一次「未發現」並留到下次啟動再試 (橫幅可能晚出現或導覽後才出現)，
+    連續 SEED_MAX_STARTS 次都沒有才放棄。
+    """
+
+    def __init__(self):
+        self.attempts = {}  # (設定檔, 券商) -> 本次啟動已嘗試次數
+        self.given_up = set()  # 本次啟動已放棄的 (設定檔, 券商)
+        self.seeded = {}  # 設定檔 -> 已按下同意的券商集合
+        self.misses = {}  # 設定檔 -> {券商: 連續未發現橫幅的啟動次數}
+
+    def _load(self, path):
+        if path in self.seeded:
+            return
+        seeded, misses = set(), {}
+        if isinstance(path, str):
+            try:
+                with open(os.path.join(path, _SEEDED_FILE), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if isinstance(data, list):  # 舊格式只有已完成清單
+                    seeded = set(data)
+                else:
+                    seeded = set(data.get("seeded", ()))
+                    misses = {k: int(v) for k, v in data.get("misses", {}).items()}
+            except (OSError, ValueError, TypeError, AttributeError):
+                pass
+        self.seeded[path] = seeded
+        self.misses[path] = misses
+
+    def _save(self, path):
+        if not isinstance(path, str):
+            return
+        data = {"seeded": sorted(self.seeded[path]), "misses": self.misses[path]}
+        try:
+            with open(os.path.join(path, _SEEDED_FILE), "w", encoding="utf-8") as f:
+                json.dump(data, f)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _ident(driver):
+        # 未使用持久化設定檔時，只在這個瀏覽器存活期間記錄
+        return getattr(driver, "profile_path", None) or id(driver)
+
+    def pending(self, driver, key):
+        path = self._ident(driver)
+        self._load(path)
+        return (key not in self.seeded[path] and (path, key) not in self.given_up
+                and self.misses[path].get(key, 0) < SEED_MAX_STARTS)
+
+    def missed_starts(self, driver, key):
+        """連續未發現橫幅的啟動次數"""
+        path = self._ident(driver)
+        self._load(path)
+        return self.misses[path].get(key, 0)
+
+    def seed(self, driver, key, site):
+        """在目前分頁嘗試按下同意按鈕；回傳按下的選擇器或 None
+
+        本次啟動的嘗試次數用完仍未按到時，pending() 之後回傳 False，
+        呼叫端可據此記錄「未發現橫幅」。
+        """
+        path = self._ident(driver)
+        self._load(path)
+        selectors = list(site.get("consent", ())) + CONSENT_SELECTORS
+        clicked = driver.execute_script(JS_ACCEPT_CONSENT, selectors)
+        count = self.attempts.get((path, key), 0) + 1
+        self.attempts[(path, key)] = count
+        if clicked:
+            self.seeded[path].add(key)
+            self.misses[path].pop(key, None)
+            self._save(path)
+        elif count >= SEED_ATTEMPTS:
+            self.given_up.add((path, key))
+            self.misses[path][key] = self.misses[path].get(key, 0) + 1
+            self._save(path)
+        return clicked
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+跨券商共識價與偏離偵測
+
+單看各券商自己的點差，看不出某家報價整體偏離市場 (例如頁面卡住、報價源延遲或刻意拉開)。
+這裡把各券商最新的 Bid/Ask 放在以券商為索引的 NumPy 陣列，
+每批報價更新後以一次向量化運算求出:
+- 共識中間價: 所有有效券商中間價的中位數
+- 各券商偏離共識的 pips
+- 穩健 Z 分數: 0.6745 x (mid - 中位數) / MAD (中位數絕對偏差)，不受單一離群券商拉動
+"""
+
+import numpy as np
+
+# --- 共識參數 ---
+PIP_SIZE = 0.1  # XAUUSD 1 pip = 0.10 美元 (依習慣可改 0.01)
+MIN_BROKERS = 3  # 有效券商少於此數時不計算共識
+MAD_FLOOR = 0.02  # MAD 下限 (美元)，各家報價幾乎一致時避免 Z 分數被放大
+OUTLIER_Z = 3.5  # |Z| 超過此值視為離群 (Iglewicz-Hoaglin 建議值)
+
+
+class QuoteConsensus:
+    """GUI 主執行緒使用；update() 每筆 O(1)，compute() 每批一次"""
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        n = len(self.keys)
+        self.bid = np.full(n, np.nan)
+        self.ask = np.full(n, np.nan)
+        self.median = np.nan
+        self.deviation = np.full(n, np.nan)  # pips
+        self.zscore = np.full(n, np.nan)
+        self.dirty = False
+
+    def update(self, key, bid, ask):
+        i = self.index.get(key)
+        if i is None:
+            return
+        self.bid[i] = bid
+        self.ask[i] = ask
+        self.dirty = True
+
+    def compute(self, exclude=None):
+        """
+        重新計算共識；exclude 為布林陣列 (True=不納入共識，例如報價停滯)。
+        被排除的券商仍會算出相對於其他券商共識的偏離與 Z 分數。
+        有效券商不足時回傳 False，結果為 NaN。
+        """
+        self.dirty = False
+        mid = (self.bid + self.ask) * 0.5
+        valid = ~np.isnan(mid)
+        if exclude is not None:
+            valid &= ~exclude
+        if np.count_nonzero(valid) < MIN_BROKERS:
+            self.median = np.nan
+            self.deviation.fill(np.nan)
+            self.zscore.fill(np.nan)
+            return False
+        m = mid[valid]
+        median = np.median(m)
+        mad = max(np.median(np.abs(m - median)), MAD_FLOOR)
+        diff = mid - median
+        self.median = median
+        self.deviation = diff / PIP_SIZE
+        self.zscore = 0.6745 * diff / mad
+        return True
+
+    def get(self, key):
+        """(偏離 pips, Z 分數)；無資料時為 NaN"""
+        i = self.index[key]
+        return self.deviation[i], self.zscore[i]
+
+    def outliers(self, z=OUTLIER_Z):
+        """|Z| >= z 的券商"""
+        hit = np.abs(self.zscore) >= z  # NaN 比較結果為 False
+        return [self.keys[i] for i in np.flatnonzero(hit)]
+
+
+if __name__ == "__main__":
+    # 中間價 2650.0 / .1 / .2 / .3 與離群的 2655.0
+    # 中位數 2650.2，絕對偏差 0.2 / 0.1 / 0 / 0.1 / 4.8 -> MAD 0.1
+    mids = {"A": 2650.0, "B": 2650.1, "C": 2650.2, "D": 2650.3, "E": 2655.0}
+    cons = QuoteConsensus(mids)
+    for key, mid in mids.items():
+        cons.update(key, mid - 0.15, mid + 0.15)
+    assert cons.dirty and cons.compute() and not cons.dirty
+    assert abs(cons.median - 2650.2) < 1e-9
+    for key, pips in zip(mids, (-2.0, -1.0, 0.0, 1.0, 48.0)):
+        deviation, z = cons.get(key)
+        assert abs(deviation - pips) < 1e-6, (key, deviation)
+        assert abs(z - 0.6745 * pips * PIP_SIZE / 0.1) < 1e-6, (key, z)
+    assert cons.outliers() == ["E"]
+
+    # 排除 E: 中位數 2650.15，絕對偏差 0.15 / 0.05 / 0.05 / 0.15 -> MAD 0.1，E 仍有分數
+    assert cons.compute(exclude=np.array([False, False, False, False, True]))
+    assert abs(cons.median - 2650.15) < 1e-9
+    deviation, z = cons.get("E")
+    assert abs(deviation - 48.5) < 1e-6 and abs(z - 0.6745 * 4.85 / 0.1) < 1e-6
+    assert cons.outliers() == ["E"]
+
+    # 報價一致時 MAD 取下限，不會除以零
+    flat = QuoteConsensus("XYZ")
+    for key in "XYZ":
+        flat.update(key, 2650.0, 2650.2)
+    flat.update("unknown", 1.0, 2.0)  # 不在清單內的券商忽略
+    assert flat.compute() and flat.get("X") == (0.0, 0.0)
+    flat.update("Z", 2650.1, 2650.3)
+    assert flat.compute() and abs(flat.get("Z")[1] - 0.6745 * 0.1 / MAD_FLOOR) < 1e-6
+
+    # 有效券商不足 MIN_BROKERS: 回傳 False，結果為 NaN
+    few = QuoteConsensus(["A", "B", "C"])
+    few.update("A", 2650.0, 2650.2)
+    few.update("B", 2650.1, 2650.3)
+    assert not few.compute() and np.isnan(few.median)
+    assert all(np.isnan(v) for v in few.get("A")) and few.outliers() == []
+    assert not cons.compute(exclude=np.array([True, True, True, False, False]))
+    assert np.isnan(cons.median) and np.isnan(cons.get("E")[1])
+    print("consensus 自我檢查通過")
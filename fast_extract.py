@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+單次往返報價擷取 (In-Page Extraction)
+
+原本每個券商要經過 wait.until / find_element / .text / get_attribute
+等 2~6 個 WebDriver 指令，每個指令都是一次對 chromedriver 的 HTTP 往返。
+這裡把每個券商的 Bid/Ask 邏輯寫成一段 JavaScript，
+只用一次 execute_script 就在頁面內完成定位、讀值、解析，
+直接回傳 {bid, ask, ts}，其中 ts 為頁面端的毫秒時間戳。
+"""
+
+import datetime
+import json
+import time
+
+from broker_spec import BROKER_SPECS, compile_nodes, compile_spec
+from price_parser import CHAR_MAP
+
+# --- 節點快取統計輸出間隔 (秒) ---
+STATS_INTERVAL = 60.0
+
+# ==========================================
+#  頁面端共用函式
+# ==========================================
+# P: 價格解析 (與 price_parser.parse_price 規則一致，字元對照表共用)
+# T: 取元素文字
+# X: XPath 單一節點
+# Q: CSS 單一節點
+# K: 最近的祖先 (closest)
+# N: 多個候選時依 closest / 文字包含 / 文字排除 / 序號挑選
+# R: 讀屬性或文字，並可取第幾行
+# X/Q/N 在整份文件查找時，結果快取於頁面 (window.__goldNodeCache)，
+# 節點仍在文件中 (isConnected) 就直接重用，不再每次掃描整份 DOM；頁面重新載入時快取自然消失
+# H: 記錄一次快取查詢 (命中 / 未命中 / 節點已脫離文件)，S: 取出計數並歸零，隨擷取結果回傳
+JS_PRELUDE = r"""
+var PM = __PRICE_CHARS__;
+var P = function (s) {
+    if (s === null || s === undefined) return 0;
+    if (typeof s === 'number') return s;
+    s = String(s).trim();
+    if (/^\d+(?:\.\d+)?$/.test(s)) return parseFloat(s);
+    if (/^\d{1,3}(?:,\d{3})+(?:\.\d+)?$/.test(s)) return parseFloat(s.replace(/,/g, ''));
+    s = s.replace(/[^\x00-\x7f]/g, function (c) { return PM[c] || c; });
+    var m = /\d{1,3}(?:[ '](?=\d{3}(?!\d))\d{3})+(?:[.,]\d+)?|\d+(?:[.,]\d+)*/.exec(s);
+    if (!m) return 0;
+    var t = m[0].replace(/[ ']/g, ''), ci = t.lastIndexOf(','), di = t.lastIndexOf('.');
+    if (ci >= 0 && di >= 0) {
+        t = ci > di ? t.replace(/\./g, '').replace(',', '.') : t.replace(/,/g, '');
+    } else if (ci >= 0) {
+        var cp = t.split(',');
+        t = (cp.length === 2 && cp[1].length !== 3) ? cp[0] + '.' + cp[1] : cp.join('');
+    } else {
+        var dp = t.split('.');
+        if (dp.length > 2) t = dp.slice(1).every(function (p) { return p.length === 3; }) ? dp.join('') : dp[0] + '.' + dp[1];
+    }
+    var v = parseFloat(t);
+    return isNaN(v) ? 0 : v;
+};
+var T = function (el) { return el ? (el.innerText || el.textContent || '') : ''; };
+var C = window.__goldNodeCache || (window.__goldNodeCache = {});
+var H = function (n) {
+    if (n && n.isConnected) { C.__hits = (C.__hits | 0) + 1; return n; }
+    C.__miss = (C.__miss | 0) + 1;
+    if (n) C.__stale = (C.__stale | 0) + 1;
+    return null;
+};
+var S = function () {
+    var s = [C.__hits | 0, C.__miss | 0, C.__stale | 0];
+    C.__hits = C.__miss = C.__stale = 0;
+    return s;
+};
+var X = function (xp, ctx) {
+    if (!ctx) { var n = H(C['x:' + xp]); if (n) return n; }
+    var r = document.evaluate(xp, ctx || document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    if (!ctx && r) C['x:' + xp] = r;
+    return r;
+};
+var Q = function (css, ctx) {
+    if (!ctx) { var n = H(C['q:' + css]); if (n) return n; }
+    var r = (ctx || document).querySelector(css);
+    if (!ctx && r) C['q:' + css] = r;
+    return r;
+};
+var K = function (el, sel) { return el ? el.closest(sel) : null; };
+var N = function (kind, sel, ctx, closest, has, not, index, key) {
+    if (key) { var n = H(C[key]); if (n) return n; }
+    var list = [], out = [];
+    if (kind === 'id') {
+        var e = document.getElementById(sel);
+        if (e && (!ctx || ctx.contains(e))) list.push(e);
+    } else if (kind === 'css') {
+        list = Array.prototype.slice.call((ctx || document).querySelectorAll(sel));
+    } else {
+        var s = document.evaluate(sel, ctx || document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        for (var i = 0; i < s.snapshotLength; i++) list.push(s.snapshotItem(i));
+    }
+    var hit = function (t, words) { return words.some(function (w) { return t.indexOf(w) >= 0; }); };
+    for (var j = 0; j < list.length; j++) {
+        var el = closest ? K(list[j], closest) : list[j];
+        if (!el || out.indexOf(el) >= 0) continue;
+        var t = el.textContent || '';
+        if (has && !hit(t, has)) continue;
+        if (not && hit(t, not)) continue;
+        out.push(el);
+    }
+    var r = out[index < 0 ? out.length + index : index] || null;
+    if (key && r) C[key] = r;
+    return r;
+};
+var R = function (el, attr, line) {
+    var s = attr ? (el.getAttribute(attr) || T(el)) : T(el);
+    if (line === null) return s;
+    var ls = String(s).trim().split('\n');
+    var i = line < 0 ? ls.length + line : line;
+    return (i >= 0 && i < ls.length) ? ls[i] : null;
+};
+""".replace("__PRICE_CHARS__", json.dumps(CHAR_MAP))
+
+# ==========================================
+#  各券商頁面內解析邏輯 (由 broker_spec 的宣告式規格編譯)
+#  每段函式主體回傳 [bid 原始字串, ask 原始字串]，找不到元素則回傳 null
+# ==========================================
+JS_EXTRACTORS = {key: compile_spec(spec) for key, spec in BROKER_SPECS.items()}
+
+_compiled_cache = {}
+
+
+def extractor_body(key, spec=None):
+    """站點設定有 "extract" 規格時優先使用，否則使用內建規格"""
+    return compile_spec(spec) if spec else JS_EXTRACTORS[key]
+
+
+def nodes_body(key, spec=None):
+    """定位 [bid 節點, ask 節點] 的函式主體 (規格來源同 extractor_body)"""
+    return compile_nodes(spec if spec else BROKER_SPECS[key])
+
+
+def has_extractor(key, spec=None):
+    return bool(spec) or key in JS_EXTRACTORS
+
+
+def build_extractor(key, spec=None):
+    """組合出可直接交給 execute_script 的完整腳本 (依函式主體快取)"""
+    body = extractor_body(key, spec)
+    script = _compiled_cache.get(body)
+    if script is None:
+        script = (
+            "return (function () {\n"
+            + JS_PRELUDE
+            + "var r = (function () {" + body + "})();\n"
+            + "if (!r) return null;\n"
+            + "return {bid: P(r[0]), ask: P(r[1]), ts: performance.timeOrigin + performance.now(), cache: S()};\n"
+            + "})();"
+        )
+        _compiled_cache[body] = script
+    return script
+
+
+class NodeCacheStats:
+    """累計頁面內節點快取的命中 / 未命中 / 失效次數，定期輸出到日誌"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.last_report = time.monotonic()
+
+    def add(self, counts):
+        if counts:
+            self.hits += int(counts[0])
+            self.misses += int(counts[1])
+            self.stale += int(counts[2])
+
+    def stats_due(self):
+        """有查找活動且已到輸出間隔"""
+        return bool(self.hits or self.misses) and time.monotonic() - self.last_report >= STATS_INTERVAL
+
+    def take_stats(self):
+        """回傳統計字串並重設計數"""
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100.0) if total else 0.0
+        line = f"節點快取: 命中 {self.hits} / 未命中 {self.misses} / 失效 {self.stale} (命中率 {rate:.1f}%)"
+        self.hits = self.misses = self.stale = 0
+        self.last_report = time.monotonic()
+        return line
+
+
+def extract_quote(driver, key, spec=None, stats=None):
+    """
+    對目前分頁執行一次 execute_script。
+    回傳 (bid, ask, 頁面時間戳ms)；元素尚未出現則回傳 None。
+    指定 stats (NodeCacheStats) 時累計本次的節點快取計數。
+    """
+    result = driver.execute_script(build_extractor(key, spec))
+    if not result:
+        return None
+    if stats is not None:
+        stats.add(result.get("cache"))
+    return float(result.get("bid") or 0.0), float(result.get("ask") or 0.0), result.get("ts")
+
+
+def format_page_ts(ts_ms):
+    """頁面端毫秒時間戳 -> HH:MM:SS"""
+    if not ts_ms:
+        return datetime.datetime.now().strftime("%H:%M:%S")
+    return datetime.datetime.fromtimestamp(ts_ms / 1000.0).strftime("%H:%M:%S")
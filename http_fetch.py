@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP 快速擷取 (不經過瀏覽器)
+
+部分券商的報價直接寫在靜態 HTML 或由 JSON 端點提供，
+用一般 HTTP 用戶端輪詢即可，不需要整個 Chrome 分頁 (每頁省下數百 MB)。
+使用 urllib3 連線池 (Keep-Alive，Selenium 已依賴此套件) 與預先編譯的正則解析。
+連續失敗達上限時由 Worker 改回 Selenium 分頁，過一段時間再重試 HTTP。
+靜態 HTML 可能只是佔位值或伺服器快取的舊報價：解析一直成功但數字不動，
+所以連續多次取得完全相同的報價也視為失效，改回分頁；重試時報價仍是同一個值就繼續用分頁。
+
+HTTP 模式需在站點設定逐一開啟 (確認該站靜態頁面確實帶有即時報價後再啟用)。
+站點設定範例:
+    "mode": "http",
+    "http": {"url": "...", "format": "html",
+             "bid": {"id": "XAUUSD1"}, "ask": {"id": "XAUUSD2"}}
+    "http": {"url": "...", "format": "json",
+             "bid": "data.0.bid", "ask": "data.0.ask"}
+
+直接執行本檔會啟動本機替身伺服器做自我測試:
+    python http_fetch.py
+"""
+
+import json
+import re
+import time
+import html as html_lib
+
+import urllib3
+
+from price_parser import parse_price
+from snapshot_replay import replay_url
+
+# --- 連線與容錯參數 ---
+POOL_SIZE = 4  # 每個主機保留的 Keep-Alive 連線數
+HTTP_TIMEOUT = 5.0  # 單次請求逾時 (秒)
+HTTP_FAIL_LIMIT = 3  # 連續失敗幾次後改用瀏覽器
+HTTP_RETRY_SEC = 300.0  # 改用瀏覽器後，隔多久再試一次 HTTP
+HTTP_STALE_LIMIT = 30  # 連續幾次取得完全相同的報價視為靜態/快取頁面，改用瀏覽器
+HTTP_MIN_INTERVAL = 2.0  # 同一券商兩次 HTTP 請求的最短間隔 (秒)，整頁 HTML 不宜密集請求
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_pattern_cache = {}
+
+
+def _element_pattern(attr, value):
+    """依屬性 (id / class / 其他) 產生擷取元素內文的正則，並快取"""
+    key = (attr, value)
+    pat = _pattern_cache.get(key)
+    if pat is None:
+        if attr == "class":
+            attr_re = r'class\s*=\s*["\'][^"\']*(?<![\w-])' + re.escape(value) + r'(?![\w-])[^"\']*["\']'
+        else:
+            attr_re = re.escape(attr) + r'\s*=\s*["\']' + re.escape(value) + r'["\']'
+        pat = re.compile(r'<([a-zA-Z][\w-]*)\b[^>]*?' + attr_re + r'[^>]*>(.*?)</\1\s*>', re.S)
+        _pattern_cache[key] = pat
+    return pat
+
+
+def extract_html(text, selector):
+    """selector: {"id": ...} / {"class": ...} / {"attr": name, "value": ...}，回傳元素文字"""
+    if "id" in selector:
+        pat = _element_pattern("id", selector["id"])
+    elif "class" in selector:
+        pat = _element_pattern("class", selector["class"])
+    else:
+        pat = _element_pattern(selector["attr"], selector["value"])
+    m = pat.search(text)
+    if not m:
+        return None
+    return html_lib.unescape(_TAG_RE.sub(' ', m.group(2))).strip()
+
+
+def extract_json(data, path):
+    """以點號路徑取值，例如 "data.0.bid" """
+    node = data
+    for part in path.split('.'):
+        if isinstance(node, list):
+            node = node[int(part)]
+        else:
+            node = node[part]
+    return node
+
+
+class HttpQuoteFetcher:
+    """共用連線池的 HTTP 報價擷取器 (每個 Worker 一份)"""
+
+    def __init__(self):
+        self.pool = urllib3.PoolManager(
+            num_pools=16, maxsize=POOL_SIZE, block=False,
+            headers={"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"},
+            retries=False, timeout=urllib3.Timeout(total=HTTP_TIMEOUT))
+        self.failures = {}  # key -> 連續失敗次數
+        self.fallback_since = {}  # key -> 改用瀏覽器的時間
+        self.last_quote = {}  # key -> 上次 HTTP 報價
+        self.unchanged = {}  # key -> 報價連續未變動次數
+        self.frozen = {}  # key -> 判定凍結時的報價 (重試時仍是此值則不算恢復)
+        self.last_request = {}  # key -> 上次請求時間
+
+    def fetch(self, spec):
+        """回傳 (bid, ask)；解析不到時回傳 None，網路錯誤則拋出例外"""
+        resp = self.pool.request("GET", replay_url(spec["url"]))
+        if resp.status != 200:
+            raise IOError(f"HTTP {resp.status}")
+        if spec.get("format") == "json":
+            data = json.loads(resp.data.decode("utf-8"))
+            bid, ask = extract_json(data, spec["bid"]), extract_json(data, spec["ask"])
+        else:
+            text = resp.data.decode(spec.get("encoding", "utf-8"), errors="replace")
+            bid, ask = extract_html(text, spec["bid"]), extract_html(text, spec["ask"])
+        bid, ask = parse_price(bid), parse_price(ask)
+        if bid > 0 and ask > 0:
+            return bid, ask
+        return None
+
+    # ----- 失敗計數與瀏覽器備援 -----
+    def due(self, key):
+        """距上次請求已超過 HTTP_MIN_INTERVAL"""
+        return time.monotonic() - self.last_request.get(key, float("-inf")) >= HTTP_MIN_INTERVAL
+
+    def use_http(self, key):
+        """此券商目前是否走 HTTP (備援中但已到重試時間也會回傳 True)"""
+        since = self.fallback_since.get(key)
+        return since is None or time.monotonic() - since >= HTTP_RETRY_SEC
+
+    def in_fallback(self, key):
+        return key in self.fallback_since
+
+    def record(self, key, quote):
+        """
+        回報結果 (bid, ask) 或 None (失敗)；
+        回傳 "fallback" (連續失敗) / "stale" (報價凍結) 需改用瀏覽器，"recovered" (HTTP 恢復) 或 None
+        """
+        now = time.monotonic()
+        self.last_request[key] = now
+        if quote is not None:
+            self.failures[key] = 0
+            if key in self.fallback_since:
+                if quote == self.frozen.get(key):
+                    # 仍是判定凍結時的同一個值，繼續使用瀏覽器並重新計時
+                    self.fallback_since[key] = now
+                    return None
+                del self.fallback_since[key]
+                self.frozen.pop(key, None)
+                self.last_quote[key], self.unchanged[key] = quote, 0
+                return "recovered"
+            if quote != self.last_quote.get(key):
+                self.last_quote[key], self.unchanged[key] = quote, 0
+                return None
+            self.unchanged[key] = self.unchanged.get(key, 0) + 1
+            if self.unchanged[key] >= HTTP_STALE_LIMIT:
+                self.frozen[key] = quote
+                self.unchanged[key] = 0
+                self.fallback_since[key] = now
+                return "stale"
+            return None
+        if key in self.fallback_since:
+            # 重試仍失敗，重新計時
+            self.fallback_since[key] = time.monotonic()
+            return None
+        self.failures[key] = self.failures.get(key, 0) + 1
+        if self.failures[key] >= HTTP_FAIL_LIMIT:
+            self.fallback_since[key] = time.monotonic()
+            return "fallback"
+        return None
+
+
+if __name__ == "__main__":
+    # 本機替身伺服器自我測試
+    import threading
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # 支援 Keep-Alive
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            if self.path == "/quote.json":
+                body = json.dumps({"data": [{"symbol": "XAUUSD", "bid": "2,650.12", "ask": 2650.48}]})
+                ctype = "application/json"
+            elif self.path == "/mw":
+                body = ('<html><body><table><tr><td>XAUUSD</td>'
+                        '<td><span id="XAUUSD1">2,650.10</span></td>'
+                        '<td><span id="XAUUSD2"><b>2,650.60</b></span></td></tr></table></body></html>')
+                ctype = "text/html; charset=utf-8"
+            elif self.path == "/ifc":
+                body = ('<div class="quote current_instrument_bid big">2650.11</div>'
+                        '<div class="current_instrument_ask">2650.55</div>')
+                ctype = "text/html; charset=utf-8"
+            else:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    fetcher = HttpQuoteFetcher()
+    cases = {
+        "MW": {"url": f"{base}/mw", "format": "html", "bid": {"id": "XAUUSD1"}, "ask": {"id": "XAUUSD2"}},
+        "IFC": {"url": f"{base}/ifc", "format": "html",
+                "bid": {"class": "current_instrument_bid"}, "ask": {"class": "current_instrument_ask"}},
+        "JSON": {"url": f"{base}/quote.json", "format": "json", "bid": "data.0.bid", "ask": "data.0.ask"},
+    }
+    expected = {"MW": (2650.10, 2650.60), "IFC": (2650.11, 2650.55), "JSON": (2650.12, 2650.48)}
+    for name, spec in cases.items():
+        quote = fetcher.fetch(spec)
+        print(f"{name}: {quote}")
+        assert quote == expected[name], (name, quote)
+    assert extract_html('<p class="x-bid">1</p><p class="bid">2</p>', {"class": "bid"}) == "2"
+    assert extract_html('<i data-k="b">1&#44;5</i>', {"attr": "data-k", "value": "b"}) == "1,5"
+    assert extract_html('<span id="a">1</span>', {"id": "b"}) is None
+
+    started = time.perf_counter()
+    for _ in range(200):
+        fetcher.fetch(cases["MW"])
+    print(f"200 次 Keep-Alive 請求: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    # 連續失敗 -> 改用瀏覽器
+    missing = {"url": f"{base}/missing", "format": "html", "bid": {"id": "a"}, "ask": {"id": "b"}}
+    results = []
+    for i in range(HTTP_FAIL_LIMIT):
+        try:
+            fetcher.fetch(missing)
+            ok = True
+        except Exception:
+            ok = False
+        results.append(fetcher.record('X', (1.0, 2.0) if ok else None))
+    print(f"失敗測試: {results}")
+    assert results == [None] * (HTTP_FAIL_LIMIT - 1) + ["fallback"]
+    assert fetcher.in_fallback("X") and not fetcher.use_http("X")
+
+    # 報價凍結 -> 改用瀏覽器；重試仍是同一個值則繼續用分頁，換了新值才恢復 HTTP
+    states = [fetcher.record("S", (2650.1, 2650.6)) for _ in range(HTTP_STALE_LIMIT + 1)]
+    assert states[:-1] == [None] * HTTP_STALE_LIMIT and states[-1] == "stale", states
+    assert fetcher.in_fallback("S") and not fetcher.use_http("S")
+    fetcher.fallback_since["S"] -= HTTP_RETRY_SEC
+    assert fetcher.use_http("S")
+    same = fetcher.record('S', (2650.1, 2650.6))
+    assert same is None and fetcher.in_fallback("S") and not fetcher.use_http("S")
+    fetcher.fallback_since["S"] -= HTTP_RETRY_SEC
+    fresh = fetcher.record('S', (2651.0, 2651.4))
+    assert fresh == "recovered" and not fetcher.in_fallback("S") and fetcher.use_http("S")
+    print(f"凍結測試: {states[-1]} / 重試同值: {same} / 重試新值: {fresh}")
+
+    assert not fetcher.due("S")
+    fetcher.last_request["S"] -= HTTP_MIN_INTERVAL
+    assert fetcher.due("S")
+    server.shutdown()
+    print("HTTP 擷取自我測試通過")
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+分頁記憶體監控與自動回收
+
+監控程式 24/5 執行，Capital.com、Markets.com 這類長時間不重新整理的 SPA 頁面
+JS heap 與 DOM 節點會持續成長，Chrome 變慢後整輪擷取也跟著變慢。
+這裡定期以 CDP Performance.getMetrics 取樣每個分頁的 JS heap 與 DOM 節點數，
+超過預算時在原分頁重新載入 (只影響該分頁，其他分頁不受干擾)。
+
+站點設定範例:
+    "memory_budget": {"heap_mb": 400, "nodes": 200000}
+"""
+
+import time
+
+# --- 記憶體預算 (可在站點設定覆寫) ---
+MEMORY_CHECK_INTERVAL = 60.0  # 每個分頁取樣間隔 (秒)
+DEFAULT_HEAP_BUDGET_MB = 300.0  # JS heap 使用量上限 (MB)
+DEFAULT_NODE_BUDGET = 150000  # DOM 節點數上限
+RECYCLE_COOLDOWN = 600.0  # 同一分頁兩次回收之間至少間隔 (秒)，避免頁面本身就超標時反覆重載
+
+
+def format_memory(heap_mb, nodes):
+    """狀態欄顯示用，例如 "85MB / 12.3k節點" """
+    return f"{heap_mb:.0f}MB / {nodes / 1000:.1f}k節點"
+
+
+class MemoryGovernor:
+    """每個 Worker 一份；呼叫端需先切換到該券商分頁"""
+
+    def __init__(self, interval=MEMORY_CHECK_INTERVAL):
+        self.interval = interval
+        self.next_check = {}  # key -> monotonic
+        self.enabled = set()  # 已啟用 Performance domain 的 handle
+        self.last_recycle = {}  # key -> monotonic
+        self.samples = {}  # key -> (heap_mb, nodes)
+
+    def due(self, key):
+        return time.monotonic() >= self.next_check.get(key, 0.0)
+
+    def forget(self, key, handle=None):
+        """分頁關閉或換瀏覽器時清除狀態"""
+        self.next_check.pop(key, None)
+        self.samples.pop(key, None)
+        self.enabled.discard(handle)
+
+    def sample(self, driver, key, handle):
+        """取樣目前分頁，回傳 (heap_mb, nodes)"""
+        self.next_check[key] = time.monotonic() + self.interval
+        if handle not in self.enabled:
+            driver.execute_cdp_cmd("Performance.enable", {})
+            self.enabled.add(handle)
+        result = driver.execute_cdp_cmd("Performance.getMetrics", {})
+        metrics = {m["name"]: m["value"] for m in result.get("metrics", [])}
+        heap_mb = metrics.get("JSHeapUsedSize", 0.0) / (1024 * 1024)
+        nodes = int(metrics.get("Nodes", 0))
+        self.samples[key] = (heap_mb, nodes)
+        return heap_mb, nodes
+
+    def over_budget(self, key, site, heap_mb, nodes):
+        """超過預算且不在冷卻期間時回傳原因字串，否則回傳 None"""
+        budget = site.get("memory_budget", {})
+        heap_limit = budget.get("heap_mb", DEFAULT_HEAP_BUDGET_MB)
+        node_limit = budget.get("nodes", DEFAULT_NODE_BUDGET)
+        if heap_mb > heap_limit:
+            reason = f"JS heap {heap_mb:.0f}MB > {heap_limit:.0f}MB"
+        elif nodes > node_limit:
+            reason = f"DOM 節點 {nodes} > {node_limit}"
+        else:
+            return None
+        if time.monotonic() - self.last_recycle.get(key, -RECYCLE_COOLDOWN) < RECYCLE_COOLDOWN:
+            return None
+        return reason
+
+    def recycled(self, key):
+        self.last_recycle[key] = time.monotonic()
+        # 重新載入後稍等再取樣
+        self.next_check[key] = time.monotonic() + self.interval
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+每券商 OHLC K 線 (增量彙總)
+
+趨勢圖與報表若每次都從逐筆歷史重新計算，資料越多越慢。
+這裡在 on_price_update 收到每一筆報價時就地更新 1 秒 / 1 分 / 5 分 K 線:
+每根 K 線記錄中間價 (mid) 與點差 (spread) 的開高低收與 tick 數，spread_high 即該區間最大點差。
+- 進行中的 K 線以 Python 純量更新 (每筆 O(1))，收盤時才寫入 NumPy 結構化陣列
+- 已收盤的 K 線存放在固定容量的環形陣列，記憶體上限固定，不隨執行時間成長
+- 沒有報價的區間不產生 K 線 (不補空 K)
+
+    python ohlc_bars.py        # 自我檢查
+"""
+
+import numpy as np
+
+# --- K 線週期 (秒) 與各週期保留根數 ---
+BAR_CAPACITY = {
+    1: 6 * 3600,  # 1 秒線保留 6 小時
+    60: 7 * 1440,  # 1 分線保留 7 天
+    300: 30 * 288,  # 5 分線保留 30 天
+}
+
+BAR_DTYPE = np.dtype([
+    ("start", "<f8"),
+    ("mid_open", "<f8"), ("mid_high", "<f8"), ("mid_low", "<f8"), ("mid_close", "<f8"),
+    ("spread_open", "<f8"), ("spread_high", "<f8"), ("spread_low", "<f8"), ("spread_close", "<f8"),
+    ("ticks", "<i4"),
+])
+
+
+class BarSeries:
+    """單一券商、單一週期的 K 線"""
+
+    def __init__(self, period, capacity):
+        self.period = period
+        self.capacity = capacity
+        self.bars = np.zeros(capacity, dtype=BAR_DTYPE)
+        self.closed = 0  # 累計收盤根數
+        self.current = None  # 進行中: [start, mo, mh, ml, mc, so, sh, sl, sc, ticks]
+
+    def update(self, ts, mid, spread):
+        start = ts - ts % self.period
+        cur = self.current
+        if cur is not None and start <= cur[0]:
+            # 同一根 (系統時鐘倒退時也併入進行中的 K 線，不回頭改已收盤的)
+            if mid > cur[2]: cur[2] = mid
+            if mid < cur[3]: cur[3] = mid
+            cur[4] = mid
+            if spread > cur[6]: cur[6] = spread
+            if spread < cur[7]: cur[7] = spread
+            cur[8] = spread
+            cur[9] += 1
+            return
+        if cur is not None:
+            self.bars[self.closed % self.capacity] = tuple(cur)
+            self.closed += 1
+        self.current = [start, mid, mid, mid, mid, spread, spread, spread, spread, 1]
+
+    def __len__(self):
+        return min(self.closed, self.capacity) + (self.current is not None)
+
+    def read(self, n=None, since=None):
+        """
+        依時間順序回傳最近的 K 線 (含進行中的一根)，為獨立的結構化陣列。
+        n: 最多幾根；since: 只取起始時間 >= since 的 K 線
+        """
+        count = min(self.closed, self.capacity)
+        head = self.closed % self.capacity
+        if self.closed <= self.capacity:
+            done = self.bars[:count]
+        else:
+            done = np.concatenate((self.bars[head:], self.bars[:head]))
+        if self.current is not None:
+            out = np.empty(len(done) + 1, dtype=BAR_DTYPE)
+            out[:-1] = done
+            out[-1] = tuple(self.current)
+        else:
+            out = done.copy()
+        if since is not None:
+            out = out[np.searchsorted(out["start"], since, side="left"):]
+        if n is not None:
+            out = out[-n:] if n > 0 else out[:0]
+        return out
+
+
+class BarBook:
+    """所有券商、所有週期；GUI 主執行緒使用"""
+
+    def __init__(self, capacity=None):
+        self.capacity = dict(capacity or BAR_CAPACITY)
+        self.series = {}  # key -> [BarSeries, ...] (依週期由小到大)
+
+    @property
+    def periods(self):
+        return sorted(self.capacity)
+
+    def update(self, key, ts, bid, ask):
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [BarSeries(p, self.capacity[p]) for p in self.periods]
+        mid = (bid + ask) * 0.5
+        spread = ask - bid
+        for s in series:
+            s.update(ts, mid, spread)
+
+    def bars(self, key, period, n=None, since=None):
+        """某券商某週期的 K 線；尚無資料時回傳空陣列"""
+        for s in self.series.get(key, ()):
+            if s.period == period:
+                return s.read(n, since)
+        if period not in self.capacity:
+            raise ValueError(f"未設定的 K 線週期: {period}")
+        return np.zeros(0, dtype=BAR_DTYPE)
+
+    def keys(self):
+        return list(self.series)
+
+
+if __name__ == "__main__":
+    # 自我檢查: 開高低收、跨週期收盤、環形容量、時鐘倒退
+    book = BarBook({1: 3, 60: 10})
+    quotes = [(100.2, 2650.0, 2650.4), (100.7, 2651.0, 2651.2), (100.9, 2649.0, 2649.6),
+              (101.1, 2650.0, 2650.3), (102.5, 2650.5, 2650.7), (103.0, 2650.1, 2650.5),
+              (104.0, 2650.2, 2650.4), (103.5, 2650.3, 2651.3)]
+    for ts, bid, ask in quotes:
+        book.update("WF", ts, bid, ask)
+    sec = book.bars("WF", 1)
+    assert list(sec["start"]) == [101.0, 102.0, 103.0, 104.0]  # 收盤容量 3 + 進行中 1: 100 已被覆蓋
+    assert sec[-1]["ticks"] == 2 and abs(sec[-1]["spread_high"] - 1.0) < 1e-9  # 103.5 併入進行中的 104
+    minute = book.bars("WF", 60)
+    assert len(minute) == 1 and minute[0]["start"] == 60.0 and minute[0]["ticks"] == len(quotes)
+    m = minute[0]
+    assert (m["mid_open"], m["mid_high"], m["mid_low"]) == (2650.2, 2651.1, 2649.3)
+    assert abs(m["spread_high"] - 1.0) < 1e-9 and abs(m["spread_low"] - 0.2) < 1e-9
+    assert list(book.bars("WF", 1, n=2)["start"]) == [103.0, 104.0]
+    assert list(book.bars("WF", 1, since=103.0)["start"]) == [103.0, 104.0]
+    assert len(book.bars("IG", 60)) == 0
+    print("ohlc_bars 自我檢查通過")
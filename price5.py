@@ -18,6 +18,8 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from playsound import playsound
 
+from price_parser import parse_price
+
 # --- 設定檔名稱 ---
 CONFIG_FILE = "monitor_config.json"
 
@@ -72,20 +74,17 @@ class CrawlerThread(QThread):
 
                     if len(lines) > 3:
                         # 解析網頁結構 (第3行是買入價，第4行是賣出價)
-                        bid_str = lines[2].strip().replace(',', '')
-                        ask_line = lines[3].strip()
-                        ask_str = ask_line.split(' ')[0].replace(',', '')
+                        bid = parse_price(lines[2])
+                        ask = parse_price(lines[3])
 
-                        try:
-                            bid = float(bid_str)
-                            ask = float(ask_str)
+                        if bid > 0 and ask > 0:
                             now_str = time.strftime("%H:%M:%S")
 
                             # 發送數據給 GUI
                             self.price_signal.emit(bid, ask, now_str)
                             self.status_signal.emit("監控中 - 運行正常")
-                        except ValueError:
-                            self.log_signal.emit(f"數據轉換錯誤: {bid_str} / {ask_str}")
+                        else:
+                            self.log_signal.emit(f"數據轉換錯誤: {lines[2]} / {lines[3]}")
                     else:
                         self.log_signal.emit("抓取格式異常 (行數不足)")
 
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+共用價格解析
+
+各程式原本各有一份 parse_price，規則不一致:
+G9/G15 取第一行第一段再刪非數字、S.py 以 [\\d,]+ 搜尋、GOLD_PRO/LP 直接刪掉所有非數字字元
+(例如 "2,650.50\\n+1.2%" 會黏成 2650.50121 或解析失敗)，LP.py / price5.py 則直接 float()。
+這裡統一為一個實作:
+- 常見格式 (純數字、英式 / 歐式千分位、數字後接換行或空白的漲跌幅後綴) 只用字串方法判斷，不經過正則
+- 純 ASCII 文字不做字元對照轉換；只有最後一位是上標 / 下標點數時只換最後一個字元並直接走快速路徑
+- 取文字中第一個數字，漲跌幅等後綴不影響
+- 千分位: 2,650.50 / 2.650,50 / 2 650,50 / 2'650.50
+- 全形、阿拉伯-印度數字與上標 / 下標點數 (例如 2650.5⁵ = 2650.55)
+- 可指定小數點符號 (decimal="," 或 ".") 處理無法自動判斷的格式
+其餘格式才用預先編譯的正則搜尋。
+舊寫法 (刪非數字) 本身只有幾個字串操作；新版在微基準測試的各類輸入
+(純數字、千分位、後綴、上標、歐式) 都不慢於舊寫法，且結果正確。
+
+    python price_parser.py        # 驗證黃金語料並執行微基準測試
+"""
+
+import re
+
+# 上標 / 下標 / 全形 / 阿拉伯-印度數字與各種空白分隔符號 -> ASCII (fast_extract 的頁面端解析共用同一表)
+CHAR_MAP = {
+    **{c: str(i) for i, c in enumerate("⁰¹²³⁴⁵⁶⁷⁸⁹")},
+    **{c: str(i) for i, c in enumerate("₀₁₂₃₄₅₆₇₈₉")},
+    **{c: str(i) for i, c in enumerate("０１２３４５６７８９")},
+    **{c: str(i) for i, c in enumerate("٠١٢٣٤٥٦٧٨٩")},
+    **{c: str(i) for i, c in enumerate("۰۱۲۳۴۵۶۷۸۹")},
+    "٫": ".", "٬": ",", "．": ".", "，": ",", "\u2019": "'",
+    "\u00a0": " ", "\u202f": " ", "\u2009": " ", "\u2007": " ",
+}
+_TRANSLATE = str.maketrans(CHAR_MAP)
+
+_TOKEN_RE = re.compile(r"""
+    \d{1,3}(?:[ '](?=\d{3}(?!\d))\d{3})+(?:[.,]\d+)?   # 空白 / 撇號千分位: 2 650,50、2'650.50
+  | \d+(?:[.,]\d+)*                                    # 其他: 2650.5、2,650.50、2.650,50
+""", re.X)
+
+
+def _normalize(token, decimal):
+    """單一數字字串 -> 可交給 float() 的格式"""
+    token = token.replace(' ', '').replace("'", '')
+    if decimal == ',':
+        return token.replace('.', '').replace(',', '.')
+    if decimal == '.':
+        return token.replace(',', '')
+    if ',' in token and '.' in token:
+        # 兩種都有: 最後出現的是小數點
+        if token.rfind(',') > token.rfind('.'):
+            return token.replace('.', '').replace(',', '.')
+        return token.replace(',', '')
+    if ',' in token:
+        parts = token.split(',')
+        # 2650,5 為歐式小數；2,650 / 1,234,567 為千分位
+        if len(parts) == 2 and len(parts[1]) != 3:
+            return parts[0] + '.' + parts[1]
+        return ''.join(parts)
+    if token.count('.') > 1:
+        parts = token.split('.')
+        if all(len(p) == 3 for p in parts[1:]):
+            return ''.join(parts)  # 1.234.567 歐式千分位
+        return parts[0] + '.' + parts[1]  # 2650.50.5 黏連，保留第一個小數
+    return token
+
+
+def _quick(head):
+    """
+    快速路徑: 單一 ASCII 數字字串，判斷規則同 _normalize；
+    含其他字元 (貨幣符號、撇號、多個小數點等) 時回傳 None 交給完整流程。
+    """
+    whole, dot, frac = head.partition('.')
+    if dot:
+        if frac.isdigit():
+            if whole.isdigit():
+                return float(head)  # 2650.53
+            digits = whole.replace(',', '')
+            if digits.isdigit() and '' not in whole.split(','):
+                return float(digits + '.' + frac)  # 2,650.50
+        elif whole.isdigit():
+            group, comma, cents = frac.partition(',')
+            if comma and group.isdigit() and cents.isdigit():
+                return float(whole + group + '.' + cents)  # 2.650,50
+    elif whole.isdigit():
+        return float(head)  # 2650
+    if '' in head.replace('.', ',').split(','):
+        return None  # 分隔符號在頭尾或相連 (.5、2650.、2,,650)
+    c = head.rfind(',')
+    if c < 0:
+        t = head
+    elif head.rfind('.') > c:
+        t = head.replace(',', '')  # 2,650.50
+    elif '.' in head:
+        t = head.replace('.', '').replace(',', '.')  # 2.650,50
+    elif head.count(',') == 1 and len(head) - c != 4:
+        t = head.replace(',', '.')  # 2650,5
+    else:
+        t = head.replace(',', '')  # 2,650 / 1,234,567
+    if t.replace('.', '', 1).isdigit():
+        return float(t)
+    return None
+
+
+def parse_price(text, decimal=None):
+    """
+    從券商頁面文字取出第一個價格；無法解析時回傳 0.0。
+    decimal: None=自動判斷, "."=點為小數點, ","=逗號為小數點
+    """
+    if isinstance(text, str):
+        s = text
+    elif text is None:
+        return 0.0
+    elif isinstance(text, (int, float)):
+        return float(text)
+    else:
+        s = str(text)
+    quick = decimal is None
+    if not s.isascii():
+        head, last = s[:-1], s[-1:]
+        if last in CHAR_MAP and head.isascii():
+            s = head + CHAR_MAP[last]  # 2,650.4⁵ 這類只有最後一位點數是上標
+            if quick:
+                # 上標在最後，多半整段就是價格，不必先切後綴
+                value = _quick(s)
+                if value is not None:
+                    return value
+        else:
+            s = s.translate(_TRANSLATE)
+            quick = quick and s.isascii()
+    if quick:
+        # 第一段 + 後綴 (換行 / 空白之後)；後綴以數字開頭可能是空白千分位 (2 650,50)，交給完整流程
+        parts = s.split(None, 1)
+        if parts and (len(parts) == 1 or not parts[1][0].isdigit()):
+            value = _quick(parts[0])
+            if value is not None:
+                return value
+    m = _TOKEN_RE.search(s)
+    if not m:
+        return 0.0
+    try:
+        return float(_normalize(m.group(0), decimal))
+    except ValueError:
+        return 0.0
+
+
+# ==========================================
+#  黃金語料 (各券商頁面實際出現過的文字)
+# ==========================================
+GOLDEN_CASES = [
+    # (來源, 原始文字, 期望值)
+    ("WF", "2,650.50", 2650.50),
+    ("WF", "2,651.00 +1.20", 2651.00),
+    ("WF", "2,650.50\n+1.2%", 2650.50),
+    ("IG", "2650.53", 2650.53),
+    ("IG", "2650.5³", 2650.53),
+    ("Oanda", "2,650.48", 2650.48),
+    ("Oanda", "2650.48\n", 2650.48),
+    ("Forex", "2650.51", 2650.51),
+    ("MW", "2650.50", 2650.50),
+    ("Axi", " 2650.52 ", 2650.52),
+    ("Capital", "2 650,46", 2650.46),
+    ("Capital", "2\u00a0650.46", 2650.46),
+    ("KVB", "2650.55", 2650.55),
+    ("VT", "2650.50", 2650.50),
+    ("Markets", "2,650.49", 2650.49),
+    ("IFC", "2650.47", 2650.47),
+    ("CMC", "2,650.4⁵", 2650.45),
+    ("CMC", "$2,650.45", 2650.45),
+    ("WS", 2650.5, 2650.5),
+    ("HTTP", "Bid: 2,650.50 USD", 2650.50),
+    ("locale-de", "2.650,50", 2650.50),
+    ("locale-ch", "2'650.50", 2650.50),
+    ("locale-fr", "2\u202f650,50", 2650.50),
+    ("locale-fullwidth", "２，６５０．５０", 2650.50),
+    ("locale-ar", "٢٦٥٠٫٥٠", 2650.50),
+    ("glued", "2650.50.5", 2650.50),
+    ("empty", "", 0.0),
+    ("empty", None, 0.0),
+    ("empty", "--", 0.0),
+    ("empty", "N/A", 0.0),
+]
+
+
+def check_golden():
+    """回傳不符合期望的案例清單"""
+    return [(src, raw, expected, parse_price(raw)) for src, raw, expected in GOLDEN_CASES
+            if abs(parse_price(raw) - expected) > 1e-9]
+
+
+def benchmark(number=500, repeat=200):
+    """
+    微基準測試: 各類輸入每次呼叫的耗時 (ns)，並與舊版 (刪非數字 + 每次重新查正則) 比較。
+    新舊版交錯量測、各取最小值，降低機器負載變動的影響。
+    """
+    import time
+
+    def legacy(price_str):
+        try:
+            first_part = str(price_str).replace(',', '').strip().split('\n')[0].split(' ')[0]
+            clean_str = re.sub(r'[^\d.]', '', first_part)
+            return float(clean_str) if clean_str else 0.0
+        except:
+            return 0.0
+
+    samples = {"純數字": "2650.53", "千分位": "2,650.50", "後綴": "2,650.50\n+1.2%",
+               "上標": "2,650.4⁵", "歐式": "2.650,50"}
+    def run(fn, raw):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn(raw)
+        return (time.perf_counter() - started) / number * 1e9
+
+    results = {}
+    for name, raw in samples.items():
+        new = old = float("inf")
+        for _ in range(repeat):
+            new = min(new, run(parse_price, raw))
+            old = min(old, run(legacy, raw))
+        results[name] = (new, old)
+    return results
+
+
+if __name__ == "__main__":
+    failed = check_golden()
+    for src, raw, expected, got in failed:
+        print(f"[失敗] {src}: {raw!r} 期望 {expected} 實得 {got}")
+    print(f"黃金語料 {len(GOLDEN_CASES) - len(failed)}/{len(GOLDEN_CASES)} 通過")
+    for name, (new, old) in benchmark().items():
+        print(f"{name:<6} 新版 {new:7.0f} ns/次   舊版 {old:7.0f} ns/次")
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+獨立行程瀏覽器引擎 (Process Worker)
+
+QThread 引擎與 Qt 事件迴圈共用同一把 GIL，
+解析、訊號與 WebDriver JSON 處理都會和介面搶時間，某個引擎卡住時整個視窗也跟著卡。
+這裡把每個引擎放到獨立的 OS 行程裡執行，
+行程內沿用原本的 Worker 類別 (直接呼叫 run())，訊號改由 multiprocessing.Queue 傳回主程式，
+主程式端的 ProcessWorker 對外提供與 QThread 引擎相同的訊號與 start/stop/isRunning 介面。
+
+行程異常結束或長時間無任何回報時，會自動重新啟動該引擎，不影響視窗。
+重啟前會終止整個行程樹 (子行程、chromedriver 與 Chrome)，
+避免殘留的瀏覽器佔住記憶體與該引擎的持久化設定檔。
+"""
+
+import multiprocessing
+import os
+import queue
+import signal
+import subprocess
+import threading
+import time
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+# --- 行程監控參數 ---
+PUMP_INTERVAL_MS = 50  # 主程式讀取佇列的間隔
+HANG_TIMEOUT = 90.0  # 超過此秒數沒有任何回報視為卡死
+STOP_TIMEOUT = 20.0  # 送出停止後等待行程自行結束的秒數，逾時強制終止
+MAX_RESTARTS = 5  # 單一引擎最多自動重啟次數
+
+_mp = multiprocessing.get_context("spawn")
+
+
+def _watch_stop(stop_event, worker):
+    stop_event.wait()
+    worker.stop()
+
+
+def _kill_tree(pid):
+    """終止子行程與其衍生的 chromedriver / Chrome"""
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(pid)],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return
+    # 子行程啟動時已自成一個行程群組，chromedriver 與 Chrome 都在同一群組內；
+    # 子行程本身已結束時，群組內殘留的瀏覽器仍可用群組 ID 找到
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _worker_main(worker_cls, worker_id, sites, worker_kwargs, out_queue, stop_event):
+    """子行程進入點：建立原本的 Worker 並在本行程直接執行"""
+    if hasattr(os, "setsid"):
+        os.setsid()  # 自成行程群組，主程式可一次終止整個瀏覽器行程樹
+    worker = worker_cls(worker_id, sites, **worker_kwargs)
+    worker.log_signal.connect(lambda msg: out_queue.put(("log", (msg,))))
+    worker.price_signal.connect(lambda *args: out_queue.put(("price", args)))
+    worker.status_signal.connect(lambda *args: out_queue.put(("status", args)))
+    if hasattr(worker, "memory_signal"):
+        worker.memory_signal.connect(lambda *args: out_queue.put(("memory", args)))
+    threading.Thread(target=_watch_stop, args=(stop_event, worker), daemon=True).start()
+    worker.run()
+
+
+class ProcessWorker(QObject):
+    """主程式端代理：與 BrowserWorker 相同的訊號，實際工作在子行程內執行"""
+    log_signal = pyqtSignal(str)
+    price_signal = pyqtSignal(str, float, float, str)
+    status_signal = pyqtSignal(str, str)
+    memory_signal = pyqtSignal(str, float, int)
+    finished_signal = pyqtSignal()
+
+    def __init__(self, worker_cls, worker_id, assigned_sites, cleanup=None, **worker_kwargs):
+        super().__init__()
+        self.worker_cls = worker_cls
+        self.worker_id = worker_id
+        self.assigned_sites = assigned_sites
+        self.cleanup = cleanup  # 行程樹結束後、重啟前呼叫 (例如清除設定檔鎖定)
+        self.worker_kwargs = worker_kwargs  # 以啟動當下的快照傳入子行程
+        self.process = None
+        self.queue = None
+        self.stop_event = None
+        self.stopping = False
+        self.stop_requested_at = 0.0
+        self.last_seen = 0.0
+        self.restarts = 0
+        self.alive = False
+
+        self.pump_timer = QTimer(self)
+        self.pump_timer.timeout.connect(self.pump)
+
+    def start(self):
+        self.alive = True
+        self.spawn()
+        self.pump_timer.start(PUMP_INTERVAL_MS)
+
+    def spawn(self):
+        self.queue = _mp.Queue()
+        self.stop_event = _mp.Event()
+        self.process = _mp.Process(
+            target=_worker_main,
+            args=(self.worker_cls, self.worker_id, self.assigned_sites, self.worker_kwargs,
+                  self.queue, self.stop_event),
+            daemon=True)
+        self.process.start()
+        self.last_seen = time.monotonic()
+
+    def stop(self):
+        self.stopping = True
+        self.stop_requested_at = time.monotonic()
+        if self.stop_event:
+            self.stop_event.set()
+
+    def isRunning(self):
+        return self.alive
+
+    def pump(self):
+        # 1. 轉發子行程送回的訊號
+        try:
+            while True:
+                kind, args = self.queue.get_nowait()
+                self.last_seen = time.monotonic()
+                if kind == "price":
+                    self.price_signal.emit(*args)
+                elif kind == "status":
+                    self.status_signal.emit(*args)
+                elif kind == "log":
+                    self.log_signal.emit(*args)
+                elif kind == "memory":
+                    self.memory_signal.emit(*args)
+        except queue.Empty:
+            pass
+        except (EOFError, OSError):
+            pass
+
+        # 2. 行程健康檢查
+        now = time.monotonic()
+        if self.stopping:
+            if self.process.is_alive() and now - self.stop_requested_at > STOP_TIMEOUT:
+                self.log_signal.emit(f"[Worker-{self.worker_id}] 行程未在時限內結束，強制終止")
+                self.terminate_tree()
+            if not self.process.is_alive():
+                self.finish()
+            return
+
+        if not self.process.is_alive():
+            reason = f"行程異常結束 (exitcode={self.process.exitcode})"
+        elif now - self.last_seen > HANG_TIMEOUT:
+            reason = f"超過 {HANG_TIMEOUT:.0f} 秒無回應"
+        else:
+            return
+        # 卡死或異常結束都先清掉整個行程樹，殘留的 Chrome 會鎖住設定檔讓新行程開不起來
+        self.terminate_tree()
+
+        if self.restarts >= MAX_RESTARTS:
+            self.log_signal.emit(f"[Worker-{self.worker_id}] {reason}，已達重啟上限，停止此引擎")
+            for key in self.assigned_sites:
+                self.status_signal.emit(key, "引擎停止")
+            self.finish()
+            return
+
+        self.restarts += 1
+        self.log_signal.emit(f"[Worker-{self.worker_id}] {reason}，自動重啟 ({self.restarts}/{MAX_RESTARTS})")
+        for key in self.assigned_sites:
+            self.status_signal.emit(key, "引擎重啟中")
+        self.spawn()
+
+    def terminate_tree(self):
+        _kill_tree(self.process.pid)
+        self.process.join(2)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(2)
+        if self.cleanup:
+            try:
+                self.cleanup()
+            except OSError as e:
+                self.log_signal.emit(f"[Worker-{self.worker_id}] 清理失敗: {e}")
+
+    def finish(self):
+        self.pump_timer.stop()
+        self.alive = False
+        self.finished_signal.emit()
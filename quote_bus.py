@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+報價匯流排 (合併重繪)
+
+每次 price_signal.emit 都會排進 Qt 事件佇列，由主執行緒逐筆處理，
+每筆要改 6 個表格儲存格並重設警報標籤樣式；12 個券商同時跳動時主執行緒被大量小事件淹沒。
+這裡讓 Worker 直接把報價寫進共用的 QuoteBoard (在 Worker 執行緒內，只需一次加鎖):
+- latest: 每個券商最新一筆 (後寫者勝出)，附遞增序號，序號大於上次取出者即為待重繪
+- ticks: 期間內每一筆跳動，取出時全數交給警報與統計，不會因合併而漏掉
+GUI 以固定頻率 (QUOTE_DRAIN_HZ) 取出一次，表格重繪成本只與畫面更新頻率有關，與跳動頻率無關。
+"""
+
+import threading
+import time
+
+# --- 匯流排設定 ---
+QUOTE_DRAIN_HZ = 15  # GUI 取出頻率 (每秒次數)
+MAX_PENDING = 200000  # 未取出跳動上限 (GUI 長時間卡住時避免記憶體無限成長，超過的筆數計為遺失)
+
+
+class QuoteBoard:
+    """publish() 可由任何執行緒呼叫；drain() 由 GUI 主執行緒呼叫"""
+
+    def __init__(self, max_pending=MAX_PENDING):
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.drained_seq = 0
+        self.latest = {}  # key -> (seq, bid, ask, time_str, ts)
+        self.ticks = []  # [(seq, key, bid, ask, time_str, ts), ...]
+        self.dropped = 0
+
+    def publish(self, key, bid, ask, time_str):
+        """參數與 price_signal 相同，可直接以 DirectConnection 連接"""
+        ts = time.time()
+        with self.lock:
+            self.seq += 1
+            self.latest[key] = (self.seq, bid, ask, time_str, ts)
+            if len(self.ticks) < self.max_pending:
+                self.ticks.append((self.seq, key, bid, ask, time_str, ts))
+            else:
+                self.dropped += 1
+
+    def drain(self):
+        """
+        回傳 (dirty, ticks, dropped):
+        dirty 為上次取出後有更新的券商 {key: (seq, bid, ask, time_str, ts)}，
+        ticks 為期間內全部跳動 (依序號排序)，dropped 為超過上限而遺失的筆數。
+        """
+        with self.lock:
+            since, self.drained_seq = self.drained_seq, self.seq
+            ticks, self.ticks = self.ticks, []
+            dropped, self.dropped = self.dropped, 0
+            dirty = {k: v for k, v in self.latest.items() if v[0] > since}
+        return dirty, ticks, dropped
+
+    def get(self, key):
+        """某券商最新一筆 (seq, bid, ask, time_str, ts)，尚無報價時回傳 None"""
+        with self.lock:
+            return self.latest.get(key)
+
+
+if __name__ == "__main__":
+    # 自我檢查: 多執行緒寫入，合併後每券商只剩最新一筆，跳動一筆不漏
+    board = QuoteBoard()
+    keys = ["WF", "IG", "Oanda", "Forex"]
+
+    def writer(key):
+        for i in range(5000):
+            board.publish(key, 2650.0 + i * 0.01, 2650.3 + i * 0.01, "12:00:00")
+
+    threads = [threading.Thread(target=writer, args=(k,)) for k in keys]
+    for t in threads:
+        t.start()
+    seen = 0
+    while any(t.is_alive() for t in threads):
+        seen += len(board.drain()[1])
+    for t in threads:
+        t.join()
+    dirty, ticks, dropped = board.drain()
+    seen += len(ticks)
+    assert seen == 5000 * len(keys) and dropped == 0
+    assert all(abs(board.get(k)[1] - (2650.0 + 4999 * 0.01)) < 1e-9 for k in keys)
+    assert board.drain()[0] == {}
+    t0 = time.perf_counter()
+    for i in range(200000):
+        board.publish("WF", 2650.0, 2650.3, "12:00:00")
+    print(f"publish {(time.perf_counter() - t0) / 200000 * 1e9:.0f} ns/筆")
+    print("quote_bus 自我檢查通過")
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+推播式報價擷取 (MutationObserver)
+
+輪詢模式每一輪都重新讀 DOM，就算價格沒變也一樣，
+而且兩次輪詢之間的跳動會被漏掉。
+這裡在每個券商分頁注入一個 MutationObserver：
+報價節點一有變動就在頁面內重新解析，把 [bid, ask, 時間戳] 寫進環形緩衝區，
+Worker 每輪只需對每個分頁執行一次 drain，就能拿到期間內所有跳動。
+
+observer 只監看 Bid/Ask 節點本身 (及其父節點的子節點增減，用來察覺節點被整個替換)，
+頁面其他地方的跑馬燈、廣告、動畫不會觸發解析。
+節點脫離文件時重新定位；暫時找不到節點才改為監看整份文件的結構變動，等節點出現再切回。
+"""
+
+from fast_extract import JS_PRELUDE, extractor_body, has_extractor, nodes_body
+
+# --- 頁面內環形緩衝區容量 (每個分頁) ---
+RING_CAPACITY = 512
+
+# 腳本版本，修改注入邏輯時遞增，舊版 observer 會被替換
+OBSERVER_VERSION = 4
+
+_install_cache = {}
+
+# 取出緩衝區內所有跳動並清空；若頁面重新載入導致 observer 消失則回傳 null
+# 同時取出 observer 解析期間累積的節點快取計數 (見 fast_extract 的 H/S)
+JS_DRAIN = r"""
+var st = window.__goldQuoteObs;
+if (!st) return null;
+st.check();
+var out = [];
+for (var i = 0; i < st.count; i++) out.push(st.buf[(st.head + i) % st.cap]);
+var dropped = st.dropped;
+st.head = 0; st.count = 0; st.dropped = 0;
+var C = window.__goldNodeCache, cache = null;
+if (C) { cache = [C.__hits | 0, C.__miss | 0, C.__stale | 0]; C.__hits = C.__miss = C.__stale = 0; }
+return {ticks: out, dropped: dropped, cache: cache};
+"""
+
+
+def build_installer(key, spec=None):
+    """組合注入腳本：建立 observer 與緩衝區，並立即記錄一次目前報價"""
+    body = extractor_body(key, spec)
+    script = _install_cache.get(body)
+    if script is None:
+        script = (
+            "var st = window.__goldQuoteObs;\n"
+            f"if (st && st.v === {OBSERVER_VERSION}) return true;\n"
+            "if (st && st.obs) st.obs.disconnect();\n"
+            + JS_PRELUDE
+            + "var fn = function () {" + body + "};\n"
+            + "var nodes = function () {" + nodes_body(key, spec) + "};\n"
+            + f"st = {{v: {OBSERVER_VERSION}, cap: {RING_CAPACITY}, buf: [], head: 0, count: 0, dropped: 0, last: null, obs: null, targets: null}};\n"
+            + r"""
+var push = function () {
+    var r;
+    try { r = fn(); } catch (e) { return; }
+    if (!r) return;
+    var b = P(r[0]), a = P(r[1]);
+    if (!(b > 0 && a > 0)) return;
+    if (st.last && st.last[0] === b && st.last[1] === a) return;
+    st.last = [b, a];
+    st.buf[(st.head + st.count) % st.cap] = [b, a, performance.timeOrigin + performance.now()];
+    if (st.count < st.cap) { st.count++; } else { st.head = (st.head + 1) % st.cap; st.dropped++; }
+};
+var lost = function () {
+    if (!st.targets) return true;
+    for (var i = 0; i < st.targets.length; i++) if (!st.targets[i].isConnected) return true;
+    return false;
+};
+// 定位報價節點並只監看它們；找不到時暫時監看整份文件的結構變動，等節點出現
+var watch = function () {
+    st.obs.disconnect();
+    var ns = null;
+    try { ns = nodes(); } catch (e) {}
+    st.targets = ns;
+    if (!ns) {
+        st.obs.observe(document.body, {subtree: true, childList: true});
+        return;
+    }
+    for (var i = 0; i < ns.length; i++) {
+        var p = ns[i].parentNode;
+        if (p && ns.indexOf(p) < 0) st.obs.observe(p, {childList: true});
+    }
+    for (var j = 0; j < ns.length; j++) {
+        st.obs.observe(ns[j], {subtree: true, childList: true, characterData: true, attributes: true});
+    }
+};
+st.check = function () { if (lost()) { watch(); push(); } };
+if (!document.body) return false;
+st.obs = new MutationObserver(function () {
+    if (lost()) watch();
+    if (st.targets) push();
+});
+watch();
+window.__goldQuoteObs = st;
+push();
+return true;
+"""
+        )
+        _install_cache[body] = script
+    return script
+
+
+def has_observer(key, spec=None):
+    return has_extractor(key, spec)
+
+
+def drain_ticks(driver, key, spec=None, stats=None):
+    """
+    對目前分頁取出所有累積的跳動 [(bid, ask, 頁面時間戳ms), ...]。
+    observer 不存在 (首次或頁面已重新載入) 時自動注入，該輪回傳注入當下的報價。
+    第二個回傳值為緩衝區溢位而丟棄的筆數。
+    指定 stats (NodeCacheStats) 時累計期間內的節點快取計數。
+    """
+    result = driver.execute_script(JS_DRAIN)
+    if result is None:
+        if not driver.execute_script(build_installer(key, spec)):
+            return [], 0
+        result = driver.execute_script(JS_DRAIN) or {}
+    if stats is not None:
+        stats.add(result.get("cache"))
+    ticks = [(float(t[0]), float(t[1]), t[2]) for t in result.get("ticks", [])]
+    return ticks, int(result.get("dropped") or 0)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+各券商的網路資源阻擋設定 (CDP Network.setBlockedURLs)
+
+以往只能用 --blink-settings=imagesEnabled=false 全域關閉圖片：
+GOLD.py 為了 WF 只好全部保留，G15.py 全部關閉則可能讓 WF 讀不到報價。
+這裡改成每個分頁各自套用阻擋清單 (圖片、字型、影音、追蹤分析、廣告、客服聊天元件)，
+並各自決定載入策略與逾時，需要完整渲染的券商 (WF) 使用 "full"。
+
+站點設定範例:
+    "resources": "full"                                   # 使用預設檔
+    "resources": {"base": "lite", "allow": ["image"],     # 以預設檔為基礎調整
+                  "block": ["*tradingview.com*"]}
+    "page_load": "eager", "load_timeout": 20              # 個別覆寫載入策略 / 逾時 (秒)
+
+Selenium 無法接收 CDP 事件 (Fetch 攔截需要)，因此資源類型以網址樣式近似。
+"""
+
+import time
+
+from snapshot_replay import replay_url
+
+# --- 資源類型對應的網址樣式 (Network.setBlockedURLs 支援 * 萬用字元) ---
+RESOURCE_PATTERNS = {
+    "image": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico", "*.bmp"],
+    "font": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot", "*fonts.googleapis.com*", "*fonts.gstatic.com*"],
+    "media": ["*.mp4", "*.webm", "*.m3u8", "*.mp3", "*.ogg", "*youtube.com/embed*", "*player.vimeo.com*"],
+    "analytics": ["*google-analytics.com*", "*googletagmanager.com*", "*hotjar.com*", "*clarity.ms*",
+                  "*segment.io*", "*mixpanel.com*", "*connect.facebook.net*", "*analytics.tiktok.com*",
+                  "*snap.licdn.com*", "*cdn.amplitude.com*", "*sentry-cdn.com*"],
+    "ads": ["*doubleclick.net*", "*googlesyndication.com*", "*googleadservices.com*", "*adservice.google.*",
+            "*criteo.*", "*taboola.com*", "*outbrain.com*", "*bat.bing.com*", "*ads.linkedin.com*"],
+    "chat": ["*intercom.io*", "*intercomcdn.com*", "*livechatinc.com*", "*zendesk.com*", "*zopim.com*",
+             "*tawk.to*", "*drift.com*", "*crisp.chat*", "*salesforceliveagent.com*", "*livechat*"],
+}
+# 圖片/字型/影音依副檔名判斷，帶查詢字串的網址也要擋
+_EXTENSION_TYPES = ("image", "font", "media")
+
+# --- 預設檔 ---
+RESOURCE_PROFILES = {
+    "full": {"block": [], "page_load": "normal", "load_timeout": 60},
+    "lite": {"block": ["image", "font", "media", "analytics", "ads", "chat"], "page_load": "eager",
+             "load_timeout": 30},
+}
+DEFAULT_PROFILE = "lite"
+
+# 載入策略 -> 可開始擷取的 document.readyState
+READY_STATES = {
+    "normal": ("complete",),
+    "eager": ("interactive", "complete"),
+    "none": None,
+}
+
+
+def _expand(item):
+    patterns = RESOURCE_PATTERNS.get(item)
+    if patterns is None:
+        return [item]  # 直接指定的網址樣式
+    if item in _EXTENSION_TYPES:
+        return [p for pat in patterns for p in ((pat, pat + "?*") if pat.startswith("*.") else (pat,))]
+    return list(patterns)
+
+
+def resolve_profile(site):
+    """依站點設定合併出 {"name", "patterns", "page_load", "load_timeout"}"""
+    spec = site.get("resources", DEFAULT_PROFILE)
+    if isinstance(spec, str):
+        spec = {"base": spec}
+    name = spec.get("base", DEFAULT_PROFILE)
+    base = RESOURCE_PROFILES.get(name, RESOURCE_PROFILES[DEFAULT_PROFILE])
+    allow = set(spec.get("allow", ()))
+    items = [b for b in base["block"] if b not in allow] + list(spec.get("block", ()))
+    patterns = []
+    for item in items:
+        for pat in _expand(item):
+            if pat not in patterns:
+                patterns.append(pat)
+    return {
+        "name": name,
+        "patterns": patterns,
+        "page_load": site.get("page_load", base["page_load"]),
+        "load_timeout": float(site.get("load_timeout", base["load_timeout"])),
+    }
+
+
+def apply_profile(driver, profile):
+    """對目前分頁套用阻擋清單 (需在導向網址前呼叫)；Chrome 不支援時回傳 False"""
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": profile["patterns"]})
+        return True
+    except Exception:
+        return False
+
+
+def navigate(driver, url):
+    """在目前分頁導向網址，不等待載入完成 (等待由 PageLoadGate 依券商策略處理)"""
+    driver.execute_script("window.location.href = arguments[0];", replay_url(url))
+
+
+class PageLoadGate:
+    """
+    各分頁的載入策略閘門。
+    瀏覽器本身以 page_load_strategy='none' 啟動 (不阻塞指令)，
+    是否可以開始擷取改由此處依各券商的 page_load / load_timeout 判斷。
+    """
+
+    def __init__(self):
+        self.pending = {}  # key -> (可接受的 readyState, 逾時時間)
+
+    def start(self, key, profile):
+        states = READY_STATES.get(profile["page_load"], READY_STATES["normal"])
+        if states is None:
+            self.pending.pop(key, None)
+        else:
+            self.pending[key] = (states, time.monotonic() + profile["load_timeout"])
+
+    def discard(self, key):
+        self.pending.pop(key, None)
+
+    def check(self, driver, key):
+        """目前分頁需為該券商分頁；回傳 "ready" / "loading" / "timeout" (逾時後視為可擷取)"""
+        entry = self.pending.get(key)
+        if entry is None:
+            return "ready"
+        states, deadline = entry
+        state = driver.execute_script("return document.readyState;")
+        if state in states:
+            del self.pending[key]
+            return "ready"
+        if time.monotonic() >= deadline:
+            del self.pending[key]
+            return "timeout"
+        return "loading"
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+輪詢排程與引擎負載平衡
+
+LoadBalancer: 量測每個券商的實際擷取耗時，執行中把分頁從忙碌的引擎搬到空閒的引擎，
+              讓 WF 這種慢站不會拖慢同一組裡的其他券商。
+AdaptivePollScheduler: 每個券商有自己的輪詢間隔，報價活躍或接近警報時加快，凍結時放慢。
+"""
+
+import heapq
+import threading
+import time
+
+from http_fetch import HTTP_MIN_INTERVAL
+
+# --- 負載平衡參數 ---
+COST_ALPHA = 0.2  # 耗時 EWMA 平滑係數
+DEFAULT_COST = 1.0  # 尚未量測過的券商預估耗時 (秒)
+MIN_SAMPLES = 5  # 每個券商至少量測幾次才參與平衡
+REBALANCE_INTERVAL = 30.0  # 兩次搬移之間至少間隔 (秒)
+IMBALANCE_RATIO = 1.5  # 最忙/最閒引擎負載比超過此值才搬移
+KEY_COOLDOWN = 120.0  # 同一券商兩次搬移之間至少間隔 (秒)
+
+
+class LoadBalancer:
+    """
+    跨引擎的券商分配器 (執行緒安全)。
+    - Worker 每擷取完一個券商呼叫 record() 回報耗時
+    - Worker 每輪呼叫 take_releases() / take_adoptions() 處理交接
+    交接流程: 來源引擎關閉分頁後 hand_over()，目的引擎再開啟分頁接手。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.costs = {}  # key -> EWMA 秒
+        self.samples = {}  # key -> 量測次數
+        self.owner = {}  # key -> worker_id
+        self.releases = {}  # worker_id -> [key]
+        self.adoptions = {}  # worker_id -> [(key, site)]
+        self.in_transit = {}  # key -> 目的 worker_id
+        self.last_moved = {}  # key -> monotonic
+        self.last_rebalance = time.monotonic()
+        self.log = None  # 可選: 由 GUI 指定的日誌函式
+
+    # ----- 分配 -----
+    def initial_assignment(self, keys, worker_count):
+        """依既有耗時估計做 LPT 分配 (最耗時的先放進目前最輕的引擎)"""
+        buckets = [[] for _ in range(worker_count)]
+        loads = [0.0] * worker_count
+        for key in sorted(keys, key=lambda k: -self.costs.get(k, DEFAULT_COST)):
+            i = loads.index(min(loads))
+            buckets[i].append(key)
+            loads[i] += self.costs.get(key, DEFAULT_COST)
+        # 保持原本的顯示順序
+        order = {k: n for n, k in enumerate(keys)}
+        return [sorted(b, key=order.get) for b in buckets]
+
+    def register(self, worker_id, keys):
+        with self.lock:
+            for key in keys:
+                self.owner[key] = worker_id
+            self.releases.setdefault(worker_id, [])
+            self.adoptions.setdefault(worker_id, [])
+
+    def reset(self):
+        """停止監控時清除交接狀態 (保留耗時統計供下次啟動分配)"""
+        with self.lock:
+            self.owner.clear()
+            self.releases.clear()
+            self.adoptions.clear()
+            self.in_transit.clear()
+
+    # ----- 量測 -----
+    def record(self, key, cost):
+        with self.lock:
+            prev = self.costs.get(key)
+            self.costs[key] = cost if prev is None else prev + COST_ALPHA * (cost - prev)
+            self.samples[key] = self.samples.get(key, 0) + 1
+            if time.monotonic() - self.last_rebalance >= REBALANCE_INTERVAL:
+                self._rebalance()
+
+    def loads(self):
+        with self.lock:
+            return self._loads()
+
+    def _loads(self):
+        """各執行中引擎的負載 (已結束的引擎不列入)"""
+        result = {w: 0.0 for w in self.releases}
+        for key, w in self.owner.items():
+            if w in result:
+                result[w] += self.costs.get(key, DEFAULT_COST)
+        return result
+
+    def _idlest(self):
+        loads = self._loads()
+        return min(loads, key=loads.get) if loads else None
+
+    def _rebalance(self):
+        self.last_rebalance = time.monotonic()
+        if self.in_transit or len(self.releases) < 2:
+            return
+        loads = self._loads()
+        busiest = max(loads, key=loads.get)
+        idlest = min(loads, key=loads.get)
+        if loads[idlest] > 0 and loads[busiest] / loads[idlest] < IMBALANCE_RATIO:
+            return
+
+        now = time.monotonic()
+        gap = loads[busiest] - loads[idlest]
+        candidates = [k for k, w in self.owner.items()
+                      if w == busiest
+                      and self.samples.get(k, 0) >= MIN_SAMPLES
+                      and now - self.last_moved.get(k, -KEY_COOLDOWN) >= KEY_COOLDOWN]
+        # 只搬能讓差距縮小的券商 (耗時小於差距)，並挑最接近差距一半者
+        candidates = [k for k in candidates if self.costs.get(k, DEFAULT_COST) < gap]
+        if not candidates or sum(1 for w in self.owner.values() if w == busiest) < 2:
+            return
+        key = min(candidates, key=lambda k: abs(self.costs.get(k, DEFAULT_COST) - gap / 2))
+        self.in_transit[key] = idlest
+        self.last_moved[key] = now
+        self.releases[busiest].append(key)
+        if self.log:
+            self.log(f"[負載平衡] {key}: Worker-{busiest} -> Worker-{idlest} "
+                     f"(負載 {loads[busiest]:.2f}s / {loads[idlest]:.2f}s)")
+
+    # ----- 交接 -----
+    def take_releases(self, worker_id):
+        with self.lock:
+            keys, self.releases[worker_id] = self.releases.get(worker_id, []), []
+            return keys
+
+    def hand_over(self, key, site):
+        """來源引擎已關閉分頁，交給目的引擎 (目的引擎已結束時改交給目前最輕的引擎)"""
+        with self.lock:
+            dest = self.in_transit.get(key)
+            if dest not in self.adoptions:
+                dest = self._idlest()
+                if dest is None:
+                    self.in_transit.pop(key, None)
+                    self.owner.pop(key, None)
+                    return
+                self.in_transit[key] = dest
+            self.owner[key] = dest
+            self.adoptions.setdefault(dest, []).append((key, site))
+
+    def take_adoptions(self, worker_id):
+        with self.lock:
+            items, self.adoptions[worker_id] = self.adoptions.get(worker_id, []), []
+            return items
+
+    def adopted(self, key):
+        with self.lock:
+            self.in_transit.pop(key, None)
+
+    def unregister(self, worker_id, sites=None):
+        """
+        引擎結束時清除它的交接狀態。
+        sites 為該引擎結束時仍負責的券商設定 (異常結束時傳入)，這些券商改由目前最輕的引擎接手；
+        正常停止時不傳，券商直接移除。
+        """
+        with self.lock:
+            self.releases.pop(worker_id, None)
+            orphans = dict(sites or {})
+            for key, site in self.adoptions.pop(worker_id, []):
+                orphans.setdefault(key, site)
+
+            for key, dest in list(self.in_transit.items()):
+                if dest != worker_id:
+                    continue
+                src = self.owner.get(key)
+                if src in self.releases and key in self.releases[src]:
+                    # 來源引擎還沒交出，取消這次搬移
+                    self.releases[src].remove(key)
+                    self.in_transit.pop(key, None)
+                # 來源引擎已在交出途中: 保留記錄，hand_over 會改交給其他引擎
+
+            for key, owner in list(self.owner.items()):
+                if owner != worker_id:
+                    continue
+                # 包含本引擎正要交出的券商 (in_transit 來源為本引擎)
+                self.in_transit.pop(key, None)
+                dest = self._idlest() if key in orphans else None
+                if dest is None:
+                    del self.owner[key]
+                    continue
+                self.owner[key] = dest
+                self.in_transit[key] = dest
+                self.adoptions[dest].append((key, orphans[key]))
+                if self.log:
+                    self.log(f"[負載平衡] Worker-{worker_id} 已結束，{key} 改由 Worker-{dest} 接手")
+
+
+# --- 自適應輪詢參數 ---
+DEFAULT_MIN_INTERVAL = 0.3  # 報價活躍時最短輪詢間隔 (秒)
+DEFAULT_MAX_INTERVAL = 5.0  # 報價凍結時最長輪詢間隔 (秒)
+SPEEDUP = 0.5  # 報價有變動時間隔乘數
+BACKOFF = 1.5  # 報價未變動 / 讀取失敗時間隔乘數
+NEAR_ALERT_RATIO = 0.8  # 點差達到最低警報門檻的此比例時，直接以最短間隔輪詢
+
+
+class AdaptivePollScheduler:
+    """
+    各券商獨立輪詢間隔的排程器 (以下次到期時間為鍵的 heap)。
+    - 報價有變動: 間隔減半，最短到 min
+    - 報價凍結或讀取失敗: 間隔逐步放大，最長到 max
+    - 點差接近警報門檻: 直接使用最短間隔
+    每個券商的 min/max 可在站點設定以 "poll_interval": (min, max) 指定；
+    "mode": "http" 的券商最短間隔不低於 HTTP_MIN_INTERVAL。
+    """
+
+    def __init__(self, sites, thresholds=None):
+        self.thresholds = thresholds if thresholds is not None else {}
+        self.heap = []
+        self.state = {}
+        for key, site in sites.items():
+            self.add(key, site)
+
+    def add(self, key, site=None):
+        site = site or {}
+        lo, hi = site.get("poll_interval", (DEFAULT_MIN_INTERVAL, DEFAULT_MAX_INTERVAL))
+        if site.get("mode") == "http":
+            lo = max(lo, HTTP_MIN_INTERVAL)
+            hi = max(hi, lo)
+        self.state[key] = {"min": lo, "max": hi, "interval": lo, "last": None, "gen": 0}
+        self._push(key, time.monotonic())
+
+    def remove(self, key):
+        self.state.pop(key, None)
+
+    def _push(self, key, due):
+        st = self.state[key]
+        st["gen"] += 1
+        heapq.heappush(self.heap, (due, st["gen"], key))
+
+    def next_due(self):
+        """回傳 (最早到期的券商, 距到期秒數)；無券商時回傳 (None, 0.1)"""
+        while self.heap:
+            due, gen, key = self.heap[0]
+            st = self.state.get(key)
+            if st is None or st["gen"] != gen:
+                heapq.heappop(self.heap)  # 已移除或已重新排程的舊項目
+                continue
+            return key, due - time.monotonic()
+        return None, 0.1
+
+    def report(self, key, quote):
+        """回報本次擷取結果 (bid, ask) 或 None，並排入下次輪詢"""
+        st = self.state.get(key)
+        if st is None:
+            return
+        interval = st["interval"]
+        if quote is None:
+            interval = min(st["max"], interval * BACKOFF)
+        else:
+            if st["last"] is not None and quote != st["last"]:
+                interval = max(st["min"], interval * SPEEDUP)
+            else:
+                interval = min(st["max"], interval * BACKOFF)
+            st["last"] = quote
+            thresh = self.thresholds.get(key)
+            if thresh and abs(quote[1] - quote[0]) >= thresh * NEAR_ALERT_RATIO:
+                interval = st["min"]
+        st["interval"] = interval
+        self._push(key, time.monotonic() + interval)
+
+    def retry(self, key, delay):
+        """尚未就緒的券商以固定間隔重試，不改變其自適應間隔"""
+        if key in self.state:
+            self._push(key, time.monotonic() + delay)
+
+    def intervals(self):
+        return {k: st["interval"] for k, st in self.state.items()}
@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+"""
+券商頁面快照擷取與離線回放
+
+ig.py / oanda.py / forex.com.py 這類探測腳本只能對著線上網站驗證選擇器。
+這裡提供:
+- capture: 開啟每個券商頁面，等報價出現後存下去除腳本的 DOM 與當下 Bid/Ask
+- serve:   以本機 HTTP 伺服器回放快照，價格依設定的頻率隨機漫步變動
+           (伺服器端替換首次載入的 HTML，頁面內注入的小腳本持續更新 DOM)
+
+設定環境變數 GOLD_REPLAY_URL (例如 http://127.0.0.1:8765) 後，
+G9.py / GOLD.py / S.py 開啟的券商網址會改寫到回放伺服器，程式本身不需修改，
+可在沒有網路的機器上做效能分析與回歸測試。
+
+    python snapshot_replay.py capture [--only IG CMC] [--show]
+    python snapshot_replay.py serve [--port 8765] [--rate 2] [--volatility 0.15]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import re
+import threading
+import time
+import urllib.parse
+
+# --- 回放參數 ---
+SNAPSHOT_DIR = "snapshots"
+REPLAY_ENV = "GOLD_REPLAY_URL"
+DEFAULT_PORT = 8765
+DEFAULT_RATE = 2.0  # 每秒價格跳動次數 (0=價格固定)
+DEFAULT_VOLATILITY = 0.15  # 每次跳動中間價的標準差 (美元)
+CAPTURE_TIMEOUT = 30.0  # 擷取時等待報價出現的秒數
+
+# 擷取目標 (與 fast_extract 的券商代號一致)
+CAPTURE_TARGETS = {
+    "WF": "https://www.wfbullion.com/mq.html",
+    "IG": "https://www.ig.com/cn/commodities/markets-commodities/gold",
+    "Oanda": "https://www.oanda.com/bvi-en/cfds/metals/",
+    "Forex": "https://www.forex.com/cn/markets-to-trade/precious-metals/",
+    "MW": "https://www.mw801.com/",
+    "Axi": "https://www.axi.com/int/trade/cfds/commodities",
+    "Capital": "https://capital.com/zh-hant/markets/commodities",
+    "KVB": "https://www.kvbplus.com/prime/product/commodities",
+    "VT": "https://www.vtmarketsglobal.com/precious-metals/",
+    "Markets": "https://www.markets.com/instrument/gold/",
+    "IFC": "https://www.ifcmarkets.com/en/trading-conditions/precious-metals/xauusd",
+    "CMC": "https://www.cmcmarkets.com/en-au/instruments/gold-cash",
+}
+
+_REPLAY_BASE = os.environ.get(REPLAY_ENV, "").rstrip("/")
+
+
+def replay_url(url):
+    """設定 GOLD_REPLAY_URL 時，把券商網址改寫為回放伺服器網址 (http://本機/主機/路徑)"""
+    if not _REPLAY_BASE or not url.startswith(("http://", "https://")):
+        return url
+    parts = urllib.parse.urlsplit(url)
+    rest = parts.path or "/"
+    if parts.query:
+        rest += "?" + parts.query
+    return f"{_REPLAY_BASE}/{parts.netloc}{rest}"
+
+
+# ==========================================
+#  價格字串
+# ==========================================
+_NUMBER_RE = re.compile(r'(?<![\d.,])(?:\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+\.\d+)(?![\d])')
+_INTEGER_RE = re.compile(r'(?<![\d.,])\d+(?![\d]|[.,]\d)')  # 整數價格 (例如 2650)
+# 數字中間夾著行內標籤的價格，例如 2650.4<sup>5</sup>、2,650.<small>45</small>
+_INLINE_TAG = r'</?(?:span|sup|sub|small|b|strong|em|i|u|font)\b[^<>]*>'
+_SPLIT_RE = re.compile(r'(?<![\d.,])\d(?:(?:' + _INLINE_TAG + r')*[\d.,])*(?![\d])')
+_TAG_RE = re.compile(r'<[^>]*>')
+_TAG_SPLIT_RE = re.compile(r'(<[^>]*>)')
+
+
+def _equals(text, value):
+    try:
+        return abs(float(text.replace(',', '')) - value) < 1e-9
+    except ValueError:
+        return False
+
+
+def find_token(html, value):
+    """
+    在快照中找出數值等於 value 的價格字串 (保留原本的小數位數、千分位與夾在中間的標籤)；
+    依序比對小數 / 千分位、整數、跨行內標籤的寫法，都找不到時回傳 None (由 capture 記錄)。
+    """
+    for pattern in (_NUMBER_RE, _INTEGER_RE):
+        for m in pattern.finditer(html):
+            if _equals(m.group(0), value):
+                return m.group(0)
+    for m in _SPLIT_RE.finditer(html):
+        token = m.group(0)
+        if '<' in token and _equals(_TAG_RE.sub('', token), value):
+            return token
+    return None
+
+
+def format_like(value, token):
+    if '<' in token:
+        # 跨標籤: 先依純文字格式化，再從尾端把字元填回原本的文字片段 (標籤位置不變，小數位對齊)
+        text = format_like(value, _TAG_RE.sub('', token))
+        parts = _TAG_SPLIT_RE.split(token)  # 偶數索引為文字片段
+        end = len(text)
+        for i in range(len(parts) - 1, -1, -2):
+            start = max(end - len(parts[i]), 0)
+            parts[i], end = text[start:end], start
+        parts[0] = text[:end] + parts[0]
+        return ''.join(parts)
+    decimals = len(token.split('.')[1]) if '.' in token else 0
+    return f"{value:,.{decimals}f}" if ',' in token else f"{value:.{decimals}f}"
+
+
+def replace_token(html, token, new_text):
+    return re.sub(r'(?<![\d.,])' + re.escape(token) + r'(?![\d])', new_text, html)
+
+
+# ==========================================
+#  擷取
+# ==========================================
+# 複製 DOM 並移除腳本 / iframe / 預載連結，加上 <base> 讓相對路徑的樣式在有網路時仍可載入
+JS_SNAPSHOT = r"""
+var doc = document.documentElement.cloneNode(true);
+doc.querySelectorAll('script, noscript, iframe, link[rel=preload], link[rel=prefetch], link[rel=modulepreload]')
+   .forEach(function (n) { n.remove(); });
+var head = doc.querySelector('head');
+if (head) { var b = document.createElement('base'); b.href = location.href; head.insertBefore(b, head.firstChild); }
+return '<!DOCTYPE html>\n' + doc.outerHTML;
+"""
+
+
+def load_index(out_dir=SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(out_dir, "index.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def capture(out_dir=SNAPSHOT_DIR, keys=None, headless=True, log=print):
+    """逐一開啟券商頁面，報價出現後存下快照與當下 Bid/Ask"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from fast_extract import extract_quote
+
+    os.makedirs(out_dir, exist_ok=True)
+    index = load_index(out_dir)
+    chrome_options = Options()
+    if headless:
+        chrome_options.add_argument("--headless=new")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument(
+        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+    driver = webdriver.Chrome(options=chrome_options)
+    try:
+        for key in keys or list(CAPTURE_TARGETS):
+            url = CAPTURE_TARGETS[key]
+            log(f"[{key}] 擷取 {url} ...")
+            try:
+                driver.get(url)
+                quote = None
+                deadline = time.monotonic() + CAPTURE_TIMEOUT
+                while quote is None and time.monotonic() < deadline:
+                    quote = extract_quote(driver, key)
+                    if quote is None:
+                        time.sleep(0.5)
+                if quote is None:
+                    log(f"[{key}] 逾時未取得報價，略過")
+                    continue
+                html = driver.execute_script(JS_SNAPSHOT)
+            except Exception as e:
+                log(f"[{key}] 擷取失敗: {e}")
+                continue
+
+            bid, ask = quote[0], quote[1]
+            bid_text, ask_text = find_token(html, bid), find_token(html, ask)
+            for side, value, token in (("Bid", bid, bid_text), ("Ask", ask, ask_text)):
+                if token is None:
+                    log(f"[{key}] 快照中找不到 {side}={value} 的價格字串，回放時此價格不會變動")
+                elif '<' in token:
+                    log(f"[{key}] {side} 價格跨標籤 ({token})，回放時依原標籤位置替換")
+            filename = f"{key}.html"
+            with open(os.path.join(out_dir, filename), "w", encoding="utf-8") as f:
+                f.write(html)
+            index[key] = {"url": url, "file": filename, "bid": bid, "ask": ask,
+                          "bid_text": bid_text, "ask_text": ask_text,
+                          "captured": datetime.datetime.now().isoformat(timespec="seconds")}
+            log(f"[{key}] 完成 Bid={bid} Ask={ask} ({len(html) // 1024} KB)")
+    finally:
+        driver.quit()
+        with open(os.path.join(out_dir, "index.json"), "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+    return index
+
+
+# ==========================================
+#  回放
+# ==========================================
+class PriceWalk:
+    """
+    所有券商共用一個中間價隨機漫步，
+    各券商保留擷取當時相對於基準的價差，點差在原值附近浮動。
+    """
+
+    def __init__(self, index, rate=DEFAULT_RATE, volatility=DEFAULT_VOLATILITY, seed=None):
+        self.lock = threading.Lock()
+        self.rng = random.Random(seed)
+        self.rate = rate
+        self.volatility = volatility
+        mids = {k: (v["bid"] + v["ask"]) / 2 for k, v in index.items()}
+        self.mid = sum(mids.values()) / len(mids) if mids else 0.0
+        self.offsets = {k: m - self.mid for k, m in mids.items()}
+        self.spreads = {k: v["ask"] - v["bid"] for k, v in index.items()}
+        self.current = {k: (v["bid"], v["ask"]) for k, v in index.items()}
+        self.last_step = time.monotonic()
+
+    def quote(self, key):
+        with self.lock:
+            if self.rate > 0:
+                interval = 1.0 / self.rate
+                steps = int((time.monotonic() - self.last_step) / interval)
+                if steps:
+                    self.last_step += steps * interval
+                    for _ in range(min(steps, 1000)):
+                        self.mid += self.rng.gauss(0.0, self.volatility)
+                    for k, spread in self.spreads.items():
+                        bid = self.mid + self.offsets[k] - spread / 2
+                        self.current[k] = (bid, bid + spread * self.rng.uniform(0.8, 1.4))
+            return self.current.get(key)
+
+
+# 注入頁面的回放腳本: 記下含價格字串的文字節點與屬性，定期向伺服器取新價格後就地替換
+# (跨標籤的價格記下包含整段字串的最內層元素，以 innerHTML 替換)
+JS_REPLAY = r"""
+(function () {
+  var R = __CONFIG__;
+  var cur = {bid: R.bid, ask: R.ask}, targets = [];
+  function scan(side) {
+    var tok = cur[side];
+    if (!tok) return;
+    var w = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT, null), n;
+    if (tok.indexOf('<') >= 0) {
+      var head = tok.split('<')[0], seen = [];
+      while ((n = w.nextNode())) {
+        if (n.nodeValue.indexOf(head) < 0) continue;
+        for (var el = n.parentNode, d = 0; el && el.innerHTML !== undefined && d < 4; el = el.parentNode, d++) {
+          if (el.innerHTML.indexOf(tok) < 0) continue;
+          if (seen.indexOf(el) < 0) { seen.push(el); targets.push({node: el, attr: null, html: true, side: side}); }
+          break;
+        }
+      }
+      return;
+    }
+    while ((n = w.nextNode())) if (n.nodeValue.indexOf(tok) >= 0) targets.push({node: n, attr: null, side: side});
+    document.querySelectorAll('*').forEach(function (el) {
+      for (var i = 0; i < el.attributes.length; i++) {
+        if (el.attributes[i].value.indexOf(tok) >= 0) targets.push({node: el, attr: el.attributes[i].name, side: side});
+      }
+    });
+  }
+  function swap(side, val) {
+    targets.forEach(function (t) {
+      if (t.side !== side) return;
+      if (t.html) t.node.innerHTML = t.node.innerHTML.split(cur[side]).join(val);
+      else if (t.attr) t.node.setAttribute(t.attr, t.node.getAttribute(t.attr).split(cur[side]).join(val));
+      else t.node.nodeValue = t.node.nodeValue.split(cur[side]).join(val);
+    });
+    cur[side] = val;
+  }
+  scan('bid'); scan('ask');
+  if (!targets.length || R.interval <= 0) return;
+  setInterval(function () {
+    fetch(location.origin + '/__replay/quote/' + encodeURIComponent(R.key))
+      .then(function (r) { return r.json(); })
+      .then(function (q) { if (q.bid !== cur.bid) swap('bid', q.bid); if (q.ask !== cur.ask) swap('ask', q.ask); })
+      .catch(function () {});
+  }, R.interval);
+})();
+"""
+
+
+class ReplayServer:
+    """以快照回放各券商頁面；網址格式 /<主機>/<路徑> (見 replay_url)"""
+
+    def __init__(self, snapshot_dir=SNAPSHOT_DIR, port=DEFAULT_PORT, rate=DEFAULT_RATE,
+                 volatility=DEFAULT_VOLATILITY, host="127.0.0.1"):
+        self.dir = snapshot_dir
+        self.index = load_index(snapshot_dir)
+        self.pages = {}
+        for key, meta in self.index.items():
+            with open(os.path.join(snapshot_dir, meta["file"]), "r", encoding="utf-8") as f:
+                self.pages[key] = f.read()
+        self.walk = PriceWalk(self.index, rate, volatility)
+        self.interval_ms = int(1000 / rate) if rate > 0 else 0
+        # 網址 -> 券商: 先比對主機 + 路徑，找不到再只比對主機 (各程式的首頁網址可能不同)
+        self.by_path, self.by_host = {}, {}
+        for key, meta in self.index.items():
+            parts = urllib.parse.urlsplit(meta["url"])
+            self.by_path[(parts.netloc + (parts.path or "/")).rstrip("/")] = key
+            self.by_host.setdefault(parts.netloc, key)
+        self.httpd = self._make_server(host, port)
+
+    def lookup(self, path):
+        path = urllib.parse.urlsplit(path).path.lstrip("/")
+        key = self.by_path.get(path.rstrip("/"))
+        if key is None:
+            key = self.by_host.get(path.split("/", 1)[0])
+        return key
+
+    def current_texts(self, key):
+        meta = self.index[key]
+        bid, ask = self.walk.quote(key)
+        bid_text = format_like(bid, meta["bid_text"]) if meta.get("bid_text") else None
+        ask_text = format_like(ask, meta["ask_text"]) if meta.get("ask_text") else None
+        return bid_text, ask_text
+
+    def render(self, key):
+        meta = self.index[key]
+        html = self.pages[key]
+        bid_text, ask_text = self.current_texts(key)
+        if bid_text:
+            html = replace_token(html, meta["bid_text"], bid_text)
+        if ask_text:
+            html = replace_token(html, meta["ask_text"], ask_text)
+        config = json.dumps({"key": key, "bid": bid_text, "ask": ask_text, "interval": self.interval_ms})
+        script = "<script>" + JS_REPLAY.replace("__CONFIG__", config) + "</script>"
+        pos = html.rfind("</body>")
+        return html[:pos] + script + html[pos:] if pos >= 0 else html + script
+
+    def _make_server(self, host, port):
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                if self.path.startswith("/__replay/quote/"):
+                    key = urllib.parse.unquote(self.path.rsplit("/", 1)[1])
+                    if key not in server.index:
+                        return self.reply(404, b"", "text/plain")
+                    bid_text, ask_text = server.current_texts(key)
+                    body = json.dumps({"bid": bid_text, "ask": ask_text}).encode("utf-8")
+                    return self.reply(200, body, "application/json")
+                key = server.lookup(self.path)
+                if key is None:
+                    return self.reply(404, b"", "text/plain")
+                self.reply(200, server.render(key).encode("utf-8"), "text/html; charset=utf-8")
+
+            def reply(self, status, body, ctype):
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return ThreadingHTTPServer((host, port), Handler)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="券商頁面快照擷取與離線回放")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    cap = sub.add_parser("capture", help="擷取券商頁面快照")
+    cap.add_argument("--out", default=SNAPSHOT_DIR)
+    cap.add_argument("--only", nargs="*", choices=list(CAPTURE_TARGETS), help="只擷取指定券商")
+    cap.add_argument("--show", action="store_true", help="顯示瀏覽器視窗")
+    srv = sub.add_parser("serve", help="啟動回放伺服器")
+    srv.add_argument("--dir", default=SNAPSHOT_DIR)
+    srv.add_argument("--port", type=int, default=DEFAULT_PORT)
+    srv.add_argument("--rate", type=float, default=DEFAULT_RATE, help="每秒價格跳動次數 (0=固定)")
+    srv.add_argument("--volatility", type=float, default=DEFAULT_VOLATILITY, help="每次跳動的標準差")
+    args = parser.parse_args()
+
+    if args.cmd == "capture":
+        index = capture(args.out, args.only, headless=not args.show)
+        print(f"共 {len(index)} 個券商快照，存於 {os.path.abspath(args.out)}")
+    else:
+        server = ReplayServer(args.dir, args.port, args.rate, args.volatility)
+        print(f"回放伺服器: {server.base_url} ({len(server.index)} 個券商，每秒跳動 {args.rate} 次)")
+        print(f"請設定環境變數 {REPLAY_ENV}={server.base_url} 後啟動監控程式")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
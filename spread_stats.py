@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+每券商點差串流統計 (固定記憶體)
+
+警報門檻是固定值，看不出某個點差對這家券商而言是「平常就這麼寬」還是「異常地寬」。
+這裡每收到一筆報價就以 O(1) 更新:
+- EWMA: 指數加權移動平均 (以筆數半衰期設定)
+- 滾動平均 / 變異數: 最近 ROLLING_WINDOW 筆，滑動視窗版 Welford 演算法
+- P50 / P95 / P99: P² 演算法 (Jain & Chlamtac 1985)，每個分位數只保留 5 個標記，不存原始資料
+每個券商的記憶體固定 (視窗陣列 + 少量純量)，與執行時間長短無關。
+
+    python spread_stats.py        # 自我檢查 (與 numpy 精確值比較)
+"""
+
+import math
+
+import numpy as np
+
+# --- 統計參數 ---
+EWMA_HALFLIFE = 20  # EWMA 半衰期 (筆)
+ROLLING_WINDOW = 600  # 滾動平均 / 變異數視窗 (筆)
+QUANTILES = (0.5, 0.95, 0.99)
+MIN_SAMPLES = 100  # 累積筆數不足時無法區分常態 / 異常偏寬
+
+
+class P2Quantile:
+    """P² 串流分位數估計: 5 個標記的高度與位置，每筆 O(1)"""
+
+    def __init__(self, p):
+        self.p = p
+        self.q = []  # 標記高度
+        self.n = [0, 1, 2, 3, 4]  # 實際位置 (0 起算)
+        self.want = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]  # 理想位置
+        self.step = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def add(self, x):
+        q, n = self.q, self.n
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        want = self.want
+        for i in range(5):
+            want[i] += self.step[i]
+        for i in (1, 2, 3):
+            d = want[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])  # 拋物線超出範圍時改用線性
+                q[i] = qp
+                n[i] += d
+
+    def value(self):
+        q = self.q
+        if not q:
+            return math.nan
+        if len(q) < 5:
+            return q[min(len(q) - 1, int(round(self.p * (len(q) - 1))))]
+        return q[2]
+
+
+class SpreadStats:
+    """單一券商的點差統計；GUI 主執行緒使用"""
+
+    def __init__(self, halflife=EWMA_HALFLIFE, window=ROLLING_WINDOW, quantiles=QUANTILES):
+        self.alpha = 1.0 - 0.5 ** (1.0 / halflife)
+        self.ewma = math.nan
+        self.window = np.zeros(window)
+        self.count = 0  # 累計筆數
+        self.mean = 0.0  # 視窗內平均
+        self.m2 = 0.0  # 視窗內離均差平方和
+        self.sketches = [P2Quantile(p) for p in quantiles]
+
+    def update(self, spread):
+        self.ewma = spread if self.count == 0 else self.ewma + self.alpha * (spread - self.ewma)
+        size = len(self.window)
+        slot = self.count % size
+        if self.count < size:
+            k = self.count + 1
+            delta = spread - self.mean
+            self.mean += delta / k
+            self.m2 += delta * (spread - self.mean)
+        else:
+            old = self.window[slot]
+            mean = self.mean + (spread - old) / size
+            self.m2 += (spread - old) * (spread - mean + old - self.mean)
+            self.mean = mean
+        self.window[slot] = spread
+        self.count += 1
+        for sketch in self.sketches:
+            sketch.add(spread)
+
+    @property
+    def variance(self):
+        k = min(self.count, len(self.window))
+        return max(self.m2, 0.0) / (k - 1) if k > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance) if self.count > 1 else math.nan
+
+    def quantile(self, p):
+        for sketch in self.sketches:
+            if sketch.p == p:
+                return sketch.value()
+        raise ValueError(f"未追蹤的分位數: {p}")
+
+    def quantiles(self):
+        return tuple(sketch.value() for sketch in self.sketches)
+
+    def is_abnormal(self, spread, p=0.99):
+        """點差高於該券商自身的 p 分位數；樣本不足時無從判斷，一律視為異常 (不抑制警報)"""
+        return self.count < MIN_SAMPLES or spread > self.quantile(p)
+
+    def zscore(self, spread):
+        """點差相對滾動平均的標準分數"""
+        std = self.std
+        return (spread - self.mean) / std if std and std > 0 else math.nan
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(7)
+    data = np.round(0.2 + rng.lognormal(-1.5, 0.6, 50000), 2)
+    stats = SpreadStats(window=600)
+    for x in data:
+        stats.update(float(x))
+    tail = data[-600:]
+    assert abs(stats.mean - tail.mean()) < 1e-9 and abs(stats.variance - tail.var(ddof=1)) < 1e-9
+    ew = data[0]
+    for x in data[1:]:
+        ew += stats.alpha * (x - ew)
+    assert abs(stats.ewma - ew) < 1e-9
+    for p, est in zip(QUANTILES, stats.quantiles()):
+        exact = np.quantile(data, p)
+        assert abs(est - exact) / exact < 0.03, (p, est, exact)
+        print(f"P{p * 100:g}: 估計 {est:.4f} / 精確 {exact:.4f}")
+    assert stats.is_abnormal(float(data.max()) + 1) and not stats.is_abnormal(float(np.median(data)))
+    print("spread_stats 自我檢查通過")
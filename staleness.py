@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+報價停滯偵測
+
+頁面卡住 (WebSocket 斷線、SPA 停止更新) 時，scrape_site 仍然每輪讀到同一段舊文字，
+看板照樣顯示「監控中」與最後價格，共識價與警報也繼續用這個凍結的報價。
+這裡記錄每個券商「價格最後一次改變」的時間 (不是最後一次讀取成功的時間)，
+以 NumPy 陣列一次算出所有券商的報價年齡與停滯等級:
+    0 = 正常, 1 = 偏舊 (超過門檻的 STALE_WARN_RATIO), 2 = 停滯 (超過門檻，排除於共識與警報之外)
+
+站點設定範例:
+    "stale_sec": 120    # 該券商報價超過 120 秒未變動視為停滯 (冷門時段跳動較慢的券商可放寬)
+"""
+
+import numpy as np
+
+# --- 停滯門檻 (可在站點設定 "stale_sec" 覆寫) ---
+STALE_SEC = 30.0  # 報價超過此秒數未變動視為停滯
+STALE_WARN_RATIO = 0.5  # 超過門檻的此比例時顯示為偏舊
+
+FRESH, AGING, STALE = 0, 1, 2
+
+
+class StalenessTracker:
+    """GUI 主執行緒使用；update() 每筆 O(1)，levels() 一次算出全部券商"""
+
+    def __init__(self, keys, thresholds=None):
+        self.keys = list(keys)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        n = len(self.keys)
+        thresholds = thresholds or {}
+        self.threshold = np.array([float(thresholds.get(k) or STALE_SEC) for k in self.keys])
+        self.last_bid = np.full(n, np.nan)
+        self.last_ask = np.full(n, np.nan)
+        self.changed_at = np.full(n, np.nan)  # 價格最後變動時間 (epoch 秒)，尚無報價為 NaN
+
+    def update(self, key, bid, ask, now):
+        """回傳此筆報價是否與上一筆不同"""
+        i = self.index.get(key)
+        if i is None:
+            return False
+        if bid == self.last_bid[i] and ask == self.last_ask[i]:
+            return False
+        self.last_bid[i] = bid
+        self.last_ask[i] = ask
+        self.changed_at[i] = now
+        return True
+
+    def ages(self, now):
+        """各券商報價年齡 (秒)；尚無報價為 NaN"""
+        return now - self.changed_at
+
+    def levels(self, now):
+        """各券商停滯等級陣列 (FRESH / AGING / STALE)；尚無報價視為 FRESH"""
+        ages = self.ages(now)
+        out = np.zeros(len(self.keys), dtype=np.int8)
+        out[ages >= self.threshold * STALE_WARN_RATIO] = AGING  # NaN 比較結果為 False
+        out[ages >= self.threshold] = STALE
+        return out
+
+    def stale_mask(self, now):
+        return self.ages(now) >= self.threshold
+
+    def is_stale(self, key, now):
+        i = self.index[key]
+        return now - self.changed_at[i] >= self.threshold[i]
+
+
+if __name__ == "__main__":
+    tracker = StalenessTracker(["A", "B", "C"], {"B": 120, "C": None})
+    assert list(tracker.threshold) == [STALE_SEC, 120.0, STALE_SEC]
+
+    # 尚無報價的券商維持 FRESH，也不算停滯
+    assert list(tracker.levels(1000.0)) == [FRESH] * 3 and not tracker.stale_mask(1000.0).any()
+    assert not tracker.is_stale("A", 1000.0)
+
+    # 相同的 Bid/Ask 重複出現不會更新變動時間
+    assert tracker.update("A", 2650.1, 2650.5, 0.0)
+    assert not tracker.update("A", 2650.1, 2650.5, 10.0)
+    assert tracker.changed_at[0] == 0.0 and tracker.ages(10.0)[0] == 10.0
+    assert not tracker.update("X", 1.0, 2.0, 0.0)  # 不在清單內的券商忽略
+
+    # FRESH -> AGING (門檻 x STALE_WARN_RATIO) -> STALE (門檻)
+    warn = STALE_SEC * STALE_WARN_RATIO
+    assert tracker.levels(warn - 0.1)[0] == FRESH
+    assert tracker.levels(warn)[0] == AGING
+    assert tracker.levels(STALE_SEC - 0.1)[0] == AGING and not tracker.is_stale("A", STALE_SEC - 0.1)
+    assert tracker.levels(STALE_SEC)[0] == STALE and tracker.is_stale("A", STALE_SEC)
+
+    # 價格變動後重新計時 (只動 Ask 也算)
+    assert tracker.update("A", 2650.1, 2650.6, STALE_SEC)
+    assert tracker.levels(STALE_SEC)[0] == FRESH
+
+    # 站點覆寫 stale_sec: B 門檻 120 秒
+    tracker.update("B", 2650.0, 2650.4, 0.0)
+    assert tracker.levels(STALE_SEC)[1] == FRESH
+    assert tracker.levels(60.0)[1] == AGING and tracker.levels(119.9)[1] == AGING
+    assert tracker.levels(120.0)[1] == STALE
+    assert list(tracker.stale_mask(120.0)) == [True, True, False]  # A 已 90 秒未變動
+    print("staleness 自我檢查通過")
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+Parquet 報價封存 (背景批次寫入)
+
+tick_history 只保留固定筆數供即時圖表與統計使用；盤後的點差分析需要完整保存每一筆報價。
+GUI 執行緒若逐筆寫檔會卡住畫面，因此 append() 只把報價放進記憶體批次，
+由背景執行緒依筆數或時間間隔整批寫成 Parquet (批次有上限，寫出卡住時丟棄新報價並記錄筆數)，
+依日期與券商分區:
+
+    tick_archive/date=2026-10-16/broker=WF/part-<毫秒>-<序號>.parquet
+
+小檔案累積到一定數量時由背景執行緒合併成單一檔案 (compact)，過去日期的分區在啟動時合併。
+read_day() 以 pyarrow 依分區與欄位裁剪讀取，只讀需要的券商與欄位。
+
+需要套件: pyarrow (未安裝時 available=False，append 直接忽略)
+
+    python tick_archive.py            # 自我檢查與讀取速度測試
+    python tick_archive.py compact    # 手動合併所有分區的小檔案
+"""
+
+import datetime
+import os
+import threading
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# --- 封存設定 ---
+ARCHIVE_DIR = "tick_archive"
+FLUSH_ROWS = 5000  # 批次累積到此筆數立即寫出
+FLUSH_INTERVAL = 30.0  # 最長寫出間隔 (秒)
+COMPACT_FILES = 20  # 同一分區累積到此數量的小檔案時合併
+MAX_PENDING = 200000  # 記憶體批次上限 (筆)，背景寫出卡住時超過部分丟棄並記錄
+COMPRESSION = "zstd"
+
+COLUMNS = ("ts", "bid", "ask", "spread")
+
+
+def _schema():
+    return pa.schema([("ts", pa.float64()), ("bid", pa.float64()),
+                      ("ask", pa.float64()), ("spread", pa.float64())])
+
+
+def day_of(ts):
+    """epoch 秒 -> 本地日期字串 (分區名稱)"""
+    return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
+
+
+def partition_dir(directory, day, key):
+    return os.path.join(directory, f"date={day}", f"broker={key}")
+
+
+def _parquet_files(path):
+    try:
+        return sorted(os.path.join(path, n) for n in os.listdir(path) if n.endswith(".parquet"))
+    except FileNotFoundError:
+        return []
+
+
+def _write_atomic(table, path):
+    """先寫暫存檔再改名，讀取端不會看到寫到一半的檔案"""
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp, compression=COMPRESSION)
+    os.replace(tmp, path)
+
+
+class TickArchive:
+    """每個 GUI 一份；append() 可由任何執行緒呼叫 (實際上是 GUI 主執行緒)"""
+
+    def __init__(self, directory=ARCHIVE_DIR, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL,
+                 compact_files=COMPACT_FILES, max_pending=MAX_PENDING, log=None):
+        self.directory = directory
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.compact_files = compact_files
+        self.max_pending = max_pending
+        self.log = log
+        self.available = pa is not None
+        self.lock = threading.Lock()
+        self.pending = []  # [(key, ts, bid, ask), ...]
+        self.dropped = 0  # 批次已滿而丟棄的筆數 (背景執行緒輸出日誌後歸零)
+        self.wake = threading.Event()
+        self.thread = None
+        self.closed = False
+        self.seq = 0
+
+    def _log(self, msg):
+        if self.log:
+            self.log(msg)
+
+    # ==========================================
+    #  GUI 端
+    # ==========================================
+    def start(self):
+        if not self.available:
+            self._log("缺少 pyarrow 套件，報價封存停用 (pip install pyarrow)")
+            return
+        if self.thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def append(self, key, ts, bid, ask):
+        if self.thread is None:
+            return
+        with self.lock:
+            if len(self.pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self.pending.append((key, ts, bid, ask))
+            full = len(self.pending) >= self.flush_rows
+        if full:
+            self.wake.set()
+
+    def stop(self):
+        """寫出剩餘批次後結束背景執行緒"""
+        if self.thread is None:
+            return
+        self.closed = True
+        self.wake.set()
+        self.thread.join()
+        self.thread = None
+
+    # ==========================================
+    #  背景執行緒
+    # ==========================================
+    def _run(self):
+        self._compact_past_days()
+        while not self.closed:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self._safe_flush()
+        self._safe_flush()  # stop() 之前最後一批 (寫出期間新進的報價)
+
+    def _safe_flush(self):
+        try:
+            self.flush()
+        except Exception as e:
+            self._log(f"報價封存寫入失敗: {e}")
+
+    def flush(self):
+        """把目前批次依 (日期, 券商) 分組各寫成一個檔案"""
+        with self.lock:
+            rows, self.pending = self.pending, []
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            self._log(f"報價封存批次已滿 (上限 {self.max_pending} 筆)，已丟棄 {dropped} 筆")
+        if not rows:
+            return
+        groups = {}
+        for key, ts, bid, ask in rows:
+            groups.setdefault((day_of(ts), key), []).append((ts, bid, ask))
+        stamp = int(time.time() * 1000)
+        for (day, key), ticks in groups.items():
+            ts, bid, ask = zip(*ticks)
+            table = pa.table({"ts": ts, "bid": bid, "ask": ask,
+                              "spread": [a - b for b, a in zip(bid, ask)]}, schema=_schema())
+            path = partition_dir(self.directory, day, key)
+            os.makedirs(path, exist_ok=True)
+            self.seq += 1
+            _write_atomic(table, os.path.join(path, f"part-{stamp}-{self.seq:06d}.parquet"))
+            if len(_parquet_files(path)) >= self.compact_files:
+                compact_partition(path)
+
+    def _compact_past_days(self):
+        today = day_of(time.time())
+        try:
+            days = [n[5:] for n in os.listdir(self.directory) if n.startswith("date=")]
+        except FileNotFoundError:
+            return
+        merged = 0
+        for day in days:
+            if day < today:
+                merged += compact(self.directory, day)
+        if merged:
+            self._log(f"報價封存: 已合併 {merged} 個過去日期的分區")
+
+
+# ==========================================
+#  合併與讀取
+# ==========================================
+def compact_partition(path):
+    """分區內多個檔案合併為一個 (依時間排序)；回傳是否有合併"""
+    files = _parquet_files(path)
+    if len(files) <= 1:
+        return False
+    table = pa.concat_tables([pq.read_table(f, schema=_schema()) for f in files])
+    table = table.sort_by("ts")
+    _write_atomic(table, os.path.join(path, f"compact-{int(time.time() * 1000)}.parquet"))
+    for f in files:
+        os.remove(f)
+    return True
+
+
+def compact(directory=ARCHIVE_DIR, day=None):
+    """合併指定日期 (None=全部日期) 所有券商分區；回傳合併的分區數"""
+    days = [day] if day else [n[5:] for n in os.listdir(directory) if n.startswith("date=")]
+    merged = 0
+    for d in days:
+        root = os.path.join(directory, f"date={d}")
+        for name in os.listdir(root) if os.path.isdir(root) else []:
+            if name.startswith("broker=") and compact_partition(os.path.join(root, name)):
+                merged += 1
+    return merged
+
+
+def read_day(day, brokers=None, columns=COLUMNS, directory=ARCHIVE_DIR):
+    """
+    讀取一天的報價，回傳 pyarrow.Table (含 broker 欄)。
+    brokers: 只讀這些券商的分區；columns: 只讀這些欄位 (欄位裁剪，其他欄不解壓)。
+    """
+    root = os.path.join(directory, f"date={day}")
+    names = os.listdir(root) if os.path.isdir(root) else []
+    keys = brokers or sorted(n[7:] for n in names if n.startswith("broker="))
+    tables = []
+    for key in keys:
+        files = _parquet_files(os.path.join(root, f"broker={key}"))
+        if not files:
+            continue
+        parts = [pq.read_table(f, columns=list(columns)) for f in files]
+        table = pa.concat_tables(parts) if len(parts) > 1 else parts[0]
+        tables.append(table.append_column("broker", pa.array([key] * table.num_rows, pa.string())
+                                          .dictionary_encode()))
+    if not tables:
+        return pa.table({c: pa.array([], pa.float64()) for c in columns})
+    return pa.concat_tables(tables)
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+
+    if pa is None:
+        raise SystemExit("需要 pyarrow (pip install pyarrow)")
+    if sys.argv[1:] == ["compact"]:
+        print(f"已合併 {compact()} 個分區")
+        raise SystemExit(0)
+
+    # 自我檢查: 批次寫出、分區、合併、欄位裁剪讀取；並以 12 券商 x 10 萬筆量測讀取一天的耗時
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = TickArchive(tmp, flush_rows=50000, flush_interval=3600, compact_files=1000,
+                              max_pending=10 ** 7)
+        archive.start()
+        base = time.mktime(datetime.date.today().timetuple()) + 3600
+        keys = ["WF", "IG", "Oanda", "Forex", "MW", "Axi", "Capital", "KVB", "VT", "Markets", "IFC", "CMC"]
+        n = 100000
+        t0 = time.perf_counter()
+        for i in range(n):
+            for j, key in enumerate(keys):
+                archive.append(key, base + i * 0.3, 2650.0 + j * 0.01, 2650.3 + j * 0.01)
+        t1 = time.perf_counter()
+        archive.stop()
+        day = day_of(base)
+        files = len(_parquet_files(partition_dir(tmp, day, "WF")))
+        assert files > 1, files
+        assert compact(tmp, day) == len(keys)
+        assert len(_parquet_files(partition_dir(tmp, day, "WF"))) == 1
+
+        t2 = time.perf_counter()
+        table = read_day(day, directory=tmp)
+        t3 = time.perf_counter()
+        assert table.num_rows == n * len(keys)
+        pruned = read_day(day, brokers=["WF"], columns=("ts", "spread"), directory=tmp)
+        t4 = time.perf_counter()
+        assert pruned.column_names == ["ts", "spread", "broker"] and pruned.num_rows == n
+        assert abs(pruned.column("spread").to_numpy() - 0.3).max() < 1e-9
+        print(f"append {(t1 - t0) / (n * len(keys)) * 1e9:.0f} ns/筆，寫出 {files} 個檔/券商後合併")
+        print(f"讀取一天 {table.num_rows} 筆: {(t3 - t2) * 1000:.0f} ms；單一券商兩欄: {(t4 - t3) * 1000:.0f} ms")
+    print("tick_archive 自我檢查通過")
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+每券商 tick 歷史 (記憶體映射環形緩衝區)
+
+報價原本只顯示在表格上就丟掉，沒有任何歷史可供圖表或統計使用。
+這裡替每個券商建立一個固定容量的 NumPy 結構化陣列 (ts, bid, ask, spread)，
+以 numpy.memmap 映射到 tick_history/<券商>.ticks:
+- 新增一筆只寫入一列與表頭計數，O(1)，不配置任何 Python 物件
+- 資料在作業系統的頁快取中，程式當機或重啟後直接從檔案接續
+- 讀取 API 回傳映射陣列的檢視 (view)，不複製資料；環形繞回時分成兩段依時間順序回傳
+- ts 在同一個券商內保證不遞減: 頁面時間戳、封包時間戳與本機時間可能交錯亂序到達，
+  append() 會把比上一筆早的時間戳夾到上一筆的時間，since() 的二分搜尋依賴這個前提
+
+檔案格式: 64 bytes 表頭 (int64: magic, 版本, 容量, 累計筆數) + 容量 x 32 bytes 資料列。
+
+    python tick_history.py        # 自我檢查
+"""
+
+import os
+
+import numpy as np
+
+# --- 歷史設定 ---
+HISTORY_DIR = "tick_history"
+DEFAULT_CAPACITY = 1 << 20  # 每券商約 105 萬筆 (32MB)，每秒 3 筆約可保留 4 天
+
+TICK_DTYPE = np.dtype([("ts", "<f8"), ("bid", "<f8"), ("ask", "<f8"), ("spread", "<f8")])
+
+_MAGIC = 0x4B434954  # "TICK"
+_VERSION = 1
+_HEADER_BYTES = 64
+_H_MAGIC, _H_VERSION, _H_CAPACITY, _H_TOTAL = range(4)
+
+
+class TickRing:
+    """單一券商的環形緩衝區；單一寫入者 (GUI 主執行緒)"""
+
+    def __init__(self, path, capacity=DEFAULT_CAPACITY):
+        self.path = path
+        self.capacity = int(capacity)
+        self._header = None
+        self._data = None
+        self._open()
+        total = self.total
+        self._last_ts = float(self._data[(total - 1) % self.capacity]["ts"]) if total else float("-inf")
+
+    # ==========================================
+    #  開檔 / 建檔
+    # ==========================================
+    def _map(self, path, capacity, mode):
+        header = np.memmap(path, dtype="<i8", mode=mode, offset=0, shape=(_HEADER_BYTES // 8,))
+        data = np.memmap(path, dtype=TICK_DTYPE, mode=mode, offset=_HEADER_BYTES, shape=(capacity,))
+        return header, data
+
+    def _create(self, path, capacity):
+        with open(path, "wb") as f:
+            f.truncate(_HEADER_BYTES + capacity * TICK_DTYPE.itemsize)  # 稀疏檔，未寫入的部分不佔磁碟
+        header, data = self._map(path, capacity, "r+")
+        header[_H_MAGIC] = _MAGIC
+        header[_H_VERSION] = _VERSION
+        header[_H_CAPACITY] = capacity
+        header[_H_TOTAL] = 0
+        return header, data
+
+    def _open(self):
+        if not os.path.exists(self.path):
+            self._header, self._data = self._create(self.path, self.capacity)
+            return
+        header = np.memmap(self.path, dtype="<i8", mode="r", offset=0, shape=(_HEADER_BYTES // 8,))
+        magic, version, old_capacity = int(header[_H_MAGIC]), int(header[_H_VERSION]), int(header[_H_CAPACITY])
+        del header
+        expected = _HEADER_BYTES + old_capacity * TICK_DTYPE.itemsize
+        if magic != _MAGIC or version != _VERSION or os.path.getsize(self.path) != expected:
+            # 檔案損毀或格式不符: 保留原檔供檢查，重新建立
+            os.replace(self.path, self.path + ".bad")
+            self._header, self._data = self._create(self.path, self.capacity)
+            return
+        if old_capacity == self.capacity:
+            self._header, self._data = self._map(self.path, self.capacity, "r+")
+            return
+        # 容量設定改變: 依時間順序保留最新的資料搬到新檔
+        capacity, self.capacity = self.capacity, old_capacity
+        self._header, self._data = self._map(self.path, old_capacity, "r")
+        kept = self.to_array()[-capacity:]
+        self._header = self._data = None
+        self.capacity = capacity
+        tmp = self.path + ".tmp"
+        header, data = self._create(tmp, self.capacity)
+        data[:len(kept)] = kept
+        header[_H_TOTAL] = len(kept)
+        data.flush()
+        header.flush()
+        del header, data
+        os.replace(tmp, self.path)
+        self._header, self._data = self._map(self.path, self.capacity, "r+")
+
+    # ==========================================
+    #  寫入
+    # ==========================================
+    def append(self, ts, bid, ask):
+        """寫入一筆；ts 早於上一筆時以上一筆的 ts 記錄 (維持時間不遞減)"""
+        if ts < self._last_ts:
+            ts = self._last_ts
+        self._last_ts = ts
+        total = int(self._header[_H_TOTAL])
+        self._data[total % self.capacity] = (ts, bid, ask, ask - bid)
+        self._header[_H_TOTAL] = total + 1  # 先寫資料列再更新計數，中途中斷最多少一筆
+
+    def flush(self):
+        if self._data is not None:
+            self._data.flush()
+            self._header.flush()
+
+    def close(self):
+        self.flush()
+        self._header = self._data = None
+
+    # ==========================================
+    #  讀取 (零複製)
+    # ==========================================
+    @property
+    def total(self):
+        """開檔以來 (含重啟前) 累計寫入筆數"""
+        return int(self._header[_H_TOTAL])
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def segments(self):
+        """依時間順序回傳 1~2 段資料列檢視；未繞回時只有一段"""
+        total = self.total
+        if total <= self.capacity:
+            return (self._data[:total],)
+        head = total % self.capacity
+        if head == 0:
+            return (self._data,)
+        return self._data[head:], self._data[:head]
+
+    def column(self, name):
+        """單一欄位 (ts / bid / ask / spread) 的各段檢視"""
+        return tuple(seg[name] for seg in self.segments())
+
+    def latest(self, n):
+        """最近 n 筆；資料連續時為檢視，跨越繞回點時才複製成一個陣列"""
+        parts = []
+        for seg in reversed(self.segments()):
+            if n <= 0:
+                break
+            parts.append(seg[-n:])
+            n -= len(parts[-1])
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return self._data[:0]
+        return np.concatenate(parts[::-1])
+
+    def since(self, ts):
+        """時間戳 >= ts 的各段檢視 (append 保證時間不遞減，以二分搜尋定位)"""
+        out = []
+        for seg in self.segments():
+            i = int(np.searchsorted(seg["ts"], ts, side="left"))
+            if i < len(seg):
+                out.append(seg[i:])
+        return tuple(out)
+
+    def to_array(self):
+        """依時間順序合併成一個獨立陣列 (會複製)"""
+        segs = self.segments()
+        return segs[0].copy() if len(segs) == 1 else np.concatenate(segs)
+
+
+class TickHistory:
+    """所有券商的環形緩衝區；第一次寫入或讀取時才開檔"""
+
+    def __init__(self, directory=HISTORY_DIR, capacity=DEFAULT_CAPACITY):
+        self.directory = directory
+        self.capacity = capacity
+        self.rings = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def ring(self, key):
+        ring = self.rings.get(key)
+        if ring is None:
+            ring = self.rings[key] = TickRing(os.path.join(self.directory, f"{key}.ticks"), self.capacity)
+        return ring
+
+    def append(self, key, ts, bid, ask):
+        self.ring(key).append(ts, bid, ask)
+
+    def keys(self):
+        """磁碟上已有歷史的券商 (含本次尚未開檔者)"""
+        return sorted(name[:-6] for name in os.listdir(self.directory) if name.endswith(".ticks"))
+
+    def flush(self):
+        for ring in self.rings.values():
+            ring.flush()
+
+    def close(self):
+        for ring in self.rings.values():
+            ring.close()
+        self.rings.clear()
+
+
+if __name__ == "__main__":
+    # 自我檢查: 繞回順序、重啟接續、容量變更搬移
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history = TickHistory(tmp, capacity=5)
+        for i in range(7):
+            history.append("WF", 100.0 + i, 2650.0 + i, 2650.5 + i)
+        ring = history.ring("WF")
+        assert len(ring) == 5 and ring.total == 7
+        assert [len(s) for s in ring.segments()] == [3, 2]
+        assert list(ring.to_array()["ts"]) == [102.0, 103.0, 104.0, 105.0, 106.0]
+        assert list(ring.latest(2)["ts"]) == [105.0, 106.0] and ring.latest(2).base is not None
+        assert list(ring.latest(4)["ts"]) == [103.0, 104.0, 105.0, 106.0]
+        assert [list(s["ts"]) for s in ring.since(104.5)] == [[105.0, 106.0]]
+        assert abs(ring.to_array()["spread"] - 0.5).max() < 1e-9
+        history.append("WF", 105.5, 2657.0, 2657.4)  # 亂序到達的較早時間戳
+        assert ring.to_array()["ts"][-1] == 106.0
+        assert [list(s["ts"]) for s in ring.since(106.0)] == [[106.0, 106.0]]
+        history.close()
+
+        ring = TickHistory(tmp, capacity=5).ring("WF")
+        assert ring.total == 8 and list(ring.latest(1)["bid"]) == [2657.0]
+        ring.append(100.0, 2657.0, 2657.4)  # 重啟後仍接續上一筆的時間
+        assert ring.latest(1)["ts"][0] == 106.0
+        ring.close()
+
+        ring = TickHistory(tmp, capacity=3).ring("WF")
+        assert list(ring.to_array()["ts"]) == [106.0, 106.0, 106.0]
+        ring.append(107.0, 2657.0, 2657.4)
+        assert list(ring.to_array()["ts"]) == [106.0, 106.0, 107.0]
+        ring.close()
+    print("tick_history 自我檢查通過")
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite 報價與警報資料庫 (WAL 模式)
+
+Parquet 封存適合盤後大量分析，程式內的歷史查詢則需要能隨時依券商、時間範圍檢索的小型資料庫。
+這裡以標準函式庫 sqlite3 建立 tick_store.db:
+- ticks / alerts 兩張表，皆以 (broker, ts) 建立索引
+- GUI 執行緒只把資料放進佇列，由專屬寫入執行緒整批以單一交易寫入 (WAL + synchronous=NORMAL)
+- 佇列有上限，寫入執行緒卡住 (磁碟忙碌、資料庫被鎖) 時丟棄新資料並計數，不會無限占用記憶體
+- 寫入時同步累加每小時彙總表 spread_hourly (最大/最小/總和/筆數)，
+  「最近 7 天各券商每小時最大點差」這類查詢只讀彙總表，不必掃描上千萬筆 ticks
+讀取端各自開連線 (WAL 下讀寫互不阻塞)。
+
+    python tick_store.py        # 自我檢查與查詢速度測試
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+# --- 資料庫設定 ---
+DB_FILE = "tick_store.db"
+BATCH_ROWS = 2000  # 單一交易最多寫入筆數
+BATCH_INTERVAL = 1.0  # 最長寫入間隔 (秒)
+MAX_QUEUE = 100000  # 佇列上限 (筆)，超過時丟棄並記錄
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ticks (
+    broker TEXT NOT NULL, ts REAL NOT NULL, bid REAL NOT NULL, ask REAL NOT NULL, spread REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_ticks_broker_ts ON ticks (broker, ts);
+CREATE TABLE IF NOT EXISTS alerts (
+    broker TEXT NOT NULL, ts REAL NOT NULL, level INTEGER NOT NULL, spread REAL NOT NULL, message TEXT);
+CREATE INDEX IF NOT EXISTS idx_alerts_broker_ts ON alerts (broker, ts);
+CREATE TABLE IF NOT EXISTS spread_hourly (
+    broker TEXT NOT NULL, hour INTEGER NOT NULL,
+    max_spread REAL NOT NULL, min_spread REAL NOT NULL, sum_spread REAL NOT NULL, ticks INTEGER NOT NULL,
+    PRIMARY KEY (broker, hour)) WITHOUT ROWID;
+"""
+
+_UPSERT_HOURLY = """
+INSERT INTO spread_hourly (broker, hour, max_spread, min_spread, sum_spread, ticks) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (broker, hour) DO UPDATE SET
+    max_spread = max(max_spread, excluded.max_spread),
+    min_spread = min(min_spread, excluded.min_spread),
+    sum_spread = sum_spread + excluded.sum_spread,
+    ticks = ticks + excluded.ticks
+"""
+
+
+def connect(path=DB_FILE):
+    conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class TickStore:
+    """寫入端: add_tick / add_alert 只放進佇列，由寫入執行緒批次寫入"""
+
+    def __init__(self, path=DB_FILE, batch_rows=BATCH_ROWS, batch_interval=BATCH_INTERVAL,
+                 max_queue=MAX_QUEUE, log=None):
+        self.path = path
+        self.batch_rows = batch_rows
+        self.batch_interval = batch_interval
+        self.log = log
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.drop_lock = threading.Lock()
+        self.dropped = 0  # 佇列已滿而丟棄的筆數 (寫入執行緒輸出日誌後歸零)
+        self.thread = None
+        conn = connect(path)
+        conn.executescript(SCHEMA)
+        conn.close()
+
+    def _log(self, msg):
+        if self.log:
+            self.log(msg)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            with self.drop_lock:
+                self.dropped += 1
+
+    def add_tick(self, key, ts, bid, ask):
+        self._put(("t", key, ts, bid, ask))
+
+    def add_alert(self, key, ts, level, spread, message=""):
+        self._put(("a", key, ts, level, spread, message))
+
+    def stop(self):
+        """寫完佇列內剩餘資料後結束"""
+        if self.thread is None:
+            return
+        self.queue.put(None)  # 佇列已滿時等寫入執行緒騰出空間
+        self.thread.join()
+        self.thread = None
+
+    # ==========================================
+    #  寫入執行緒
+    # ==========================================
+    def _run(self):
+        conn = connect(self.path)
+        running = True
+        while running:
+            batch = []
+            deadline = time.monotonic() + self.batch_interval
+            while len(batch) < self.batch_rows:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            if batch:
+                try:
+                    self._write(conn, batch)
+                except Exception as e:
+                    self._log(f"報價資料庫寫入失敗: {e}")
+            with self.drop_lock:
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                self._log(f"報價資料庫佇列已滿 (上限 {self.queue.maxsize} 筆)，已丟棄 {dropped} 筆")
+        conn.close()
+
+    def _write(self, conn, batch):
+        ticks, alerts, hourly = [], [], {}
+        for item in batch:
+            if item[0] == "a":
+                alerts.append(item[1:])
+                continue
+            _, key, ts, bid, ask = item
+            spread = ask - bid
+            ticks.append((key, ts, bid, ask, spread))
+            h = hourly.get((key, int(ts // 3600)))
+            if h is None:
+                hourly[(key, int(ts // 3600))] = [spread, spread, spread, 1]
+            else:
+                h[0] = max(h[0], spread)
+                h[1] = min(h[1], spread)
+                h[2] += spread
+                h[3] += 1
+        with conn:
+            if ticks:
+                conn.executemany("INSERT INTO ticks VALUES (?, ?, ?, ?, ?)", ticks)
+                conn.executemany(_UPSERT_HOURLY, [(k, hour * 3600, *v) for (k, hour), v in hourly.items()])
+            if alerts:
+                conn.executemany("INSERT INTO alerts VALUES (?, ?, ?, ?, ?)", alerts)
+
+
+# ==========================================
+#  查詢 (讀取端，每個執行緒各自建立)
+# ==========================================
+class TickQuery:
+    def __init__(self, path=DB_FILE):
+        self.conn = connect(path)
+
+    def hourly_spread(self, days=7, brokers=None):
+        """最近 days 天各券商每小時的 (broker, 小時起點 epoch 秒, 最大點差, 平均點差, 筆數)，新到舊"""
+        since = (time.time() - days * 86400) // 3600 * 3600
+        sql = "SELECT broker, hour, max_spread, sum_spread / ticks, ticks FROM spread_hourly WHERE hour >= ?"
+        args = [since]
+        if brokers:
+            sql += f" AND broker IN ({','.join('?' * len(brokers))})"
+            args += list(brokers)
+        return self.conn.execute(sql + " ORDER BY hour DESC, broker", args).fetchall()
+
+    def max_spread(self, since, until=None, brokers=None):
+        """時間範圍內各券商最大點差 {broker: max}，以 (broker, ts) 索引逐券商範圍查詢"""
+        until = until or time.time()
+        if brokers is None:
+            brokers = [r[0] for r in self.conn.execute("SELECT DISTINCT broker FROM spread_hourly")]
+        out = {}
+        for key in brokers:
+            row = self.conn.execute("SELECT max(spread) FROM ticks WHERE broker = ? AND ts >= ? AND ts < ?",
+                                    (key, since, until)).fetchone()
+            if row[0] is not None:
+                out[key] = row[0]
+        return out
+
+    def ticks(self, broker, since, until=None, limit=100000):
+        """單一券商時間範圍內的 (ts, bid, ask, spread)"""
+        return self.conn.execute(
+            "SELECT ts, bid, ask, spread FROM ticks WHERE broker = ? AND ts >= ? AND ts < ? ORDER BY ts LIMIT ?",
+            (broker, since, until or time.time(), limit)).fetchall()
+
+    def alerts(self, days=7, limit=500):
+        """最近的警報事件 (broker, ts, 層級, 點差, 訊息)，新到舊"""
+        return self.conn.execute(
+            "SELECT broker, ts, level, spread, message FROM alerts WHERE ts >= ? ORDER BY ts DESC LIMIT ?",
+            (time.time() - days * 86400, limit)).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    # 自我檢查: 批次寫入、每小時彙總與逐筆資料一致；並量測寫入與查詢耗時
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "t.db")
+        keys = ["WF", "IG", "Oanda", "Forex", "MW", "Axi", "Capital", "KVB", "VT", "Markets", "IFC", "CMC"]
+        now = time.time()
+        n = 20000
+        store = TickStore(path, max_queue=n * len(keys) + 1)
+        store.start()
+        t0 = time.perf_counter()
+        for i in range(n):
+            ts = now - 7 * 86400 + i * (7 * 86400 / n)
+            for j, key in enumerate(keys):
+                store.add_tick(key, ts, 2650.0, 2650.2 + (i % 97) * 0.01 + j * 0.001)
+        store.add_alert("WF", now, 2, 1.2, "警報觸發! 點差: 1.20 (層級 2)")
+        store.stop()
+        t1 = time.perf_counter()
+
+        query = TickQuery(path)
+        t2 = time.perf_counter()
+        hourly = query.hourly_spread(days=7)
+        t3 = time.perf_counter()
+        direct = query.max_spread(now - 7 * 86400 - 1)
+        t4 = time.perf_counter()
+        assert len(query.conn.execute("SELECT * FROM ticks").fetchall()) == n * len(keys)
+        assert query.conn.execute("SELECT sum(ticks) FROM spread_hourly").fetchone()[0] == n * len(keys)
+        best = {}
+        for broker, hour, mx, avg, cnt in hourly:
+            best[broker] = max(best.get(broker, 0.0), mx)
+        assert all(abs(best[k] - direct[k]) < 1e-9 for k in keys), (best, direct)
+        assert query.alerts()[0][:3] == ("WF", now, 2)
+        query.close()
+
+        # 寫入執行緒未啟動 (等同卡住) 時佇列不會超過上限
+        stalled = TickStore(os.path.join(tmp, "s.db"), max_queue=100)
+        for i in range(250):
+            stalled.add_tick("WF", now, 2650.0, 2650.3)
+        assert stalled.queue.qsize() == 100 and stalled.dropped == 150
+        print(f"寫入 {n * len(keys)} 筆: {t1 - t0:.2f} s")
+        print(f"每小時最大點差 (7 天, {len(hourly)} 列): {(t3 - t2) * 1000:.1f} ms；逐筆索引查詢: {(t4 - t3) * 1000:.0f} ms")
+    print("tick_store 自我檢查通過")
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+WebSocket 封包報價擷取 (Chrome DevTools Protocol)
+
+IG / CMC / Capital.com / Markets.com 的報價是先經由 WebSocket 推到頁面再渲染。
+這裡透過 chromedriver 的 performance log 取得 CDP 的
+Network.webSocketFrameReceived / webSocketFrameSent 事件，
+用各券商的解碼器直接從封包內容解出 Bid/Ask，
+不經過 DOM 渲染與 selector 查找，延遲即為封包抵達時間。
+
+performance log 一次 get_log 就能取回整個瀏覽器所有分頁的事件，
+因此不需要 switch_to.window。
+"""
+
+import json
+import re
+import datetime
+
+from price_parser import parse_price
+
+# ==========================================
+#  各券商解碼設定
+#  format:
+#    "json"          - JSON / Socket.IO 封包，遞迴尋找含有商品代碼與買賣價的物件
+#    "lightstreamer" - Lightstreamer TLCP 文字協定 (IG)，由送出的訂閱指令得知欄位順序
+#  url_contains: 只處理 URL 含有此字串的 WebSocket 連線
+#  欄位名稱依各站目前前端推送格式設定，站方改版時只需調整此處
+# ==========================================
+WS_DECODERS = {
+    "IG": {
+        "format": "lightstreamer", "url_contains": "lightstreamer",
+        "item_contains": ("GOLD",), "bid_field": "BID", "ask_field": "OFFER",
+    },
+    "CMC": {
+        "format": "json", "url_contains": "cmcmarkets",
+        "symbols": ("GOLD", "XAUUSD", "XAU/USD"),
+        "bid_keys": ("sell", "bid", "b"), "ask_keys": ("buy", "ask", "offer", "a"),
+    },
+    "Capital": {
+        "format": "json", "url_contains": "capital.com",
+        "symbols": ("GOLD", "XAUUSD", "XAU/USD"),
+        "bid_keys": ("bid", "sell"), "ask_keys": ("ofr", "ask", "offer", "buy"),
+    },
+    "Markets": {
+        "format": "json", "url_contains": "markets.com",
+        "symbols": ("GOLD", "XAUUSD", "XAU/USD"),
+        "bid_keys": ("bid", "sell"), "ask_keys": ("ask", "buy", "offer"),
+    },
+}
+
+# 判斷商品代碼時會檢查的欄位
+SYMBOL_KEYS = ("symbol", "epic", "instrument", "instrumentName", "name", "code", "ticker", "s", "id")
+
+# Socket.IO / Engine.IO 封包前綴 (例如 42["quote", {...}])
+_SOCKETIO_PREFIX = re.compile(r'^\d+')
+_LS_KV = re.compile(r'(?:^|&)(LS_\w+)=([^&\r\n]*)')
+
+
+def enable_logging(chrome_options):
+    """在 setup_driver 時呼叫：開啟 performance log 的 Network 事件"""
+    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    chrome_options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+
+
+def _match_symbol(obj, symbols):
+    for k in SYMBOL_KEYS:
+        v = obj.get(k)
+        if isinstance(v, str):
+            up = v.upper()
+            if any(s in up for s in symbols):
+                return True
+    return False
+
+
+def _walk_json(node, cfg, out, depth=0):
+    if depth > 8:
+        return
+    if isinstance(node, dict):
+        if _match_symbol(node, cfg["symbols"]):
+            bid = next((parse_price(node[k]) for k in cfg["bid_keys"] if k in node), 0.0)
+            ask = next((parse_price(node[k]) for k in cfg["ask_keys"] if k in node), 0.0)
+            if bid > 0 and ask > 0:
+                out.append((bid, ask))
+                return
+        for v in node.values():
+            if isinstance(v, (dict, list)):
+                _walk_json(v, cfg, out, depth + 1)
+    elif isinstance(node, list):
+        for v in node:
+            if isinstance(v, (dict, list)):
+                _walk_json(v, cfg, out, depth + 1)
+
+
+def decode_json(payload, cfg):
+    text = _SOCKETIO_PREFIX.sub('', payload.strip(), count=1)
+    if not text or text[0] not in '[{':
+        return []
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return []
+    out = []
+    _walk_json(data, cfg, out)
+    return out
+
+
+class LightstreamerState:
+    """
+    Lightstreamer TLCP 解碼狀態 (每條連線一份)。
+    從送出的 control 封包得知 subId 對應的商品與欄位，
+    再把 U,<subId>,<item>,<v1>|<v2>|... 更新套用到快照上 (空值代表未變動)。
+    """
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.subs = {}  # subId -> {"items": [...], "fields": [...]}
+        self.snapshots = {}  # (subId, itemIdx) -> [values]
+
+    def on_sent(self, payload):
+        for line in payload.splitlines():
+            kv = dict(_LS_KV.findall(line))
+            if kv.get("LS_op") == "add" and "LS_subId" in kv:
+                items = kv.get("LS_group", "").replace('%20', ' ').split(' ')
+                fields = kv.get("LS_schema", "").replace('%20', ' ').split(' ')
+                self.subs[kv["LS_subId"]] = {"items": items, "fields": fields}
+
+    def on_received(self, payload):
+        out = []
+        for line in payload.splitlines():
+            if not line.startswith("U,"):
+                continue
+            parts = line.split(',', 3)
+            if len(parts) < 4:
+                continue
+            sub = self.subs.get(parts[1])
+            if not sub:
+                continue
+            try:
+                item_idx = int(parts[2])
+            except ValueError:
+                continue
+            item = sub["items"][item_idx - 1] if 0 < item_idx <= len(sub["items"]) else ""
+            if not any(s in item.upper() for s in self.cfg["item_contains"]):
+                continue
+            snap = self.snapshots.setdefault((parts[1], item_idx), [""] * len(sub["fields"]))
+            for i, v in enumerate(parts[3].split('|')):
+                if i >= len(snap) or v == "":
+                    continue
+                snap[i] = "" if v in ("#", "$") else v
+            fields = sub["fields"]
+            if self.cfg["bid_field"] in fields and self.cfg["ask_field"] in fields:
+                bid = parse_price(snap[fields.index(self.cfg["bid_field"])])
+                ask = parse_price(snap[fields.index(self.cfg["ask_field"])])
+                if bid > 0 and ask > 0:
+                    out.append((bid, ask))
+        return out
+
+
+class WebSocketQuoteCapture:
+    """
+    管理一個 driver 內所有分頁的 WebSocket 報價。
+    bind(handle, key) 綁定分頁，poll(driver) 每輪呼叫一次。
+    """
+
+    def __init__(self, decoders=None):
+        self.decoders = decoders if decoders is not None else WS_DECODERS
+        self.target_to_key = {}
+        self.sockets = {}  # requestId -> {"key", "state"}
+        self.last_quote_at = {}  # key -> epoch 秒
+        self.last_quote = {}  # key -> (bid, ask)
+
+    @staticmethod
+    def _target_id(handle):
+        return str(handle).replace("CDwindow-", "").upper()
+
+    def bind(self, handle, key):
+        if key in self.decoders and handle:
+            self.target_to_key[self._target_id(handle)] = key
+
+    def has_decoder(self, key):
+        return key in self.decoders
+
+    def fresh_keys(self, max_age, now=None):
+        """最近 max_age 秒內有從封包取得報價的券商 (這些券商本輪可略過 DOM 讀取)"""
+        now = now if now is not None else datetime.datetime.now().timestamp()
+        return {k for k, t in self.last_quote_at.items() if now - t <= max_age}
+
+    def poll(self, driver):
+        """取回 performance log，回傳 [(key, bid, ask, epoch 秒), ...]"""
+        quotes = []
+        for entry in driver.get_log("performance"):
+            try:
+                msg = json.loads(entry["message"])
+            except (KeyError, ValueError):
+                continue
+            inner = msg.get("message", {})
+            method = inner.get("method", "")
+            if not method.startswith("Network.webSocket"):
+                continue
+            key = self.target_to_key.get(str(msg.get("webview", "")).upper())
+            if key is None:
+                continue
+            params = inner.get("params", {})
+            req_id = params.get("requestId")
+            cfg = self.decoders[key]
+
+            if method == "Network.webSocketCreated":
+                if cfg["url_contains"] in params.get("url", ""):
+                    state = LightstreamerState(cfg) if cfg["format"] == "lightstreamer" else None
+                    self.sockets[req_id] = {"key": key, "state": state}
+                continue
+            if method == "Network.webSocketClosed":
+                self.sockets.pop(req_id, None)
+                continue
+
+            sock = self.sockets.get(req_id)
+            if sock is None:
+                continue
+            payload = params.get("response", {}).get("payloadData", "")
+            if params.get("response", {}).get("opcode") != 1 or not payload:
+                continue  # 只處理文字封包
+
+            if method == "Network.webSocketFrameSent":
+                if sock["state"] is not None:
+                    sock["state"].on_sent(payload)
+                continue
+            if method != "Network.webSocketFrameReceived":
+                continue
+
+            if sock["state"] is not None:
+                pairs = sock["state"].on_received(payload)
+            else:
+                pairs = decode_json(payload, cfg)
+            ts = entry.get("timestamp", 0) / 1000.0 or datetime.datetime.now().timestamp()
+            for bid, ask in pairs:
+                quotes.append((key, bid, ask, ts))
+                self.last_quote_at[key] = ts
+                self.last_quote[key] = (bid, ask)
+        return quotes